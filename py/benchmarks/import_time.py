@@ -0,0 +1,77 @@
+"""
+Import-time benchmark for llmproxy and gradingBot.
+
+Each module is imported in a fresh interpreter several times; the median wall
+time is compared against a budget, and modules that must stay lazy (PyPDF2,
+dotenv, the web tool's HTTP stack) are checked to be absent after import.
+
+Run from the py/ directory:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-ms 150 --runs 7
+
+Exits with status 1 if any budget or laziness check fails, so it can gate CI.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+PY_DIR = Path(__file__).resolve().parent.parent
+
+# module -> (default budget in ms, modules that must NOT be imported as a side effect)
+TARGETS: Dict[str, tuple] = {
+    "llmproxy": (250.0, ["dotenv", "PyPDF2"]),
+    "gradingBot.gradingBot": (300.0, ["dotenv", "PyPDF2", "gradingBot.tools"]),
+}
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - t0) * 1000.0
+print(json.dumps({{"ms": elapsed, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, forbidden: List[str], runs: int) -> Dict:
+    """Import `module` in `runs` fresh interpreters and collect timings."""
+    timings = []
+    loaded = set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, forbidden=forbidden)],
+            cwd=str(PY_DIR),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        sample = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(sample["ms"])
+        loaded.update(sample["loaded"])
+    return {"median_ms": statistics.median(timings), "max_ms": max(timings), "eager": sorted(loaded)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check import latency against a budget")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Override the per-module budget (milliseconds)")
+    args = parser.parse_args()
+
+    failed = False
+    for module, (budget, forbidden) in TARGETS.items():
+        budget = args.budget_ms if args.budget_ms is not None else budget
+        stats = measure(module, forbidden, args.runs)
+        over = stats["median_ms"] > budget
+        status = "FAIL" if over or stats["eager"] else "ok"
+        print(f"{status:4}  {module:24} median {stats['median_ms']:7.1f} ms "
+              f"(max {stats['max_ms']:.1f}, budget {budget:.0f})")
+        if stats["eager"]:
+            print(f"      eagerly imported: {', '.join(stats['eager'])}")
+        failed = failed or status == "FAIL"
+
+    sys.exit(1 if failed else 0)
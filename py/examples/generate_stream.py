@@ -0,0 +1,36 @@
+import asyncio
+
+from llmproxy import LLMProxy
+
+
+async def print_async_stream(client):
+    async for delta in client.agenerate_stream(
+        model='4o-mini',
+        system='Answer my question in a funny manner',
+        query='Who are the Jumbos?',
+        temperature=0.0,
+        lastk=0,
+    ):
+        print(delta, end='', flush=True)
+    print()
+
+
+if __name__ == '__main__':
+
+    client = LLMProxy()
+
+    # Sync iterator: text is printed as soon as each fragment arrives
+    for delta in client.generate_stream(
+        model = '4o-mini',
+        system = 'Answer my question in a funny manner',
+        query = 'Who are the Jumbos?',
+        temperature=0.0,
+        lastk=0,
+        session_id='GenericSession',
+        rag_usage = False,
+    ):
+        print(delta, end='', flush=True)
+    print()
+
+    # Async iterator with the same arguments
+    asyncio.run(print_async_stream(client))
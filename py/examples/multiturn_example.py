@@ -1,5 +1,4 @@
-import requests
-from llmproxy import LLMProxy
+from llmproxy import ConversationManager, LLMProxy
 
 if __name__ == '__main__':
     # 1. Create client
@@ -12,26 +11,28 @@ if __name__ == '__main__':
             "Respond briefly and kindly, and always include a concise illustrative example."
         )
     temperature_value = 0.0
-    last_queries = 0
     session_id_value = 'conversation'
-    rag_enabled = False
 
-    # 3. The program runs in a loop, allowing you to enter multiple consequetive queries. 
+    # 3. History is kept client-side: recent turns are resent verbatim and older
+    #    turns are summarized once the history passes max_context_tokens, so every
+    #    request stays about the same size (requests are sent with lastk=0).
+    conversation = ConversationManager(
+        client,
+        model = model_name,
+        system = system_instructions,
+        temperature = temperature_value,
+        max_context_tokens = 2000,
+        keep_recent_turns = 4,
+    )
+
+    # 4. The program runs in a loop, allowing you to enter multiple consequetive queries. 
     #    After typing a query, press Enter to send it to the LLMProxy.
-    #    To stop the loop, type "ctrl+x" and press Enter.
+    #    To stop the loop, type "exit" and press Enter.
     while True:
         query_prompt = input("Enter your query or type EXIT to stop the program: ")
         if query_prompt.strip().lower() == "exit": 
             break
         
-        response = client.generate(
-            model = model_name,
-            system = system_instructions,
-            query = query_prompt,
-            temperature = temperature_value,
-            lastk = last_queries,
-            session_id = session_id_value,
-            rag_usage = rag_enabled,
-        )
+        response = conversation.send(session_id_value, query_prompt)
 
         print(response)
@@ -1,4 +1,4 @@
-from llmproxy import LLMProxy
+from llmproxy import LLMProxy, format_rag_context
 from string import Template
 from time import sleep
 
@@ -7,27 +7,13 @@ def rag_context_string_simple(rag_context):
     """
     Convert the RAG context list (from retrieve API)
     into a single plain-text string that can be appended to a query.
+    Chunks repeated across documents are shown once.
     """
 
-    context_string = ""
-
-    i=1
-    for collection in rag_context:
-    
-        if not context_string:
-            context_string = """The following is additional context that may be helpful in answering the user's query."""
-
-        context_string += """
-        #{} {}
-        """.format(i, collection['doc_summary'])
-        j=1
-        for chunk in collection['chunks']:
-            context_string+= """
-            #{}.{} {}
-            """.format(i,j, chunk)
-            j+=1
-        i+=1
-    return context_string
+    return format_rag_context(
+        rag_context,
+        header="The following is additional context that may be helpful in answering the user's query.\n\n",
+    ).text
 
 
 if __name__ == '__main__':
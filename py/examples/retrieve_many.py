@@ -0,0 +1,18 @@
+from llmproxy import LLMProxy
+
+if __name__ == '__main__':
+
+    client = LLMProxy()
+    responses = client.retrieve_many(
+        [
+            'Tell me about AURA?',
+            {'query': 'What is a bijection?', 'rag_k': 3},
+            {'query': 'State the pigeonhole principle.', 'rag_threshold': 0.5},
+        ],
+        session_id='GenericSession',
+        rag_threshold = 0.3,
+        rag_k = 5
+    )
+
+    for response in responses:
+        print(response)
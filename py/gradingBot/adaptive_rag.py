@@ -0,0 +1,247 @@
+"""
+Adaptive retrieval depth: choose rag_k per query from the retrieval scores.
+
+With an AdaptiveRetrieval policy, GradingBot retrieves candidate_k
+candidates in one request and keeps the top k of them. k is chosen from
+the score distribution:
+
+    elbow       cut at the largest drop between consecutive scores, so a
+                few clearly relevant chunks are not padded with weak ones
+    cumulative  keep the fewest chunks holding cumulative_share of the
+                total score, so flat distributions (hard, broad questions)
+                keep more
+
+Candidates below min_score are never kept, and k stays within
+[min_k, max_k]. Each decision (k, candidates, reason) is returned with the
+grade and kept for GradingBot.retrieval_report().
+
+Offline evaluation over a labeled question set (JSON lines with "question",
+"relevant": doc_ids or text snippets that should be retrieved, and
+optionally "candidates": a recorded retrieve() result):
+
+    python -m gradingBot.adaptive_rag eval questions.jsonl --session-id ta_1
+    python -m gradingBot.adaptive_rag eval questions.jsonl --save-candidates
+
+reports mean k, context characters, recall and precision of the fixed
+policy (rag_k=5, rag_threshold=0.3) next to each adaptive one. Questions
+without recorded candidates are retrieved once (through LLMProxy, so
+LLMPROXY_REPLAY works) and, with --save-candidates, written back.
+"""
+import json
+import statistics
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+METHODS = ("elbow", "cumulative")
+
+
+@dataclass(frozen=True)
+class AdaptiveRetrieval:
+    method: str = "elbow"
+    candidate_k: int = 10
+    candidate_threshold: float = 0.3  # rag_threshold of the candidate request
+    min_score: float = 0.3            # floor applied to the candidates' scores
+    min_k: int = 1
+    max_k: int = 8
+    cumulative_share: float = 0.8
+    # elbow: a drop counts only if it is at least this share of the top score
+    min_drop: float = 0.1
+
+    def __post_init__(self) -> None:
+        if self.method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}")
+
+
+@dataclass(frozen=True)
+class RetrievalDecision:
+    k: int
+    candidates: int
+    # "elbow" or "cumulative" (the rule cut k), "max_k", "all" (every candidate
+    # above min_score kept), "min_score" (none was), "no_scores" or "no_candidates"
+    reason: str
+    scores: Tuple[float, ...] = ()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"k": self.k, "candidates": self.candidates, "reason": self.reason}
+
+
+def _score(collection: Dict) -> Optional[float]:
+    score = collection.get("score")
+    return float(score) if isinstance(score, (int, float)) else None
+
+
+def choose_k(scores: Sequence[float], policy: AdaptiveRetrieval) -> Tuple[int, str]:
+    """
+    How many of the scores (sorted best first) to keep, and why.
+
+    Returns:
+        (k, reason); reason names the rule that set k
+    """
+    above = [s for s in scores if s >= policy.min_score]
+    if not above:
+        return 0, "min_score"
+    limit = min(policy.max_k, len(above))
+    floor = min(policy.min_k, limit)
+    # Reason when every allowed candidate is kept
+    at_limit = "max_k" if limit < len(above) else "all"
+    if limit == floor:
+        return limit, at_limit
+
+    if policy.method == "cumulative":
+        total = sum(above)
+        running = 0.0
+        for k, score in enumerate(above[:limit], 1):
+            running += score
+            if k >= floor and running >= policy.cumulative_share * total:
+                return k, "cumulative" if k < limit else at_limit
+        return limit, at_limit
+
+    # Elbow: the largest drop between neighbours within [floor, limit]
+    drops = [(above[i - 1] - above[i], i) for i in range(max(floor, 1), limit)]
+    drop, k = max(drops, default=(0.0, limit))
+    if drop < policy.min_drop * above[0]:
+        return limit, at_limit
+    return k, "elbow"
+
+
+def select_context(rag_context: Any, policy: AdaptiveRetrieval) -> Tuple[Any, RetrievalDecision]:
+    """
+    Keep the chosen top k collections of a retrieve() result (a list, or a
+    dict holding one under "rag_context"; the same shape is returned).
+    Results without scores are kept whole.
+    """
+    collections = rag_context.get("rag_context") if isinstance(rag_context, dict) else rag_context
+    if not isinstance(collections, list) or not collections:
+        return rag_context, RetrievalDecision(k=0, candidates=0, reason="no_candidates")
+    scored = [(_score(c) if isinstance(c, dict) else None, c) for c in collections]
+    if any(score is None for score, _ in scored):
+        return rag_context, RetrievalDecision(k=len(collections), candidates=len(collections), reason="no_scores")
+
+    scored.sort(key=lambda item: -item[0])
+    scores = tuple(score for score, _ in scored)
+    k, reason = choose_k(scores, policy)
+    kept = [c for _, c in scored[:k]]
+    decision = RetrievalDecision(k=k, candidates=len(collections), reason=reason, scores=scores)
+    if isinstance(rag_context, dict):
+        return {**rag_context, "rag_context": kept}, decision
+    return kept, decision
+
+
+# -----------------------
+# Offline evaluation
+# -----------------------
+
+def _fixed(candidates: List[Dict], rag_k: int = 5, rag_threshold: float = 0.3) -> List[Dict]:
+    ranked = sorted(candidates, key=lambda c: -(_score(c) or 0.0))
+    return [c for c in ranked if (_score(c) or 0.0) >= rag_threshold][:rag_k]
+
+
+def _matches(collection: Dict, relevant: str) -> bool:
+    if collection.get("doc_id") == relevant:
+        return True
+    needle = relevant.lower()
+    return any(needle in str(chunk).lower() for chunk in collection.get("chunks") or [])
+
+
+def _metrics(kept: List[Dict], relevant: List[str]) -> Dict[str, float]:
+    from llmproxy.rag_context import format_rag_context
+
+    found = [r for r in relevant if any(_matches(c, r) for c in kept)]
+    useful = [c for c in kept if any(_matches(c, r) for r in relevant)]
+    return {
+        "k": len(kept),
+        "chars": len(format_rag_context(kept).text),
+        "recall": len(found) / len(relevant) if relevant else 1.0,
+        "precision": len(useful) / len(kept) if kept else (1.0 if not relevant else 0.0),
+    }
+
+
+def evaluate(
+    items: List[Dict],
+    policies: Dict[str, AdaptiveRetrieval],
+    fixed_k: int = 5,
+    fixed_threshold: float = 0.3,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare retrieval policies over labeled items ({"relevant", "candidates"}).
+
+    Returns:
+        policy name -> mean k, chars, recall and precision, plus the share
+        of items whose recall is below the fixed policy's ("recall_lost")
+    """
+    rows: Dict[str, List[Dict[str, float]]] = {"fixed": []}
+    rows.update({name: [] for name in policies})
+    for item in items:
+        candidates = item.get("candidates") or []
+        relevant = list(item.get("relevant") or [])
+        baseline = _metrics(_fixed(candidates, fixed_k, fixed_threshold), relevant)
+        rows["fixed"].append({**baseline, "recall_lost": 0.0})
+        for name, policy in policies.items():
+            kept, _ = select_context(candidates, policy)
+            row = _metrics(kept, relevant)
+            row["recall_lost"] = float(row["recall"] < baseline["recall"])
+            rows[name].append(row)
+    return {
+        name: {key: statistics.fmean(r[key] for r in results) for key in results[0]} if results else {}
+        for name, results in rows.items()
+    }
+
+
+def format_evaluation(report: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"{'policy':<14}{'mean k':>8}{'chars':>9}{'recall':>8}{'precision':>11}{'recall lost':>13}"]
+    for name, m in report.items():
+        if m:
+            lines.append(
+                f"{name:<14}{m['k']:>8.2f}{m['chars']:>9.0f}{m['recall']:>8.2f}"
+                f"{m['precision']:>11.2f}{100 * m['recall_lost']:>12.1f}%"
+            )
+    return "\n".join(lines)
+
+
+def _load_items(path: Path) -> List[Dict]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate adaptive rag_k policies on a labeled question set")
+    parser.add_argument("command", choices=["eval"])
+    parser.add_argument("questions", type=str, help="JSON lines: question, relevant, optional candidates")
+    parser.add_argument("--session-id", type=str, default=None,
+                        help="Session to retrieve candidates from for questions without them")
+    parser.add_argument("--candidate-k", type=int, default=AdaptiveRetrieval.candidate_k)
+    parser.add_argument("--candidate-threshold", type=float, default=AdaptiveRetrieval.candidate_threshold)
+    parser.add_argument("--max-k", type=int, default=AdaptiveRetrieval.max_k)
+    parser.add_argument("--share", type=float, default=AdaptiveRetrieval.cumulative_share,
+                        help="Cumulative policy: share of the total score to keep")
+    parser.add_argument("--save-candidates", action="store_true",
+                        help="Write retrieved candidates back into the questions file")
+    args = parser.parse_args()
+
+    path = Path(args.questions)
+    items = _load_items(path)
+    missing = [item for item in items if "candidates" not in item]
+    if missing:
+        if not args.session_id:
+            parser.error(f"{len(missing)} question(s) have no candidates; pass --session-id to retrieve them")
+        from llmproxy import LLMProxy
+        results = LLMProxy().retrieve_many(
+            [item["question"] for item in missing],
+            session_id=args.session_id,
+            rag_threshold=args.candidate_threshold,
+            rag_k=args.candidate_k,
+        )
+        for item, result in zip(missing, results):
+            if isinstance(result, dict) and "error" in result:
+                raise SystemExit(f"Retrieval failed for {item['question']!r}: {result['error']}")
+            item["candidates"] = result.get("rag_context", []) if isinstance(result, dict) else result
+        if args.save_candidates:
+            path.write_text("".join(json.dumps(item) + "\n" for item in items), encoding="utf-8")
+
+    base = AdaptiveRetrieval(candidate_k=args.candidate_k, candidate_threshold=args.candidate_threshold,
+                             max_k=args.max_k, cumulative_share=args.share)
+    report = evaluate(items, {"elbow": base, "cumulative": replace(base, method="cumulative")})
+    print(f"{len(items)} questions")
+    print(format_evaluation(report))
@@ -0,0 +1,65 @@
+"""
+Cascade grading: cheap model first, stronger models only when needed.
+
+Each stage's reply is checked before it is accepted. The next model is
+tried when:
+    parse_failure   no SCORE could be read (when max_points is given)
+    error           the call failed (the last grade an earlier stage
+                    produced is kept if no later stage succeeds)
+    low_confidence  the reply's CONFIDENCE is below min_confidence (or
+                    missing)
+    borderline      score / max_points lies within borderline_width of one
+                    of borderline_cutoffs (e.g. the pass mark)
+
+The last model's reply is always accepted.
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+CONFIDENCE_INSTRUCTION = (
+    "\n\nOn the line after SCORE, add CONFIDENCE: a number from 0.0 to 1.0 "
+    "saying how certain you are that the score is right."
+)
+
+_CONFIDENCE_RE = re.compile(r"CONFIDENCE:\s*\[?\s*(\d*\.?\d+|high|medium|low)", re.IGNORECASE)
+_CONFIDENCE_WORDS = {"high": 0.9, "medium": 0.6, "low": 0.3}
+
+
+@dataclass(frozen=True)
+class CascadeConfig:
+    models: Tuple[str, ...] = ("4o-mini", "gpt-4")
+    min_confidence: float = 0.7
+    borderline_cutoffs: Tuple[float, ...] = (0.6,)
+    borderline_width: float = 0.05
+
+
+def parse_confidence(text: str) -> Optional[float]:
+    """The reply's CONFIDENCE as 0..1 (numbers above 1 are read as percent), or None."""
+    match = _CONFIDENCE_RE.search(text or "")
+    if not match:
+        return None
+    value = match.group(1).lower()
+    if value in _CONFIDENCE_WORDS:
+        return _CONFIDENCE_WORDS[value]
+    confidence = float(value)
+    return confidence / 100 if confidence > 1 else confidence
+
+
+def escalation_reason(
+    config: CascadeConfig,
+    score: Optional[float],
+    max_points: Optional[float],
+    confidence: Optional[float],
+) -> Optional[str]:
+    """Why a stage's grade should go to the next model, or None to accept it."""
+    if max_points and score is None:
+        return "parse_failure"
+    if confidence is None or confidence < config.min_confidence:
+        return "low_confidence"
+    if max_points and any(
+        abs(score / max_points - cutoff) <= config.borderline_width
+        for cutoff in config.borderline_cutoffs
+    ):
+        return "borderline"
+    return None
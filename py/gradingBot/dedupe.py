@@ -0,0 +1,180 @@
+"""
+Near-duplicate detection for student answers.
+
+Answers are normalized (Unicode, case, whitespace, operator spelling),
+split into character shingles and summarized with MinHash signatures.
+Locality-sensitive hashing over signature bands finds candidate pairs
+without comparing every answer to every other; candidates are then checked
+with the exact Jaccard similarity of their shingle sets.
+
+Clusters are tight: every member is within the similarity threshold of
+the cluster's representative (no transitive chaining) and states the same
+numbers, so a grade given to the representative can reasonably be reused
+for the rest. Text similarity alone would merge "= 676000 plates" with
+"= 676001 plates", which differ in the one place that decides the grade.
+"""
+import random
+import re
+import unicodedata
+import zlib
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Set, Tuple
+
+DEFAULT_THRESHOLD = 0.9
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 similarity become candidates
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_OPERATORS = str.maketrans({"×": "*", "·": "*", "÷": "/", "−": "-", "–": "-", "—": "-", "≤": "<=", "≥": ">="})
+_SPACE_AROUND_SYMBOLS_RE = re.compile(r"\s*([=+\-*/^(),<>{}\[\]|])\s*")
+_WHITESPACE_RE = re.compile(r"\s+")
+_NUMBER_RE = re.compile(r"\d+(?:,\d{3})*(?:\.\d+)?")
+
+
+def normalize_answer(text: str) -> str:
+    """Canonical form used for comparison: formatting differences removed."""
+    text = unicodedata.normalize("NFKC", text or "").translate(_OPERATORS).lower()
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    text = _SPACE_AROUND_SYMBOLS_RE.sub(r"\1", text)
+    return text.rstrip(" .")
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> Set[int]:
+    """Hashed character k-grams of a normalized answer (the whole text if shorter)."""
+    if len(text) <= k:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {zlib.crc32(text[i:i + k].encode("utf-8")) for i in range(len(text) - k + 1)}
+
+
+def numbers(text: str) -> Tuple[float, ...]:
+    """The numbers a normalized answer states, sorted ("1,000" and "1000.0" are equal)."""
+    return tuple(sorted(float(n.replace(",", "")) for n in _NUMBER_RE.findall(text)))
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash signatures with fixed, seeded permutations (stable across runs)."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, items: Set[int]) -> List[int]:
+        return [
+            min(((a * x + b) % _MERSENNE_PRIME) & _MAX_HASH for x in items)
+            for a, b in self._params
+        ]
+
+
+@dataclass
+class AnswerCluster:
+    representative: int                              # index of the answer to grade
+    members: List[int] = field(default_factory=list)  # all indices, representative first
+    similarity: Dict[int, float] = field(default_factory=dict)  # member -> Jaccard to representative
+    exact: Dict[int, bool] = field(default_factory=dict)        # member normalizes to the same text
+
+
+def cluster_answers(
+    answers: Sequence[str],
+    threshold: float = DEFAULT_THRESHOLD,
+    num_perm: int = NUM_PERM,
+    bands: int = BANDS,
+) -> List[AnswerCluster]:
+    """
+    Group answers whose shingle sets have Jaccard similarity >= threshold
+    with a common representative and that state the same numbers.
+
+    Args:
+        answers: Raw answer texts
+        threshold: Minimum similarity to the representative (1.0 merges only
+                   answers that normalize to the same text)
+        num_perm: MinHash signature length
+        bands: LSH bands; num_perm must be divisible by it
+
+    Returns:
+        Clusters in order of their first member; every answer is in exactly one
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm must be divisible by bands")
+
+    normalized = [normalize_answer(a) for a in answers]
+    # Exact duplicates collapse before any hashing
+    by_text: Dict[str, List[int]] = defaultdict(list)
+    for i, text in enumerate(normalized):
+        by_text[text].append(i)
+    texts = list(by_text)
+    sets = [shingles(t) for t in texts]
+    values = [numbers(t) for t in texts]
+
+    # LSH: texts sharing any band of their signature are candidates
+    neighbours: Dict[int, Set[int]] = defaultdict(set)
+    if threshold < 1.0 and len(texts) > 1:
+        hasher = MinHasher(num_perm)
+        rows = num_perm // bands
+        buckets: Dict[tuple, List[int]] = defaultdict(list)
+        for t, items in enumerate(sets):
+            sig = hasher.signature(items)
+            for band in range(bands):
+                buckets[(band, tuple(sig[band * rows:(band + 1) * rows]))].append(t)
+        for bucket in buckets.values():
+            for t in bucket:
+                neighbours[t].update(bucket)
+
+    # Leader clustering: the most common remaining form becomes a
+    # representative and absorbs every candidate close enough to it
+    counts = Counter({t: len(by_text[text]) for t, text in enumerate(texts)})
+    order = sorted(range(len(texts)), key=lambda t: (-counts[t], by_text[texts[t]][0]))
+    assigned: Dict[int, int] = {}
+    leaders: List[int] = []
+    scores: Dict[int, float] = {}
+    for t in order:
+        if t in assigned:
+            continue
+        assigned[t] = t
+        scores[t] = 1.0
+        leaders.append(t)
+        for u in neighbours.get(t, ()):
+            # A different number (often the final result) is never a near-duplicate
+            if u not in assigned and values[u] == values[t]:
+                sim = jaccard(sets[t], sets[u])
+                if sim >= threshold:
+                    assigned[u] = t
+                    scores[u] = sim
+
+    clusters: Dict[int, AnswerCluster] = {}
+    for leader in leaders:
+        rep = by_text[texts[leader]][0]
+        clusters[leader] = AnswerCluster(representative=rep)
+    for t, leader in assigned.items():
+        cluster = clusters[leader]
+        for i in by_text[texts[t]]:
+            cluster.members.append(i)
+            cluster.similarity[i] = scores[t]
+            cluster.exact[i] = t == leader
+    for cluster in clusters.values():
+        cluster.members.sort(key=lambda i: (i != cluster.representative, i))
+    return sorted(clusters.values(), key=lambda c: min(c.members))
+
+
+def cluster_summary(clusters: List[AnswerCluster]) -> Dict[str, float]:
+    """Answers, clusters (= grading calls needed) and the share of calls saved."""
+    n_answers = sum(len(c.members) for c in clusters)
+    return {
+        "answers": n_answers,
+        "clusters": len(clusters),
+        "largest_cluster": max((len(c.members) for c in clusters), default=0),
+        "calls_saved_fraction": 1 - len(clusters) / n_answers if n_answers else 0.0,
+    }
@@ -8,20 +8,77 @@ This system allows TAs/Professors to:
 
 Users are distinguished by session_id to maintain separate document collections.
 """
-from gradingBot.tools import calculator_tool, web_api_tool
+from collections import ChainMap, Counter, OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
 from time import sleep
 import json
-from llmproxy import LLMProxy
+import time
+import re
+from llmproxy import LLMProxy, StreamError
+from llmproxy.circuit_breaker import CircuitOpenError
+from llmproxy.conversation import estimate_tokens
+from llmproxy.rag_context import FormattedContext, format_rag_context
+from gradingBot.prompt_layout import (
+    GRADING_SYSTEM_PROMPT, PROMPT_LAYOUTS, PrefixTracker, build_query, legacy_query, serialize_prompt
+)
+from gradingBot.rubric import Rubric, compile_rubric
+from gradingBot.tool_runner import ToolBudget, ToolRunner
+from gradingBot.workspace import DEFAULT_QUOTA_BYTES, Workspace, WorkspaceQuotaError
 
-from dotenv import load_dotenv
-load_dotenv()
 
+# Score pattern like "SCORE: X/Y" or "X/Y points"
+_SCORE_RE = re.compile(r'(\d+\.?\d*)\s*/\s*(\d+\.?\d*)')
+
+# Per-tool budgets: timeout (s), max concurrent calls, result on timeout
+DEFAULT_TOOL_BUDGETS = {
+    "calculator": {"timeout": 2.0, "max_concurrency": 4},
+    "web_api": {"timeout": 8.0, "max_concurrency": 4, "fallback": {"error": "Web verification timed out"}},
+    "retrieve": {"timeout": 120.0, "max_concurrency": 8},
+}
+
+TOOL_MODES = ("regex", "llm", "none")
+
+# HTTP statuses worth grading again after (the proxy's own retries gave up)
+_TRANSIENT_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# A document to upload: a path, an open binary file, or an in-memory buffer
+UploadSource = Union[str, Path, BinaryIO, bytes, bytearray, memoryview]
+
+# Distinct answers whose tool context (and prefetched RAG context) is kept in memory
+_TOOL_CONTEXT_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=None)
+def _load_env_once() -> None:
+    """
+    Load the nearest .env (searching upward from this package) once per process.
+    """
+    from dotenv import find_dotenv, load_dotenv
+    load_dotenv(find_dotenv())
+
+
+def _transient_failure(graded: Dict) -> Optional[str]:
+    """
+    The request type ("retrieve" or "call") whose transient proxy failure
+    (open circuit, no HTTP answer, 429/5xx) failed this grade, or None when
+    it did not fail or failed in a way grading again would not fix.
+    """
+    if "error" not in graded:
+        return None
+    response = graded.get("raw_response")
+    if not isinstance(response, dict):
+        return None
+    status = response.get("status_code")
+    transient = (
+        response.get("circuit_open")
+        or status in _TRANSIENT_STATUSES
+        or (status is None and str(response.get("error", "")).startswith("Network error"))
+    )
+    return graded.get("request_type") if transient else None
 
-# Added for splitting large pdfs
-from PyPDF2 import PdfReader, PdfWriter
-import tempfile
 
 class GradingBot:
     """
@@ -33,6 +90,21 @@ class GradingBot:
         self,
         session_id: str,
         model: str = "4o-mini",
+        pdf_workers: Optional[int] = None,
+        workspace_root: Optional[Union[str, Path]] = None,
+        workspace_quota_bytes: Optional[int] = DEFAULT_QUOTA_BYTES,
+        max_tool_expressions: int = 50,
+        tool_mode: str = "regex",
+        max_tool_rounds: int = 1,
+        tool_loop_budget: float = 60.0,
+        prompt_layout: str = "legacy",
+        store_results: bool = True,
+        result_store=None,
+        cascade=None,
+        deadline: Optional[float] = None,
+        client: Optional[LLMProxy] = None,
+        rag_max_chars: Optional[int] = None,
+        retrieval=None,
     ):
         """
         Initialize the GradingBot.
@@ -41,42 +113,167 @@ class GradingBot:
             session_id: Unique identifier for this TA/Professor's session.
                        Documents uploaded will be associated with this session.
             model: LLM model to use for grading (default: "4o-mini")
+            pdf_workers: Worker processes for splitting large PDFs
+                         (default: CPU count; 1 splits in-process)
+            workspace_root: Parent directory for per-job scratch space
+                            (default: $TMPDIR/gradingbot)
+            workspace_quota_bytes: Max scratch bytes one upload job may write
+            max_tool_expressions: Max arithmetic expressions verified per answer
+            tool_mode: "regex" runs tools on pattern matches before grading,
+                       "llm" lets the model request tool calls, "none" disables tools
+            max_tool_rounds: Max tool-call rounds per grade in "llm" mode
+            tool_loop_budget: Seconds after which "llm" mode stops offering tools
+            prompt_layout: "legacy" keeps the original prompt order; "prefix"
+                           orders it from most shared to most specific so
+                           provider-side prompt caching can reuse it
+            store_results: Write every grade to the result store
+            result_store: ResultStore to write to (default: the shared store
+                          at $GRADINGBOT_RESULTS_DB or
+                          ~/.local/share/gradingbot/results.sqlite)
+            cascade: cascade.CascadeConfig to grade with a chain of models,
+                     escalating on low confidence, parse failure or a
+                     borderline score (default: grade with model only)
+            deadline: Seconds one grade_submission may spend on proxy
+                      requests in total (retrieval, model calls and their
+                      retries); None leaves them unbounded
+            client: LLMProxy to use (default: one configured from the
+                    environment), e.g. one recording or replaying a cassette
+            rag_max_chars: Max characters of course-material context put in
+                           a grading prompt (default: no limit)
+            retrieval: adaptive_rag.AdaptiveRetrieval to pick rag_k per
+                       query from the retrieval scores (default: fixed
+                       rag_k and rag_threshold)
         """
-        self.client = LLMProxy()
+        if tool_mode not in TOOL_MODES:
+            raise ValueError(f"tool_mode must be one of {TOOL_MODES}")
+        if prompt_layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"prompt_layout must be one of {PROMPT_LAYOUTS}")
+        _load_env_once()
+        self.client = client if client is not None else LLMProxy()
         self.session_id = session_id
         self.model = model
         # Fixed RAG and temperature parameters
         self.rag_threshold = 0.3
         self.rag_k = 5
+        self.rag_max_chars = rag_max_chars
+        self.retrieval = retrieval
+        # Recent adaptive retrieval decisions, for retrieval_report()
+        self._retrieval_log: Deque[Dict] = deque(maxlen=1000)
         self.temperature = 0.0
+        self.pdf_workers = pdf_workers
+        self.workspace_root = workspace_root
+        self.workspace_quota_bytes = workspace_quota_bytes
+        self.max_tool_expressions = max_tool_expressions
+        self._tool_context_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._rag_cache: "OrderedDict[str, object]" = OrderedDict()
+        self.tool_mode = tool_mode
+        self.max_tool_rounds = max_tool_rounds
+        self.tool_loop_budget = tool_loop_budget
+        self.prompt_layout = prompt_layout
+        self.prefix_tracker = PrefixTracker()
+        self.cascade = cascade
+        self.deadline = deadline
+        # Set while a profile() block runs
+        self.profiler = None
+        self.result_store = None
+        if store_results:
+            from gradingBot.result_store import get_store
+            self.result_store = result_store if result_store is not None else get_store()
         
         # Track uploaded documents
         self.uploaded_docs: List[Dict[str, str]] = []
 
+        from gradingBot.tools import calculator_tool, web_api_tool
         self.tools = {
             "calculator": calculator_tool,
             "web_api": web_api_tool
         }
 
+        # All tool calls and RAG retrieval share one runner with per-tool
+        # budgets; the ChainMap keeps later edits to self.tools visible
+        self.tool_runner = ToolRunner(
+            registry=ChainMap(self.tools, {"retrieve": self.client.retrieve}),
+            budgets={name: ToolBudget(**budget) for name, budget in DEFAULT_TOOL_BUDGETS.items()},
+        )
+
+    def workspace(self) -> Workspace:
+        """
+        Create a unique, self-cleaning scratch directory for one job.
+
+        Use as a context manager; the directory is removed on exit.
+        """
+        return Workspace(root=self.workspace_root, quota_bytes=self.workspace_quota_bytes)
+
+    @staticmethod
+    def _source_name(file_path: UploadSource) -> str:
+        """Display name for a path, an open file object or a buffer."""
+        if isinstance(file_path, (bytes, bytearray, memoryview)):
+            return "upload"
+        if hasattr(file_path, "read"):
+            return str(getattr(file_path, "name", None) or "upload")
+        return str(file_path)
+
     def use_tool(self, tool_name: str, **kwargs) -> Dict:
         """
-        Execute a registered tool by name.
+        Execute a registered tool by name, within its timeout budget.
         """
         if tool_name not in self.tools:
             return {"error": f"Tool '{tool_name}' not found"}
 
-        try:
-            return self.tools[tool_name](**kwargs)
-        except Exception as e:
-            return {"error": str(e)}
+        return self.tool_runner.run(tool_name, **kwargs)
+
+    def use_tools(self, calls: List[Tuple[str, Dict]]) -> List[Dict]:
+        """
+        Execute several (tool_name, kwargs) calls concurrently.
+
+        Returns:
+            Results in the same order as calls
+        """
+        return self.tool_runner.run_many(calls)
+
+    def set_tool_budget(
+        self,
+        tool_name: str,
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        fallback: Optional[Dict] = None
+    ) -> None:
+        """
+        Adjust the budget of a tool (or of "retrieve").
+
+        Args:
+            tool_name: Tool to configure
+            timeout: Seconds from getting a concurrency slot before the call
+                     is abandoned and the fallback used
+            max_concurrency: Max simultaneous calls of this tool
+            fallback: Result returned on timeout
+        """
+        current = self.tool_runner.budget(tool_name)
+        self.tool_runner.set_budget(tool_name, ToolBudget(
+            timeout=current.timeout if timeout is None else timeout,
+            max_concurrency=current.max_concurrency if max_concurrency is None else max_concurrency,
+            fallback=current.fallback if fallback is None else fallback,
+            queue_timeout=current.queue_timeout,
+        ))
+        if tool_name == "calculator" and max_concurrency is not None:
+            # One evaluator process per concurrent calculator call
+            from gradingBot.math_eval import set_max_workers
+            set_max_workers(max_concurrency)
+
+    def tool_metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-tool call counts and timings (calls, errors, timeouts, queue_timeouts,
+        total/mean/max seconds).
+        """
+        return self.tool_runner.metrics()
     
     
-    def upload_syllabus(self, file_path: Union[str, Path], description: Optional[str] = None) -> Dict:
+    def upload_syllabus(self, file_path: UploadSource, description: Optional[str] = None) -> Dict:
         """
         Upload the course syllabus.
         
         Args:
-            file_path: Path to the syllabus PDF file
+            file_path: Path to the syllabus PDF file, an open binary file object or a bytes-like buffer
             description: Optional description of the document
             
         Returns:
@@ -91,14 +288,14 @@ class GradingBot:
         if "error" not in result:
             self.uploaded_docs.append({
                 "type": "syllabus",
-                "path": str(file_path),
+                "path": self._source_name(file_path),
                 "description": description or "Course Syllabus"
             })
         return result
     
     def upload_homework_assignment(
         self,
-        file_path: Union[str, Path],
+        file_path: UploadSource,
         assignment_name: Optional[str] = None,
         description: Optional[str] = None
     ) -> Dict:
@@ -106,14 +303,14 @@ class GradingBot:
         Upload a homework assignment.
         
         Args:
-            file_path: Path to the assignment PDF file
+            file_path: Path to the assignment PDF file, an open binary file object or a bytes-like buffer
             assignment_name: Name of the assignment (e.g., "HW1", "Homework 2")
             description: Optional description
             
         Returns:
             Response from upload operation
         """
-        desc = description or f"Homework Assignment: {assignment_name or Path(file_path).stem}"
+        desc = description or f"Homework Assignment: {assignment_name or Path(self._source_name(file_path)).stem}"
         result = self.client.upload_file(
             file_path=file_path,
             session_id=self.session_id,
@@ -123,7 +320,7 @@ class GradingBot:
         if "error" not in result:
             self.uploaded_docs.append({
                 "type": "homework_assignment",
-                "path": str(file_path),
+                "path": self._source_name(file_path),
                 "assignment_name": assignment_name,
                 "description": desc
             })
@@ -131,7 +328,7 @@ class GradingBot:
     
     def upload_homework_solution(
         self,
-        file_path: Union[str, Path],
+        file_path: UploadSource,
         assignment_name: Optional[str] = None,
         description: Optional[str] = None
     ) -> Dict:
@@ -139,14 +336,14 @@ class GradingBot:
         Upload a homework solution/answer key.
         
         Args:
-            file_path: Path to the solution PDF file
+            file_path: Path to the solution PDF file, an open binary file object or a bytes-like buffer
             assignment_name: Name of the assignment this solution corresponds to
             description: Optional description
             
         Returns:
             Response from upload operation
         """
-        desc = description or f"Homework Solution: {assignment_name or Path(file_path).stem}"
+        desc = description or f"Homework Solution: {assignment_name or Path(self._source_name(file_path)).stem}"
         result = self.client.upload_file(
             file_path=file_path,
             session_id=self.session_id,
@@ -156,7 +353,7 @@ class GradingBot:
         if "error" not in result:
             self.uploaded_docs.append({
                 "type": "homework_solution",
-                "path": str(file_path),
+                "path": self._source_name(file_path),
                 "assignment_name": assignment_name,
                 "description": desc
             })
@@ -164,7 +361,7 @@ class GradingBot:
     
     def upload_lecture_material(
         self,
-        file_path: Union[str, Path],
+        file_path: UploadSource,
         lecture_name: Optional[str] = None,
         description: Optional[str] = None
     ) -> Dict:
@@ -172,14 +369,14 @@ class GradingBot:
         Upload lecture slides or reading materials.
         
         Args:
-            file_path: Path to the lecture PDF file
+            file_path: Path to the lecture PDF file, an open binary file object or a bytes-like buffer
             lecture_name: Name/title of the lecture
             description: Optional description
             
         Returns:
             Response from upload operation
         """
-        desc = description or f"Lecture Material: {lecture_name or Path(file_path).stem}"
+        desc = description or f"Lecture Material: {lecture_name or Path(self._source_name(file_path)).stem}"
         result = self.client.upload_file(
             file_path=file_path,
             session_id=self.session_id,
@@ -189,7 +386,7 @@ class GradingBot:
         if "error" not in result:
             self.uploaded_docs.append({
                 "type": "lecture_material",
-                "path": str(file_path),
+                "path": self._source_name(file_path),
                 "lecture_name": lecture_name,
                 "description": desc
             })
@@ -221,55 +418,61 @@ class GradingBot:
     #     return result
     
     # Updated to automatically split up large uploads
-    def upload_textbook(self, file_path: Union[str, Path], description: Optional[str] = None) -> Dict:
+    def upload_textbook(self, file_path: UploadSource, description: Optional[str] = None) -> Dict:
         """
         Upload the course textbook.
         
         Args:
-            file_path: Path to the textbook PDF file
+            file_path: Path to the textbook PDF file, an open binary file object or a bytes-like buffer
             description: Optional description
             
         Returns:
             Response from upload operation
         """
-        # Debug
-        print("DEBUG: upload_textbook received file size (MB):",
-              Path(file_path).stat().st_size / (1024 * 1024))
+        doc_name = Path(self._source_name(file_path)).stem
+        doc_descr = description or "Course Textbook"
 
+        if not isinstance(file_path, (str, Path)):
+            # Already in memory: split in place and stream each part straight
+            # into the uploader, with no scratch files
+            from gradingBot.pdf_split import iter_parts
 
-        file_path = Path(file_path)
-        doc_name = file_path.stem
-        doc_descr = description or "Course Textbook"
+            parts = (
+                (f"{doc_name}_part{n}.pdf", part)
+                for n, part in enumerate(iter_parts(file_path, max_pages_per_chunk=150), 1)
+            )
+            results, uploaded_chunk_names = self._upload_textbook_parts(parts, doc_descr)
+        else:
+            # Split parts live in a per-job directory that is removed afterwards,
+            # whether the upload succeeds or fails
+            with self.workspace() as ws:
+                try:
+                    file_path = Path(file_path)
 
-        # Split into chunks if needed
-        chunks = self._split_large_pdfs(
-            filepath=file_path,
-            doctype="textbook",
-            max_pages_per_chunk=150,
-            doc_name=doc_name,
-            doc_descr=doc_descr
-        )
+                    # Debug
+                    print("DEBUG: upload_textbook received file size (MB):",
+                          file_path.stat().st_size / (1024 * 1024))
 
-        # Track results and chunk info
-        results = []
-        uploaded_chunk_names = []
+                    # Parts take about as much space as the original
+                    ws.reserve(file_path.stat().st_size)
 
-        for chunk_file in chunks:
-            print("Uploading ", doc_name)
-            result = self.client.upload_file(
-                file_path=chunk_file,
-                session_id=self.session_id,
-                description=doc_descr,
-                strategy="smart"
-            )
-            if "error" not in result:
-                self.uploaded_docs.append({
-                    "type": "textbook",
-                    "path": str(chunk_file),
-                    "description": doc_descr
-                })
-                uploaded_chunk_names.append(chunk_file.name)
-            results.append(result)
+                    # Split into chunks if needed; the split stops as soon as
+                    # the parts reach the quota
+                    chunks = self._split_large_pdfs(
+                        filepath=file_path,
+                        doctype="textbook",
+                        out_dir=ws.path,
+                        max_pages_per_chunk=150,
+                        doc_name=doc_name,
+                        doc_descr=doc_descr,
+                        quota_bytes=ws.quota_bytes
+                    )
+                except WorkspaceQuotaError as e:
+                    return {"result": {"error": str(e)}, "chunks": []}
+
+                results, uploaded_chunk_names = self._upload_textbook_parts(
+                    ((chunk_file.name, chunk_file) for chunk_file in chunks), doc_descr
+                )
 
         # Return last result as representative
         # return results[-1] if results else {"error": "No file uploaded"}
@@ -282,14 +485,59 @@ class GradingBot:
 
     
 
+    def _upload_textbook_parts(
+        self,
+        parts: Iterable[Tuple[str, Union[Path, BinaryIO]]],
+        doc_descr: str
+    ) -> Tuple[List[Dict], List[str]]:
+        """
+        Upload (name, path or BytesIO) textbook parts in order.
+
+        Returns:
+            (upload results, names of the parts that were accepted)
+        """
+        results = []
+        uploaded_chunk_names = []
+        for name, part in parts:
+            print("Uploading ", name)
+            if isinstance(part, Path):
+                result = self.client.upload_file(
+                    file_path=part,
+                    session_id=self.session_id,
+                    description=doc_descr,
+                    strategy="smart"
+                )
+            else:
+                # Stream the part's bytes directly; the view is released
+                # before the buffer is dropped
+                with part, part.getbuffer() as view:
+                    result = self.client.upload_file(
+                        file_path=view,
+                        session_id=self.session_id,
+                        mime_type="application/pdf",
+                        description=doc_descr,
+                        strategy="smart"
+                    )
+            if "error" not in result:
+                self.uploaded_docs.append({
+                    "type": "textbook",
+                    "path": name,
+                    "description": doc_descr
+                })
+                uploaded_chunk_names.append(name)
+            results.append(result)
+        return results, uploaded_chunk_names
+
     # For PDFs exceeding max upload size, split automatically
     def _split_large_pdfs(
             self, 
             filepath: Union[str,Path],
             doctype: str,
+            out_dir: Union[str, Path],
             max_pages_per_chunk: int = 255,
             doc_name: Optional[str] = None,
-            doc_descr: Optional[str] = None
+            doc_descr: Optional[str] = None,
+            quota_bytes: Optional[int] = None
     ) -> list[Path]:
         """
         Split a large PDF into smaller chunks and prepare them for upload.
@@ -297,39 +545,26 @@ class GradingBot:
         Args:
             filepath: Path to the original PDF file.
             doctype: Document type ("syllabus", "lecture", "assignment", etc.)
+            out_dir: Directory the parts are written to (normally a job workspace).
             max_pages_per_chunk: Max pages per split PDF.
             doc_name: Optional name of the document.
             doc_descr: Optional description of the document.
+            quota_bytes: Max bytes of all files in out_dir (None = unlimited).
 
         Returns:
-            List of paths to the split PDF files (temporary files ready for upload).
+            List of paths to the split PDF files (ready for upload).
         """
-        # Initialize return
-        chunk_files: List[Path] = []
-        
-        # Open pdf and count pages
-        filepath = Path(filepath)
-        reader = PdfReader(str(filepath))
-        total_pages = len(reader.pages)
-
-        for start in range(0, total_pages, max_pages_per_chunk):
-            end = min(start + max_pages_per_chunk, total_pages)
-            writer = PdfWriter()
-
-            # Add max pages to pdf chunk
-            for i in range(start, end):
-                writer.add_page(reader.pages[i])
-            
-            # Save chunk to temp file
-            temp_file = Path(tempfile.gettempdir()) / f"{filepath.stem}_part{start//max_pages_per_chunk + 1}.pdf"
-            
-            with open(temp_file, "wb") as f:
-                writer.write(f)
+        from gradingBot.pdf_split import split_pdf
+
+        # Pages are copied in parallel, one PdfReader per worker process
+        chunk_files = split_pdf(
+            filepath=filepath,
+            out_dir=out_dir,
+            max_pages_per_chunk=max_pages_per_chunk,
+            max_workers=self.pdf_workers,
+            quota_bytes=quota_bytes
+        )
 
-            # Add chunk to list
-            chunk_files.append(temp_file)
-            print("Adding chunk: ", i)
-        
         print("DEBUG: Total chunks created =", len(chunk_files))
 
 
@@ -346,43 +581,30 @@ class GradingBot:
         """
         sleep(seconds)
     
-    def _format_rag_context(self, rag_context: List[Dict]) -> str:
+    def _format_rag_context(self, rag_context: List[Dict]) -> FormattedContext:
         """
-        Format RAG context into a readable string for the LLM.
+        Format RAG context for the LLM: chunks grouped per document, exact
+        and near-duplicate chunks dropped, at most rag_max_chars long.
         
         Args:
             rag_context: List of retrieved context chunks from RAG
             
         Returns:
-            Formatted context string
+            FormattedContext with the context string (.text, "" when nothing
+            was retrieved) and the citation IDs of the chunks shown
         """
-        if not rag_context:
-            return ""
-        
-        context_string = "The following context from course materials may be helpful:\n\n"
-        
-        for i, collection in enumerate(rag_context, 1):
-            doc_summary = collection.get('doc_summary', '')
-            chunks = collection.get('chunks', [])
-            
-            if doc_summary:
-                context_string += f"[Document {i}]: {doc_summary}\n"
-            
-            for j, chunk in enumerate(chunks, 1):
-                context_string += f"  {i}.{j}. {chunk}\n"
-            
-            context_string += "\n"
-        
-        return context_string
+        return format_rag_context(rag_context, max_chars=self.rag_max_chars)
     
     def grade_submission(
         self,
         question: str,
         student_answer: str,
         max_points: Optional[float] = None,
-        rubric: Optional[str] = None,
+        rubric: Union[str, Rubric, None] = None,
         assignment_name: Optional[str] = None,
-        wait_after_upload: bool = True
+        wait_after_upload: bool = True,
+        on_token: Optional[Callable[[str], None]] = None,
+        student_id: Optional[str] = None
     ) -> Dict:
         """
         Grade a student submission using RAG to retrieve relevant course materials.
@@ -391,9 +613,14 @@ class GradingBot:
             question: The question or problem statement
             student_answer: The student's answer to grade
             max_points: Maximum points for this question (optional)
-            rubric: Additional grading rubric or instructions (optional)
+            rubric: Grading rubric or instructions (optional), as text or a
+                    compiled rubric.Rubric; text is compiled once per
+                    distinct rubric
             assignment_name: Name of the assignment (for context)
             wait_after_upload: Whether to wait after uploading (if student_answer is a file)
+            on_token: Optional callback; when given, the feedback is streamed and
+                      each text fragment is passed to it as it arrives
+            student_id: Student identifier recorded with the grade in the result store
             
         Returns:
             Dictionary containing:
@@ -401,43 +628,62 @@ class GradingBot:
                 - feedback: Detailed feedback
                 - rag_context_used: Context retrieved from course materials
                 - raw_response: Full LLM response
+                - criteria: Per-criterion points and scores (rubrics with criteria);
+                            when every criterion is scored, score is their sum
+                - record_id: Row id in the result store (when results are stored)
         """
+        # Every proxy request of this grade shares one time budget
+        with self.client.deadline(self.deadline):
+            return self._grade_submission(
+                question, student_answer, max_points, rubric, assignment_name, on_token, student_id
+            )
 
+    def _grade_submission(
+        self,
+        question: str,
+        student_answer: str,
+        max_points: Optional[float],
+        rubric: Union[str, Rubric, None],
+        assignment_name: Optional[str],
+        on_token: Optional[Callable[[str], None]],
+        student_id: Optional[str]
+    ) -> Dict:
+        started = time.perf_counter()
+        rubric = compile_rubric(rubric)
 
+        # Retrieve relevant context from course materials; runs in the
+        # background while the tools verify the answer. Context fetched by
+        # prefetch_rag_context() is used once and skips the round trip; in
+        # the "prefix" layout it is shared by every answer to the question.
+        shared_context = self.prompt_layout == "prefix"
+        with self._phase("retrieve_submit"):
+            query = self._retrieval_query(question, student_answer, max_points, rubric, assignment_name)
+            prefetched = self._rag_cache.get(query) if shared_context else self._rag_cache.pop(query, None)
+            if prefetched is None:
+                rag_threshold, rag_k = self._retrieval_params()
+                rag_future = self.tool_runner.submit(
+                    "retrieve",
+                    query=query,
+                    session_id=self.session_id,
+                    rag_threshold=rag_threshold,
+                    rag_k=rag_k
+                )
 
-        # Build the grading query with context
-        query_parts = []
-        
-        if assignment_name:
-            query_parts.append(f"Assignment: {assignment_name}")
-        
-        query_parts.append(f"Question: {question}")
-        query_parts.append(f"\nStudent Answer:\n{student_answer}")
-        
-        if rubric:
-            query_parts.append(f"\nGrading Rubric:\n{rubric}")
-        
-        if max_points:
-            query_parts.append(f"\nMaximum Points: {max_points}")
-        
-        query = "\n".join(query_parts)
+        #tool detection (in "llm" mode the model asks for tools itself)
+        tool_context = ""
+        if self.tool_mode == "regex":
+            with self._phase("tools"):
+                tool_context = self._run_tools_for_submission(student_answer)
 
-        #tool detection
-        tool_context = self._run_tools_for_submission(student_answer)
-        
-        # Retrieve relevant context from course materials
-        rag_result = self.client.retrieve(
-            query=query,
-            session_id=self.session_id,
-            rag_threshold=self.rag_threshold,
-            rag_k=self.rag_k
-        )
+        with self._phase("retrieve_wait"):
+            rag_result = prefetched if prefetched is not None else rag_future.result()
         
         # Check for errors in retrieval
         if "error" in rag_result:
             return {
                 "error": f"RAG retrieval failed: {rag_result['error']}",
-                "raw_response": rag_result
+                "raw_response": rag_result,
+                "request_type": "retrieve"
             }
         
         # Extract RAG context
@@ -452,76 +698,166 @@ class GradingBot:
         else:
             rag_context = []
 
-        formatted_context = self._format_rag_context(rag_context)
+        with self._phase("format_context"):
+            retrieval_decision = None
+            if self.retrieval is not None:
+                rag_context, retrieval_decision = self._select_rag_context(rag_context)
+            formatted = self._format_rag_context(rag_context)
+            formatted_context = formatted.text
+            if shared_context and prefetched is None:
+                self._remember_rag_context(query, rag_result)
                 
-        # Build system prompt for grading
-        system_prompt = """You are an expert teaching assistant grading a student submission for a Discrete Math course.
-
-Your task is to:
-1. Evaluate the student's answer for correctness, completeness, and clarity
-2. Compare it against the course materials and solutions provided in the context
-3. Provide constructive feedback highlighting what the student did well and what needs improvement
-4. Assign a score if maximum points are specified
-
-Guidelines:
-- Be fair and consistent in your grading
-- Reference specific course materials when relevant
-- Provide specific, actionable feedback
-- If the answer is partially correct, explain what parts are correct and what needs work
-- Consider mathematical rigor, notation, and explanation quality
-- If the answer is incorrect, guide the student toward the correct approach without giving away the full solution
-
-Format your response as:
-SCORE: [X/Y points] (if max_points provided)
-FEEDBACK:
-[Detailed feedback here]"""
-        
-        # Combine query with RAG context
-        '''if formatted_context:
-            full_query = f"{formatted_context}\n\n{query}"
-        else:
-            full_query = query'''
+        with self._phase("build_prompt"):
+            system_prompt = GRADING_SYSTEM_PROMPT
+            if self.cascade is not None:
+                from gradingBot.cascade import CONFIDENCE_INSTRUCTION
+                system_prompt += CONFIDENCE_INSTRUCTION
+            full_query = build_query(
+                self.prompt_layout,
+                question,
+                student_answer,
+                max_points=max_points,
+                rubric=rubric.prompt_text() if rubric is not None else None,
+                assignment_name=assignment_name,
+                rag_context=formatted_context,
+                tool_context=tool_context,
+            )
+            self.prefix_tracker.add(serialize_prompt(system_prompt, full_query))
         
-        #  RAG context + Tool context + Query
-        full_query_parts = []
+        # Generate grading using LLM with RAG; in cascade mode each model's
+        # grade is checked and the next model is tried if it is not good enough.
+        # A stage that fails keeps the last grade an earlier stage produced.
+        models = self.cascade.models if self.cascade is not None else (self.model,)
+        attempts: List[Dict] = []
+        graded = None  # (stage, model, response, result_text, score, criteria, tool_calls, confidence)
+        for stage, model in enumerate(models):
+            last_stage = stage == len(models) - 1
+            stage_on_token = on_token if last_stage else None
+            tool_calls: List[Dict] = []
+            with self._phase("generate"):
+                if self.tool_mode == "llm":
+                    response, tool_calls = self._generate_with_tools(system_prompt, full_query, stage_on_token, model)
+                else:
+                    response = self._generate(system_prompt, full_query, stage_on_token, model)
 
-        if formatted_context:
-            full_query_parts.append(formatted_context)
+            if "error" in response:
+                if self.cascade is None:
+                    break
+                attempts.append({"model": model, "escalation_reason": "error", "error": response["error"]})
+                continue
 
-        if tool_context:
-            full_query_parts.append("\nTOOL VERIFICATION RESULTS:\n" + tool_context)
+            # Extract result text
+            with self._phase("parse"):
+                result_text = response.get("result", "")
+                score = self._parse_score(result_text, max_points)
+                criteria = None
+                if rubric is not None and rubric.scored_by_criteria:
+                    criteria, criteria_total = rubric.score_reply(result_text, max_points)
+                    if criteria_total is not None and max_points:
+                        score = criteria_total
+                confidence = reason = None
+                if self.cascade is not None:
+                    from gradingBot.cascade import escalation_reason, parse_confidence
 
-        full_query_parts.append(query)
+                    confidence = parse_confidence(result_text)
+                    reason = None if last_stage else escalation_reason(self.cascade, score, max_points, confidence)
+            graded = (stage, model, response, result_text, score, criteria, tool_calls, confidence)
+            if self.cascade is None:
+                break
+            attempts.append({"model": model, "score": score, "confidence": confidence, "escalation_reason": reason})
+            if reason is None:
+                break
 
-        full_query = "\n\n".join(full_query_parts)
-        
-        # Generate grading using LLM with RAG
-        response = self.client.generate(
-            model=self.model,
-            system=system_prompt,
-            query=full_query,
-            temperature=self.temperature,
-            session_id=self.session_id,
-            rag_usage=False,  # We're manually including context
-            rag_threshold=self.rag_threshold,
-            rag_k=self.rag_k
-        )
-        
-        if "error" in response:
+        if graded is None:
             return {
                 "error": f"Grading generation failed: {response['error']}",
-                "raw_response": response
+                "raw_response": response,
+                "request_type": "call"
             }
-        
-        # Extract result text
-        result_text = response.get("result", "")
-        
-        # Try to parse score if max_points provided
+        stage, model, response, result_text, score, criteria, tool_calls, confidence = graded
+        # Only the last stage streams; a grade kept from an earlier one is sent whole
+        if on_token is not None and result_text and stage < len(models) - 1:
+            on_token(result_text)
+
+        result = {
+            "score": score,
+            "max_points": max_points,
+            "feedback": result_text,
+            "rag_context_used": formatted_context if formatted_context else "No relevant context retrieved",
+            "raw_response": response,
+            "model": model,
+            "citations": formatted.citation_ids,
+        }
+        if retrieval_decision is not None:
+            result["retrieval"] = retrieval_decision
+        if criteria is not None:
+            result["criteria"] = criteria
+        if self.tool_mode == "llm":
+            result["tool_calls"] = tool_calls
+        if self.cascade is not None:
+            result["confidence"] = confidence
+            result["cascade"] = attempts
+
+        if self.result_store is not None:
+            with self._phase("store"):
+                usage = response.get("usage") if isinstance(response.get("usage"), dict) else {}
+                record_id = self._store_result(
+                    question=question,
+                    student_answer=student_answer,
+                    feedback=result_text,
+                    score=score,
+                    max_points=max_points,
+                    student_id=student_id,
+                    assignment=assignment_name,
+                    rubric=rubric,
+                    rag_context=formatted_context,
+                    model=model,
+                    latency_seconds=time.perf_counter() - started,
+                    prompt_tokens=usage.get("prompt_tokens", estimate_tokens(system_prompt + full_query)),
+                    completion_tokens=usage.get("completion_tokens", estimate_tokens(result_text)),
+                )
+            if record_id is not None:
+                result["record_id"] = record_id
+        return result
+
+    def _store_result(self, **fields) -> Optional[int]:
+        """Write one grade to the result store; storage failures never fail a grade."""
+        import sqlite3
+        from gradingBot.result_store import GradeRecord
+
+        fields.setdefault("model", self.model)
+        try:
+            return self.result_store.add(GradeRecord(session_id=self.session_id, **fields))
+        except (sqlite3.Error, OSError) as e:
+            print(f"WARNING: could not store grade: {e}")
+            return None
+
+    def stored_grade(
+        self,
+        question: str,
+        student_answer: str,
+        rubric: Union[str, Rubric, None] = None,
+        max_points: Optional[float] = None
+    ) -> Optional[Dict]:
+        """
+        Most recent stored grade of this exact answer to this question (same
+        rubric, max_points and model), so a past grade can be recovered
+        without calling the model again. None if there is none or results
+        are not stored.
+        """
+        if self.result_store is None:
+            return None
+        return self.result_store.latest(
+            question, student_answer, rubric=rubric, model=self.model, max_points=max_points
+        )
+
+    @staticmethod
+    def _parse_score(result_text: str, max_points: Optional[float]) -> Optional[float]:
+        """Score from a "SCORE: X/Y" line, scaled to max_points; None if absent."""
         score = None
         if max_points and result_text:
             # Look for score pattern like "SCORE: X/Y" or "X/Y points"
-            import re
-            score_match = re.search(r'(\d+\.?\d*)\s*/\s*(\d+\.?\d*)', result_text)
+            score_match = _SCORE_RE.search(result_text)
             if score_match:
                 try:
                     score = float(score_match.group(1))
@@ -529,25 +865,344 @@ FEEDBACK:
                     # Normalize if needed
                     if max_pts != max_points:
                         score = (score / max_pts) * max_points
-                except ValueError:
-                    pass
-        
-        return {
-            "score": score,
-            "max_points": max_points,
-            "feedback": result_text,
-            "rag_context_used": formatted_context if formatted_context else "No relevant context retrieved",
-            "raw_response": response
-        }
+                except (ValueError, ZeroDivisionError):
+                    score = None
+        return score
+
+    def _generate(
+        self,
+        system_prompt: str,
+        full_query: str,
+        on_token: Optional[Callable[[str], None]] = None,
+        model: Optional[str] = None
+    ) -> Dict:
+        """One grading generation (with model, default self.model), streamed when on_token is given."""
+        if on_token is not None:
+            return self._generate_streaming(system_prompt, full_query, on_token, model)
+        return self.client.generate(
+            model=model or self.model,
+            system=system_prompt,
+            query=full_query,
+            temperature=self.temperature,
+            session_id=self.session_id,
+            rag_usage=False,  # We're manually including context
+            rag_threshold=self.rag_threshold,
+            rag_k=self.rag_k
+        )
+
+    def _generate_with_tools(
+        self,
+        system_prompt: str,
+        full_query: str,
+        on_token: Optional[Callable[[str], None]] = None,
+        model: Optional[str] = None
+    ) -> Tuple[Dict, List[Dict]]:
+        """
+        Function-calling loop: the model sees the tool schema and may request
+        calls; they run in parallel and the results go back in one follow-up
+        turn. Bounded by max_tool_rounds and tool_loop_budget seconds.
+
+        Returns:
+            (final generate() response, list of executed calls with results).
+            The response never contains TOOL_CALLS text; it is an error dict
+            when the model's tool request cannot be parsed, or when it still
+            asks for tools in the last turn.
+        """
+        from gradingBot.tool_calling import (
+            ToolCallError, build_tool_schema, parse_tool_calls, render_tool_instructions,
+            render_tool_results, strip_tool_calls
+        )
+
+        deadline = time.monotonic() + self.tool_loop_budget
+        tools_system = f"{system_prompt}\n\n{render_tool_instructions(build_tool_schema(self.tools))}"
+        query = full_query
+        executed: List[Dict] = []
+
+        for round_number in range(self.max_tool_rounds + 1):
+            final = round_number == self.max_tool_rounds or time.monotonic() >= deadline
+            if final:
+                # Last turn: no tools on offer, so the reply can be streamed
+                response = self._generate(system_prompt, query, on_token, model)
+                if response.get("result"):
+                    response["result"] = strip_tool_calls(response["result"])
+                    if not response["result"]:
+                        return {
+                            "error": "The model asked for more tool calls after the tool budget was spent",
+                            "status_code": None,
+                        }, executed
+                return response, executed
+
+            response = self._generate(tools_system, query, model=model)
+            if "error" in response:
+                return response, executed
+
+            try:
+                calls = parse_tool_calls(response.get("result", ""), self.tools)
+            except ToolCallError as e:
+                return {"error": f"Could not parse the model's tool request: {e}", "status_code": None}, executed
+            if not calls:
+                # Answered directly, no tools needed
+                response["result"] = strip_tool_calls(response.get("result", ""))
+                if on_token is not None and response["result"]:
+                    on_token(response["result"])
+                return response, executed
+
+            results = self.use_tools([(call.name, call.arguments) for call in calls])
+            executed.extend(
+                {"name": call.name, "arguments": call.arguments, "result": result}
+                for call, result in zip(calls, results)
+            )
+            query = f"{query}\n\n{render_tool_results(calls, results)}"
+
+        return response, executed
     
 
     
+    def _generate_streaming(
+        self,
+        system_prompt: str,
+        full_query: str,
+        on_token: Callable[[str], None],
+        model: Optional[str] = None
+    ) -> Dict:
+        """
+        Stream a grading response, forwarding fragments to on_token.
+
+        Returns a dict shaped like LLMProxy.generate() so the caller can treat
+        both paths the same way.
+        """
+        parts: List[str] = []
+        try:
+            for delta in self.client.generate_stream(
+                model=model or self.model,
+                system=system_prompt,
+                query=full_query,
+                temperature=self.temperature,
+                session_id=self.session_id,
+                rag_usage=False,
+                rag_threshold=self.rag_threshold,
+                rag_k=self.rag_k
+            ):
+                parts.append(delta)
+                on_token(delta)
+        except StreamError as e:
+            error = {"error": str(e), "status_code": e.status_code, "partial_result": "".join(parts)}
+            if isinstance(e.__cause__, CircuitOpenError):
+                error["circuit_open"] = True
+            return error
+        return {"result": "".join(parts), "streamed": True}
+
+    def grade_many(
+        self,
+        question: str,
+        submissions: Mapping[str, str],
+        max_points: Optional[float] = None,
+        rubric: Union[str, Rubric, None] = None,
+        assignment_name: Optional[str] = None,
+        dedupe: bool = True,
+        similarity_threshold: float = 0.9,
+        review_propagated: bool = False,
+        max_pause: float = 600.0
+    ) -> Dict[str, Dict]:
+        """
+        Grade every student's answer to one question, grading each cluster of
+        near-identical answers once.
+
+        Answers are normalized and clustered (gradingBot.dedupe); only the
+        representative of each cluster goes to the model, and its grade is
+        copied to the other members.
+
+        Args:
+            question: The question or problem statement
+            submissions: student_id -> answer text
+            max_points: Maximum points for this question (optional)
+            rubric: Additional grading rubric or instructions (optional)
+            assignment_name: Name of the assignment (for context)
+            dedupe: Cluster answers; False grades every answer
+            similarity_threshold: Minimum shingle Jaccard similarity to the
+                                  representative (1.0 = identical after
+                                  normalization only)
+            review_propagated: Mark grades copied to answers that differ from
+                               the representative with needs_review=True
+            max_pause: Seconds the batch may wait in total for the proxy while
+                       its circuit breaker is open, or back off after other
+                       transient failures (network errors, 429/5xx). Such
+                       answers are graded again instead of failing fast;
+                       once the pause budget is spent, they keep their error
+                       (circuit_open while the circuit is open).
+
+        Returns:
+            student_id -> grade_submission() result. Copied grades also have
+            propagated_from (the representative's student_id), similarity
+            and needs_review.
+        """
+        from gradingBot.dedupe import cluster_answers
+
+        rubric = compile_rubric(rubric)
+        student_ids = list(submissions)
+        answers = [submissions[sid] for sid in student_ids]
+        if dedupe:
+            with self._phase("dedupe"):
+                clusters = cluster_answers(answers, threshold=similarity_threshold)
+        else:
+            clusters = [None] * len(answers)
+
+        pause_budget = [max_pause]
+        results: Dict[str, Dict] = {}
+        for n, cluster in enumerate(clusters):
+            rep = cluster.representative if cluster is not None else n
+            graded = self._grade_or_pause(
+                pause_budget,
+                question=question,
+                student_answer=answers[rep],
+                max_points=max_points,
+                rubric=rubric,
+                assignment_name=assignment_name,
+                student_id=student_ids[rep]
+            )
+            results[student_ids[rep]] = graded
+            if cluster is None or "error" in graded:
+                # Failed grades are not copied; members are graded on their own
+                for member in (cluster.members[1:] if cluster is not None else []):
+                    results[student_ids[member]] = self._grade_or_pause(
+                        pause_budget,
+                        question=question,
+                        student_answer=answers[member],
+                        max_points=max_points,
+                        rubric=rubric,
+                        assignment_name=assignment_name,
+                        student_id=student_ids[member]
+                    )
+                continue
+
+            for member in cluster.members[1:]:
+                copied = {k: v for k, v in graded.items() if k != "record_id"}
+                copied.update({
+                    "propagated_from": student_ids[rep],
+                    "similarity": cluster.similarity[member],
+                    "needs_review": review_propagated and not cluster.exact[member],
+                })
+                if self.result_store is not None:
+                    record_id = self._store_result(
+                        question=question,
+                        student_answer=answers[member],
+                        feedback=graded["feedback"],
+                        score=graded["score"],
+                        max_points=max_points,
+                        student_id=student_ids[member],
+                        assignment=assignment_name,
+                        rubric=rubric,
+                        rag_context=graded["rag_context_used"],
+                        model=graded.get("model", self.model),
+                        latency_seconds=0.0,
+                        prompt_tokens=0,
+                        completion_tokens=0,
+                    )
+                    if record_id is not None:
+                        copied["record_id"] = record_id
+                results[student_ids[member]] = copied
+
+        return {sid: results[sid] for sid in student_ids}
+
+    def grade_pool(
+        self,
+        question: str,
+        submissions: Mapping[str, str],
+        workers: Optional[int] = None,
+        queue_path: Optional[Union[str, Path]] = None,
+        requests_per_second: Optional[float] = None,
+        **grade_kwargs
+    ) -> Dict[str, Dict]:
+        """
+        grade_many() spread over worker processes (gradingBot.worker_pool).
+
+        Answers are packed into jobs (a cluster of near-identical answers is
+        never split) and queued in a SQLite file; `workers` processes, each
+        with its own GradingBot built from this one's settings, grade them
+        and the results are merged. Workers on other hosts can join with
+        `python -m gradingBot.worker_pool QUEUE_PATH`. All workers draw their
+        proxy requests from one shared rate-limit budget.
+
+        Args:
+            question: The question or problem statement
+            submissions: student_id -> answer text
+            workers: Local worker processes (default: CPU count; 0 leaves
+                     the jobs to workers on other hosts)
+            queue_path: Queue file, e.g. on a shared filesystem
+                        (default: a temporary file)
+            requests_per_second: Proxy request budget of the whole pool
+                                 (default: this client's rate limit, if any)
+            **grade_kwargs: max_points, rubric, assignment_name, dedupe,
+                            similarity_threshold, review_propagated and
+                            max_pause, as for grade_many()
+
+        Returns:
+            student_id -> result, in input order, as from grade_many()
+        """
+        from gradingBot.worker_pool import grade_pool
+
+        return grade_pool(
+            self,
+            question,
+            submissions,
+            workers=workers,
+            queue_path=queue_path,
+            requests_per_second=requests_per_second,
+            **grade_kwargs
+        )
+
+    # Grades retried by grade_many after transient proxy failures, at most
+    _MAX_GRADE_ATTEMPTS = 10
+    # Backoff between those retries (seconds, doubling), charged to the pause budget
+    _RETRY_BACKOFF = 1.0
+    _MAX_RETRY_BACKOFF = 30.0
+
+    def _grade_or_pause(self, pause_budget: List[float], **kwargs) -> Dict:
+        """
+        grade_submission(), but a grade that failed transiently (open
+        circuit, network error, 429/5xx) is graded again: after waiting for
+        the failed request type's circuit to half-open, or after a backoff
+        while it is still closed. Both waits draw on pause_budget[0]
+        seconds; once it is spent, or after _MAX_GRADE_ATTEMPTS, the last
+        error is returned.
+        """
+        # Breakers of the request types this grade has failed on; "call" is
+        # always used, "retrieve" only when the context was not prefetched
+        request_types = ["call"]
+        graded: Dict = {}
+        for attempt in range(self._MAX_GRADE_ATTEMPTS):
+            wait = self.client.circuit_wait(request_types)
+            if wait > 0:
+                if wait > pause_budget[0]:
+                    return {
+                        "error": f"Not graded: the LLM proxy is unavailable (circuit open for another {wait:.0f}s)",
+                        "status_code": None,
+                        "circuit_open": True,
+                        "circuit_state": self.client.circuit_state(),
+                    }
+                pause_budget[0] -= wait
+                time.sleep(wait)
+            graded = self.grade_submission(**kwargs)
+            failed_type = _transient_failure(graded)
+            if failed_type is None:
+                return graded
+            if failed_type not in request_types:
+                request_types.append(failed_type)
+            if self.client.circuit_wait(request_types) > 0:
+                continue  # the next turn waits for the circuit
+            backoff = min(self._RETRY_BACKOFF * 2 ** attempt, self._MAX_RETRY_BACKOFF)
+            if backoff > pause_budget[0]:
+                return graded
+            pause_budget[0] -= backoff
+            time.sleep(backoff)
+        return graded
+
     def grade_from_file(
         self,
         question: str,
         student_answer_file: Union[str, Path],
         max_points: Optional[float] = None,
-        rubric: Optional[str] = None,
+        rubric: Union[str, Rubric, None] = None,
         assignment_name: Optional[str] = None
     ) -> Dict:
         """
@@ -595,38 +1250,254 @@ FEEDBACK:
         """
         Automatically detects when tools are needed.
         Returns tool-generated context to assist grading.
+
+        Results are memoized per answer text, so identical answers only run
+        the tools once.
         """
-        tool_context = ""
+        cached = self._tool_context_cache.get(student_answer)
+        if cached is not None:
+            self._tool_context_cache.move_to_end(student_answer)
+            return cached
 
-        import re
+        from gradingBot.tools import find_claims, find_math_expressions
 
-        #detecting simple math expressions
-        math_matches = re.findall(r"\b\d+\s*[\+\-\*\/]\s*\d+\b", student_answer)
+        #detecting simple math expressions (capped per answer)
+        math_matches = find_math_expressions(student_answer, limit=self.max_tool_expressions)
 
-        for expr in math_matches:
-            result = self.use_tool("calculator", expression=expr)
-            if "result" in result:
-                tool_context += f"\nVerified Calculation: {expr} = {result['result']}\n"
+        #detecting complex claims
+        claims = find_claims(student_answer)
 
+        # Calculator and web calls all run concurrently
+        results = self.use_tools(
+            [("calculator", {"expression": expr}) for expr in math_matches]
+            + [("web_api", {"query": claim}) for claim in claims]
+        )
+        calculations = dict(zip(math_matches, results[:len(math_matches)]))
+        lookups = dict(zip(claims, results[len(math_matches):]))
 
-        #detecting complex claims
-        trigger_keywords = ["according to", "research shows", "wikipedia", "study"]
+        tool_context = self._build_tool_context(calculations, lookups)
+        self._remember_tool_context(student_answer, tool_context)
+        return tool_context
+
+    def _retrieval_query(
+        self,
+        question: str,
+        student_answer: str,
+        max_points: Optional[float] = None,
+        rubric: Union[str, Rubric, None] = None,
+        assignment_name: Optional[str] = None
+    ) -> str:
+        """
+        The RAG query for a submission. The "prefix" layout leaves out the
+        answer so every student gets the same (cacheable) course context.
+        """
+        if self.prompt_layout == "prefix":
+            student_answer = None
+        rubric = compile_rubric(rubric)
+        return legacy_query(
+            question, student_answer, max_points, rubric.compact() if rubric is not None else None, assignment_name
+        )
 
-        if any(keyword in student_answer.lower() for keyword in trigger_keywords):
-            web_result = self.use_tool(
-                "web_api",
-                url="https://en.wikipedia.org/api/rest_v1/page/summary/Artificial_intelligence"
+    def _remember_rag_context(self, query: str, result) -> None:
+        self._rag_cache[query] = result
+        self._rag_cache.move_to_end(query)
+        while len(self._rag_cache) > _TOOL_CONTEXT_CACHE_SIZE:
+            self._rag_cache.popitem(last=False)
+
+    def _retrieval_params(self) -> Tuple[float, int]:
+        """(rag_threshold, rag_k) to retrieve with: the adaptive policy's candidates, or the fixed values."""
+        if self.retrieval is not None:
+            return self.retrieval.candidate_threshold, self.retrieval.candidate_k
+        return self.rag_threshold, self.rag_k
+
+    def _select_rag_context(self, rag_context: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """Keep the top k retrieved collections per the adaptive policy and log the choice."""
+        from gradingBot.adaptive_rag import select_context
+
+        kept, decision = select_context(rag_context, self.retrieval)
+        entry = decision.as_dict()
+        self._retrieval_log.append(entry)
+        return kept, entry
+
+    def retrieval_report(self, reset: bool = False) -> Dict:
+        """
+        Adaptive retrieval decisions so far (last 1000): count, mean and
+        distribution of the chosen k, mean candidates and the reasons k was
+        cut. Empty without an adaptive policy.
+
+        Args:
+            reset: Forget the decisions after reporting
+        """
+        decisions = list(self._retrieval_log)
+        if reset:
+            self._retrieval_log.clear()
+        if not decisions:
+            return {}
+        ks = [d["k"] for d in decisions]
+        return {
+            "queries": len(decisions),
+            "mean_k": sum(ks) / len(ks),
+            "k_histogram": dict(sorted(Counter(ks).items())),
+            "mean_candidates": sum(d["candidates"] for d in decisions) / len(decisions),
+            "reasons": dict(Counter(d["reason"] for d in decisions)),
+        }
+
+    def _phase(self, name: str):
+        """Context manager timing a grading phase while profiling (a no-op otherwise)."""
+        return self.profiler.phase(name) if self.profiler is not None else nullcontext()
+
+    @contextmanager
+    def profile(
+        self,
+        mode: str = "sample",
+        output: Optional[Union[str, Path]] = None,
+        interval: float = 0.005
+    ) -> Iterator:
+        """
+        Profile the grading done inside the block.
+
+        Args:
+            mode: "sample" samples every thread's stack (flamegraph output);
+                  "cprofile" runs cProfile on this thread
+            output: Path prefix; on exit <output>.phases.json and
+                    <output>.folded (sample) or <output>.prof (cprofile) are written
+            interval: Seconds between samples in "sample" mode
+
+        Yields:
+            The profiling.GradingProfiler; its report() / format_report()
+            give per-phase wall and CPU time once the block has ended
+        """
+        from gradingBot.profiling import GradingProfiler
+
+        profiler = GradingProfiler(mode, interval=interval)
+        self.profiler = profiler
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            self.profiler = None
+            if output is not None:
+                profiler.write(output)
+
+    def prompt_prefix_report(self, reset: bool = False) -> Dict[str, float]:
+        """
+        How much of the prompts sent since the last reset share a prefix
+        (see prompt_layout.PrefixTracker.report()).
+
+        Args:
+            reset: Start a new batch after reporting
+        """
+        report = self.prefix_tracker.report()
+        if reset:
+            self.prefix_tracker.reset()
+        return report
+
+    def prefetch_rag_context(self, submissions: List[Dict]) -> List:
+        """
+        Retrieve course context for a whole submission set in one round trip.
+
+        Uses LLMProxy.retrieve_many(), so all queries run at once (or as one
+        batch request). Successful results are cached and consumed by the
+        matching grade_submission() call.
+
+        Args:
+            submissions: Dicts with grade_submission() arguments ("question",
+                         "student_answer" and optionally "max_points",
+                         "rubric", "assignment_name")
+
+        Returns:
+            One retrieval result per submission, in order (errors included)
+        """
+        queries = [
+            self._retrieval_query(
+                sub["question"],
+                sub["student_answer"],
+                sub.get("max_points"),
+                sub.get("rubric"),
+                sub.get("assignment_name"),
             )
+            for sub in submissions
+        ]
+        rag_threshold, rag_k = self._retrieval_params()
+        results = self.client.retrieve_many(
+            queries,
+            session_id=self.session_id,
+            rag_threshold=rag_threshold,
+            rag_k=rag_k,
+            max_workers=self.tool_runner.budget("retrieve").max_concurrency,
+        )
+        for query, result in zip(queries, results):
+            if not (isinstance(result, dict) and "error" in result):
+                self._remember_rag_context(query, result)
+        return results
 
-            if "response" in web_result:
-                tool_context += f"\nWeb Verification Snippet:\n{web_result['response'][:500]}\n"
+    def prepare_tool_context(self, student_answers: List[str]) -> Dict[str, str]:
+        """
+        Run tool verification for a whole submission set in one batch.
 
-        return tool_context
+        Every distinct arithmetic expression across all answers is evaluated
+        once, and the per-answer tool context is cached so later
+        grade_submission() calls for these answers skip the tools.
+
+        Args:
+            student_answers: Answers that are about to be graded
+
+        Returns:
+            Mapping of answer text -> tool context string
+        """
+        from gradingBot.tools import find_claims, find_math_expressions
+
+        pending = [a for a in dict.fromkeys(student_answers) if a not in self._tool_context_cache]
+        expressions = {
+            answer: find_math_expressions(answer, limit=self.max_tool_expressions)
+            for answer in pending
+        }
+        claims = {answer: find_claims(answer) for answer in pending}
+
+        # One call per distinct expression and claim across the whole set,
+        # all running concurrently
+        unique_exprs = list(dict.fromkeys(e for exprs in expressions.values() for e in exprs))
+        unique_claims = list(dict.fromkeys(c for cs in claims.values() for c in cs))
+        outputs = self.use_tools(
+            [("calculator", {"expression": expr}) for expr in unique_exprs]
+            + [("web_api", {"query": claim}) for claim in unique_claims]
+        )
+        results = dict(zip(unique_exprs, outputs[:len(unique_exprs)]))
+        lookups = dict(zip(unique_claims, outputs[len(unique_exprs):]))
+
+        for answer in pending:
+            calculations = {expr: results[expr] for expr in expressions[answer]}
+            answer_lookups = {claim: lookups[claim] for claim in claims[answer]}
+            self._remember_tool_context(answer, self._build_tool_context(calculations, answer_lookups))
+
+        return {answer: self._run_tools_for_submission(answer) for answer in student_answers}
+
+    def _build_tool_context(self, calculations: Dict[str, Dict], lookups: Dict[str, Dict]) -> str:
+        """Render calculator and web verification results into a context string."""
+        from gradingBot.web_verify import NO_ANSWER
+
+        parts = [
+            f"\nVerified Calculation: {expr} = {result['result']}\n"
+            for expr, result in calculations.items()
+            if "result" in result
+        ]
+        for claim, result in lookups.items():
+            if result.get("result", NO_ANSWER) != NO_ANSWER:
+                parts.append(f"\nWeb Verification Snippet ({claim}):\n{result['result'][:500]}\n")
+        return "".join(parts)
+
+    def _remember_tool_context(self, student_answer: str, tool_context: str) -> None:
+        self._tool_context_cache[student_answer] = tool_context
+        self._tool_context_cache.move_to_end(student_answer)
+        while len(self._tool_context_cache) > _TOOL_CONTEXT_CACHE_SIZE:
+            self._tool_context_cache.popitem(last=False)
 
 
 # Example usage and CLI interface
 if __name__ == "__main__":
     import argparse
+    from llmproxy import RateLimit
     
     parser = argparse.ArgumentParser(description="Grading Bot - Grade student submissions using LLM with RAG")
     parser.add_argument("--session-id", type=str, required=True,
@@ -638,15 +1509,103 @@ if __name__ == "__main__":
     parser.add_argument("--grade", action="store_true", help="Grade a submission")
     parser.add_argument("--question", type=str, help="Question/problem statement")
     parser.add_argument("--answer", type=str, help="Student's answer (text or file path)")
+    parser.add_argument("--student-id", type=str, help="Student identifier stored with the grade")
+    parser.add_argument("--answers-json", type=str,
+                       help="With --grade: JSON file of {student_id: answer} to grade as one batch")
+    parser.add_argument("--similarity", type=float, default=0.9,
+                       help="Batch grading: min similarity for answers to share a grade (1.0 = identical only)")
+    parser.add_argument("--no-dedupe", action="store_true", help="Batch grading: grade every answer separately")
+    parser.add_argument("--workers", type=int, default=None,
+                       help="Batch grading: grade in this many worker processes (0: only external workers)")
+    parser.add_argument("--queue", type=str, default=None,
+                       help="Batch grading with --workers: shared queue file that workers on other hosts can join")
+    parser.add_argument("--rate-limit", type=str, default=None,
+                       help="Proxy requests per second for the whole run, e.g. '10' or '600/min'")
     parser.add_argument("--max-points", type=float, help="Maximum points for the question")
     parser.add_argument("--rubric", type=str, help="Grading rubric (text or file path)")
     parser.add_argument("--assignment", type=str, help="Assignment name")
     parser.add_argument("--model", type=str, default="4o-mini", help="LLM model to use")
     parser.add_argument("--wait", type=int, default=20, help="Seconds to wait after upload")
+    parser.add_argument("--stream", action="store_true", help="Print feedback tokens as they arrive")
+    parser.add_argument("--tool-mode", type=str, choices=["regex", "llm", "none"], default="regex",
+                       help="How verification tools are chosen: pattern matching, by the model, or off")
+    parser.add_argument("--pdf-workers", type=int, default=None,
+                       help="Worker processes for splitting large PDFs (default: CPU count)")
+    parser.add_argument("--prompt-layout", type=str, choices=["legacy", "prefix"], default="legacy",
+                       help="Prompt segment order; 'prefix' keeps shared parts first for upstream prompt caching")
+    parser.add_argument("--no-store", action="store_true", help="Do not write grades to the result store")
+    parser.add_argument("--cascade", type=str, default=None,
+                       help="Comma-separated models to grade with in order, e.g. '4o-mini,gpt-4'; "
+                            "later models only see low-confidence, unparseable or borderline grades")
+    parser.add_argument("--min-confidence", type=float, default=0.7,
+                       help="Cascade: escalate grades whose CONFIDENCE is below this")
+    parser.add_argument("--deadline", type=float, default=None,
+                       help="Seconds each grade may spend on proxy requests, retries included")
+    parser.add_argument("--rag-max-chars", type=int, default=None,
+                       help="Max characters of retrieved course context per grading prompt")
+    parser.add_argument("--adaptive-k", type=str, choices=["elbow", "cumulative"], default=None,
+                       help="Pick rag_k per query from the retrieval scores instead of a fixed 5")
+    parser.add_argument("--record", type=str, default=None,
+                       help="Append all proxy traffic, with timing, to this cassette (.jsonl or .jsonl.gz)")
+    parser.add_argument("--replay", type=str, default=None,
+                       help="Answer all proxy requests from this cassette, offline")
+    parser.add_argument("--replay-speed", type=float, default=None,
+                       help="Replay pace: 1 = recorded latencies, 10 = ten times faster, 0 = no waiting")
+    parser.add_argument("--profile", type=str, choices=["sample", "cprofile"], default=None,
+                       help="Profile grading: per-phase wall/CPU time plus a sampled flamegraph or cProfile stats")
+    parser.add_argument("--profile-out", type=str, default="gradingbot-profile",
+                       help="Path prefix for --profile output (.phases.json, .folded or .prof)")
+    parser.add_argument("--stats", action="store_true",
+                       help="Print the stored score distribution (filter with --assignment/--question)")
     
     args = parser.parse_args()
+
+    if args.record or args.replay or args.rate_limit:
+        _load_env_once()
+
+    retrieval = None
+    if args.adaptive_k:
+        from gradingBot.adaptive_rag import AdaptiveRetrieval
+        retrieval = AdaptiveRetrieval(method=args.adaptive_k)
+
+    cascade = None
+    if args.cascade:
+        from gradingBot.cascade import CascadeConfig
+        cascade = CascadeConfig(
+            models=tuple(m.strip() for m in args.cascade.split(",") if m.strip()),
+            min_confidence=args.min_confidence
+        )
     
-    bot = GradingBot(session_id=args.session_id, model=args.model)
+    bot = GradingBot(
+        session_id=args.session_id,
+        model=args.model,
+        pdf_workers=args.pdf_workers,
+        tool_mode=args.tool_mode,
+        prompt_layout=args.prompt_layout,
+        store_results=not args.no_store,
+        cascade=cascade,
+        deadline=args.deadline,
+        rag_max_chars=args.rag_max_chars,
+        retrieval=retrieval,
+        client=(
+            LLMProxy(
+                record=args.record,
+                replay=args.replay,
+                replay_speed=args.replay_speed,
+                rate_limit=RateLimit.parse(args.rate_limit) if args.rate_limit else None,
+            )
+            if args.record or args.replay or args.rate_limit else None
+        )
+    )
+
+    # Wraps the grading call(s) below when --profile is given
+    profiling = bot.profile(args.profile, output=args.profile_out) if args.profile else nullcontext()
+
+    def print_profile(prof) -> None:
+        if prof is not None:
+            print("\n" + prof.format_report())
+            print(f"Profile written to {args.profile_out}.phases.json and "
+                  f"{args.profile_out}.{'prof' if args.profile == 'cprofile' else 'folded'}")
     
     if args.upload:
         if not args.file:
@@ -674,6 +1633,45 @@ if __name__ == "__main__":
             bot.wait_for_processing(args.wait)
             print("Upload complete!")
     
+    elif args.grade and args.answers_json:
+        if not args.question:
+            print("Error: --question required when using --grade")
+            exit(1)
+        submissions = json.loads(Path(args.answers_json).read_text(encoding='utf-8'))
+        rubric_text = args.rubric
+        if args.rubric and Path(args.rubric).exists():
+            rubric_text = Path(args.rubric).read_text(encoding='utf-8')
+
+        print(f"Grading {len(submissions)} submissions...")
+        batch_kwargs = dict(
+            question=args.question,
+            submissions=submissions,
+            max_points=args.max_points,
+            rubric=rubric_text,
+            assignment_name=args.assignment,
+            dedupe=not args.no_dedupe,
+            similarity_threshold=args.similarity,
+            review_propagated=True
+        )
+        with profiling as prof:
+            if args.workers is not None or args.queue:
+                results = bot.grade_pool(workers=args.workers, queue_path=args.queue, **batch_kwargs)
+            else:
+                results = bot.grade_many(**batch_kwargs)
+        for student_id, result in results.items():
+            if "error" in result:
+                print(f"{student_id}: ERROR {result['error']}")
+                continue
+            note = ""
+            if "propagated_from" in result:
+                note = f"  (same as {result['propagated_from']}"
+                note += ", needs review)" if result["needs_review"] else ")"
+            print(f"{student_id}: {result['score']} / {result['max_points']}{note}")
+        chosen = [r["retrieval"]["k"] for r in results.values() if "retrieval" in r and "propagated_from" not in r]
+        if chosen:
+            print(f"Adaptive rag_k: mean {sum(chosen) / len(chosen):.2f} over {len(chosen)} retrievals")
+        print_profile(prof)
+
     elif args.grade:
         if not args.question or not args.answer:
             print("Error: --question and --answer required when using --grade")
@@ -696,13 +1694,23 @@ if __name__ == "__main__":
                 rubric_text = args.rubric
         
         print("Grading submission...")
-        result = bot.grade_submission(
-            question=args.question,
-            student_answer=student_answer,
-            max_points=args.max_points,
-            rubric=rubric_text,
-            assignment_name=args.assignment
-        )
+        on_token = None
+        if args.stream:
+            print()
+            on_token = lambda delta: print(delta, end="", flush=True)
+        with profiling as prof:
+            result = bot.grade_submission(
+                question=args.question,
+                student_answer=student_answer,
+                max_points=args.max_points,
+                rubric=rubric_text,
+                assignment_name=args.assignment,
+                on_token=on_token,
+                student_id=args.student_id
+            )
+        if args.stream:
+            print()
+        print_profile(prof)
         
         if "error" in result:
             print(f"Error: {result['error']}")
@@ -713,10 +1721,29 @@ if __name__ == "__main__":
         print("="*60)
         if result.get("score") is not None:
             print(f"\nSCORE: {result['score']:.2f} / {result['max_points']:.2f} points")
+        if result.get("cascade"):
+            path = " -> ".join(f"{a['model']} ({a['escalation_reason'] or 'accepted'})" for a in result["cascade"])
+            print(f"Graded by: {path}")
+        if result.get("retrieval"):
+            chosen = result["retrieval"]
+            print(f"Context: {chosen['k']} of {chosen['candidates']} retrieved documents ({chosen['reason']})")
         print(f"\nFEEDBACK:\n{result['feedback']}")
         print("\n" + "="*60)
         print(f"\nRAG Context Used:\n{result['rag_context_used']}")
     
+    elif args.stats:
+        if bot.result_store is None:
+            print("Error: --stats needs the result store (drop --no-store)")
+            exit(1)
+        stats = bot.result_store.score_distribution(assignment=args.assignment, question=args.question)
+        print(f"Stored grades: {stats['count']}")
+        if stats["count"]:
+            print(f"Mean {stats['mean']:.1%}, stdev {stats['stdev']:.1%}, "
+                  f"min {stats['min']:.1%}, max {stats['max']:.1%}")
+            width = 1 / len(stats["histogram"])
+            for i, n in enumerate(stats["histogram"]):
+                print(f"  {i * width:4.0%}-{(i + 1) * width:4.0%}  {'#' * n} {n}")
+    
     else:
         print("Uploaded documents:")
         for doc in bot.get_uploaded_documents():
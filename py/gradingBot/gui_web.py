@@ -4,23 +4,26 @@ Streamlit frontend for the Grading Bot.
 Run with: streamlit run gradingBot/app.py
 """
 
-# Adding so that .env credentials are loaded
-from dotenv import load_dotenv
-load_dotenv()
-
 import streamlit as st
 import time
-import tempfile
 from typing import Dict, List
 import sys
 
-from dotenv import load_dotenv
 from pathlib import Path
 import os
 
-# Load .env from py/ directory
 BASE_DIR = Path(__file__).resolve().parent.parent
-load_dotenv(BASE_DIR / ".env")
+
+
+@st.cache_resource
+def load_env():
+    """Load .env credentials from the py/ directory once per server process."""
+    from dotenv import load_dotenv
+    load_dotenv(BASE_DIR / ".env")
+
+
+# Adding so that .env credentials are loaded (cached across Streamlit reruns)
+load_env()
 
 # Ensure parent directory (py/) is in Python path for package imports
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -29,6 +32,16 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
     
 from gradingBot.gradingBot import GradingBot
+from gradingBot.workspace import sweep_stale
+
+
+@st.cache_resource
+def sweep_stale_workspaces():
+    """Remove scratch directories left by crashed runs, once per server process."""
+    return sweep_stale()
+
+
+sweep_stale_workspaces()
 
 # Page configuration
 st.set_page_config(
@@ -88,16 +101,31 @@ if 'session_id' not in st.session_state:
     st.session_state.session_id = "discrete_math_ta_001"
 if 'model' not in st.session_state:
     st.session_state.model = "4o-mini"
+if 'cascade' not in st.session_state:
+    st.session_state.cascade = False
 if 'uploaded_docs' not in st.session_state:
     st.session_state.uploaded_docs = []
 
 
-def initialize_bot(session_id: str, model: str):
+# Stronger model that uncertain grades are escalated to in cascade mode
+CASCADE_MODEL = "gpt-4"
+
+
+def cascade_config(model: str, enabled: bool):
+    """Cascade from the selected model to CASCADE_MODEL, or None."""
+    if not enabled or model == CASCADE_MODEL:
+        return None
+    from gradingBot.cascade import CascadeConfig
+    return CascadeConfig(models=(model, CASCADE_MODEL))
+
+
+def initialize_bot(session_id: str, model: str, cascade: bool = False):
     """Initialize the grading bot."""
     try:
         bot = GradingBot(
             session_id=session_id,
-            model=model
+            model=model,
+            cascade=cascade_config(model, cascade)
         )
         return bot, None
     except Exception as e:
@@ -110,7 +138,8 @@ def main():
         try:
             st.session_state.bot = GradingBot(
                 session_id=st.session_state.session_id,
-                model=st.session_state.model
+                model=st.session_state.model,
+                cascade=cascade_config(st.session_state.model, st.session_state.cascade)
             )
             # Clear any previous init errors
             if hasattr(st.session_state, 'init_error'):
@@ -149,19 +178,30 @@ def main():
             index=current_model_index,
             help="Select the LLM model to use for grading"
         )
+        cascade = st.checkbox(
+            f"Escalate uncertain grades to {CASCADE_MODEL}",
+            value=st.session_state.cascade,
+            help="Grade with the selected model first; low-confidence, unparseable or borderline "
+                 f"grades are regraded by {CASCADE_MODEL}"
+        )
         
         # Reinitialize bot if settings changed
-        settings_changed = (session_id != st.session_state.session_id) or (model != st.session_state.model)
+        settings_changed = (
+            (session_id != st.session_state.session_id)
+            or (model != st.session_state.model)
+            or (cascade != st.session_state.cascade)
+        )
         
         if settings_changed:
             if st.button("🔄 Update Settings", type="primary", use_container_width=True):
-                bot, error = initialize_bot(session_id, model)
+                bot, error = initialize_bot(session_id, model, cascade)
                 if error:
                     st.error(f"Error initializing bot: {error}")
                 else:
                     st.session_state.bot = bot
                     st.session_state.session_id = session_id
                     st.session_state.model = model
+                    st.session_state.cascade = cascade
                     st.session_state.uploaded_docs = []
                     if hasattr(st.session_state, 'init_error'):
                         del st.session_state.init_error
@@ -174,6 +214,8 @@ def main():
             st.success("✅ Bot Active")
             st.caption(f"Session: {st.session_state.session_id}")
             st.caption(f"Model: {st.session_state.model}")
+            if st.session_state.bot.cascade is not None:
+                st.caption("Cascade: " + " → ".join(st.session_state.bot.cascade.models))
         else:
             st.warning("⚠️ Bot not initialized")
             st.caption("Check configuration and refresh page")
@@ -209,11 +251,7 @@ def main():
         
         # Display file size if file is selected
         if uploaded_file is not None:
-            # Get file size without consuming the buffer
-            uploaded_file.seek(0, 2)  # Seek to end
-            file_size_bytes = uploaded_file.tell()
-            uploaded_file.seek(0)  # Reset to beginning
-            file_size_mb = file_size_bytes / (1024 * 1024)
+            file_size_mb = uploaded_file.size / (1024 * 1024)
             
             st.info(f"📄 File: {uploaded_file.name} ({file_size_mb:.2f} MB)")
             
@@ -242,43 +280,34 @@ def main():
                 st.error("Please select a file to upload.")
             else:
                 with st.spinner("Uploading document..."):
-                    # Save uploaded file temporarily
-                    temp_dir = Path(tempfile.gettempdir())
-                    temp_path = temp_dir / uploaded_file.name
-                    with open(temp_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    print("DEBUG: Saved temp file. Size (MB):",
-                          Path(temp_path).stat().st_size / (1024 * 1024))
-
+                    # The bot reads the uploaded file in place: no temp copy,
+                    # and textbook parts are split and streamed from memory
+                    uploaded_file.seek(0)
 
                     try:
                         # Upload based on document type
                         if doc_type == "Syllabus":
-                            result = st.session_state.bot.upload_syllabus(temp_path, description)
+                            result = st.session_state.bot.upload_syllabus(uploaded_file, description)
                         elif doc_type == "Homework Assignment":
                             result = st.session_state.bot.upload_homework_assignment(
-                                temp_path, assignment_name, description
+                                uploaded_file, assignment_name, description
                             )
                         elif doc_type == "Homework Solution":
                             result = st.session_state.bot.upload_homework_solution(
-                                temp_path, assignment_name, description
+                                uploaded_file, assignment_name, description
                             )
                         elif doc_type == "Lecture Material":
                             result = st.session_state.bot.upload_lecture_material(
-                                temp_path, assignment_name, description
+                                uploaded_file, assignment_name, description
                             )
                         elif doc_type == "Textbook":
-                            result = st.session_state.bot.upload_textbook(temp_path, description)
+                            result = st.session_state.bot.upload_textbook(uploaded_file, description)
                         
                         if "error" in result.get("result", {}):
                             error_msg = result['error']
                             # Check for HTTP 413 (Request Too Long)
                             if "413" in error_msg or "Too Long" in error_msg or "Too Large" in error_msg:
-                                # Get file size
-                                uploaded_file.seek(0, 2)
-                                file_size_bytes = uploaded_file.tell()
-                                uploaded_file.seek(0)
-                                file_size_mb = file_size_bytes / (1024 * 1024)
+                                file_size_mb = uploaded_file.size / (1024 * 1024)
                                 st.error(f"❌ Upload failed: File too large!")
                                 st.error(f"**File size:** {file_size_mb:.2f} MB")
                                 st.warning("""
@@ -309,13 +338,8 @@ def main():
                                 "description": description
                             })
 
-                            # Clean up temp file
-                            temp_path.unlink()
-
                     except Exception as e:
                         st.error(f"Error during upload: {str(e)}")
-                        if temp_path.exists():
-                            temp_path.unlink()
         
         # Show uploaded documents
         if st.session_state.uploaded_docs:
@@ -380,6 +404,14 @@ def main():
             if not question or not student_answer:
                 st.error("Please provide both a question and student answer.")
             else:
+                # Live feedback panel, filled in as tokens arrive
+                live_feedback = st.empty()
+                streamed_parts: List[str] = []
+
+                def render_token(delta: str):
+                    streamed_parts.append(delta)
+                    live_feedback.markdown("".join(streamed_parts) + " ▌")
+
                 with st.spinner("Grading submission... This may take a moment."):
                     try:
                         result = st.session_state.bot.grade_submission(
@@ -387,8 +419,11 @@ def main():
                             student_answer=student_answer,
                             max_points=max_points if max_points > 0 else None,
                             rubric=rubric if rubric else None,
-                            assignment_name=assignment_name if assignment_name else None
+                            assignment_name=assignment_name if assignment_name else None,
+                            on_token=render_token
                         )
+                        # The final result is rendered below with the score
+                        live_feedback.empty()
                         
                         if "error" in result:
                             st.error(f"Grading failed: {result['error']}")
@@ -419,6 +454,11 @@ def main():
                                     else:
                                         st.metric("Grade", "Below C", delta="Needs Improvement")
                             
+                            if result.get("cascade"):
+                                escalations = [a["escalation_reason"] for a in result["cascade"] if a["escalation_reason"]]
+                                note = f" (escalated: {', '.join(escalations)})" if escalations else ""
+                                st.caption(f"Graded by {result['model']}{note}")
+
                             # Feedback
                             st.subheader("📝 Feedback")
                             st.markdown(result.get("feedback", "No feedback available"))
@@ -0,0 +1,453 @@
+"""
+Sandboxed, bounded math evaluator used by the calculator tool.
+
+Expressions are parsed with `ast` and only a whitelist of nodes is
+evaluated. Every intermediate result is checked against magnitude limits,
+and exponents, factorials and binomials are bounded before they are
+computed, so inputs like 9**9**9 are rejected instead of pegging a core.
+
+Two modes are supported:
+    "arithmetic"  numbers with + - * / ** and unary minus
+    "discrete"    adds //, %, n!, factorial, comb/binomial/C, perm/P, gcd,
+                  lcm, abs, min, max, floor, ceil, set literals with
+                  | & - ^, and len()/card() for set sizes
+
+As a last line of defence, expressions that use anything beyond plain
+arithmetic run in a worker process with a per-expression time budget; a
+worker that runs over is killed and replaced without affecting the others.
+"""
+import ast
+import math
+import multiprocessing
+import operator as op
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Union
+
+# -----------------------
+# Limits
+# -----------------------
+
+MAX_EXPRESSION_CHARS = 500
+MAX_AST_NODES = 200
+MAX_EXPONENT = 1_000
+MAX_RESULT_BITS = 4_096         # ~1233 decimal digits
+MAX_FACTORIAL = 400
+MAX_SET_SIZE = 1_000
+DEFAULT_TIMEOUT = 1.0           # seconds per expression in the worker
+MAX_WORKERS = 4                 # concurrent worker processes (the calculator tool's concurrency)
+WORKER_START_TIMEOUT = 30.0     # seconds for a new worker process to start
+
+MODES = ("arithmetic", "discrete")
+
+
+class EvaluationError(ValueError):
+    """Raised when an expression is unsupported or exceeds a limit."""
+
+
+class EvaluationTimeout(EvaluationError):
+    """Raised when an expression exceeds its time budget."""
+
+
+class EvaluationWorkerError(EvaluationError):
+    """Raised when the worker process fails to start or dies mid-expression."""
+
+
+Number = Union[int, float]
+
+
+# -----------------------
+# Bounded operations
+# -----------------------
+
+def _check_number(value: Any) -> Any:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        if value.bit_length() > MAX_RESULT_BITS:
+            raise EvaluationError(f"Result too large (over {MAX_RESULT_BITS} bits)")
+    elif isinstance(value, float):
+        if math.isinf(value) or math.isnan(value):
+            raise EvaluationError("Result is not a finite number")
+    else:
+        raise EvaluationError("Result is not a real number")
+    return value
+
+
+def _int_arg(value: Any, name: str) -> int:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise EvaluationError(f"{name} expects integer arguments")
+    return value
+
+
+def _bounded_pow(base: Number, exponent: Number) -> Number:
+    if abs(exponent) > MAX_EXPONENT:
+        raise EvaluationError(f"Exponent too large (limit {MAX_EXPONENT})")
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        # Upper bound on the result size, checked before computing it
+        if max(abs(base).bit_length() - 1, 0) * exponent > MAX_RESULT_BITS:
+            raise EvaluationError(f"Result too large (over {MAX_RESULT_BITS} bits)")
+    try:
+        return op.pow(base, exponent)
+    except OverflowError:
+        raise EvaluationError("Result is not a finite number")
+
+
+def _factorial(n: Any) -> int:
+    n = _int_arg(n, "factorial")
+    if n < 0:
+        raise EvaluationError("factorial is undefined for negative numbers")
+    if n > MAX_FACTORIAL:
+        raise EvaluationError(f"factorial argument too large (limit {MAX_FACTORIAL})")
+    return math.factorial(n)
+
+
+def _check_comb_args(n: int, k: int, name: str) -> None:
+    if n < 0 or k < 0:
+        raise EvaluationError(f"{name} is undefined for negative numbers")
+    # At most MAX_FACTORIAL multiplications of 64-bit-sized factors
+    if n.bit_length() > 64 or min(k, max(n - k, 0)) > MAX_FACTORIAL:
+        raise EvaluationError(f"{name} arguments too large (limit {MAX_FACTORIAL} terms)")
+
+
+def _comb(n: Any, k: Any) -> int:
+    n, k = _int_arg(n, "comb"), _int_arg(k, "comb")
+    _check_comb_args(n, k, "comb")
+    return math.comb(n, k)
+
+
+def _perm(n: Any, k: Any = None) -> int:
+    n = _int_arg(n, "perm")
+    k = n if k is None else _int_arg(k, "perm")
+    # perm(n, k) multiplies k factors; unlike comb, k near n is not cheaper
+    _check_comb_args(n, 0, "perm")
+    if min(k, n) > MAX_FACTORIAL:
+        raise EvaluationError(f"perm arguments too large (limit {MAX_FACTORIAL} terms)")
+    return math.perm(n, k)
+
+
+def _lcm(*args: int) -> int:
+    result = 1
+    for a in args:
+        result = abs(result * a) // math.gcd(result, a) if a else 0
+        _check_number(result)
+    return result
+
+
+def _set_size(value: Any) -> int:
+    if not isinstance(value, frozenset):
+        raise EvaluationError("len/card expects a set")
+    return len(value)
+
+
+def _integer_op(fn: Callable, name: str) -> Callable:
+    def apply(*args):
+        if not args:
+            raise EvaluationError(f"{name} expects arguments")
+        return fn(*(_int_arg(a, name) for a in args))
+    return apply
+
+
+ARITHMETIC_BINOPS: Dict[type, Callable] = {
+    ast.Add: op.add,
+    ast.Sub: op.sub,
+    ast.Mult: op.mul,
+    ast.Div: op.truediv,
+    ast.Pow: _bounded_pow,
+}
+
+DISCRETE_BINOPS: Dict[type, Callable] = {
+    **ARITHMETIC_BINOPS,
+    ast.FloorDiv: op.floordiv,
+    ast.Mod: op.mod,
+    # Set algebra; only valid between sets (checked in _eval)
+    ast.BitOr: op.or_,
+    ast.BitAnd: op.and_,
+    ast.BitXor: op.xor,
+}
+
+UNARYOPS: Dict[type, Callable] = {
+    ast.USub: op.neg,
+    ast.UAdd: op.pos,
+}
+
+DISCRETE_FUNCTIONS: Dict[str, Callable] = {
+    "factorial": _factorial,
+    "comb": _comb,
+    "binomial": _comb,
+    "C": _comb,
+    "perm": _perm,
+    "P": _perm,
+    "gcd": _integer_op(math.gcd, "gcd"),
+    "lcm": _integer_op(_lcm, "lcm"),
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "len": _set_size,
+    "card": _set_size,
+}
+
+_SET_OPS = (ast.BitOr, ast.BitAnd, ast.BitXor)
+
+
+# -----------------------
+# Parsing and evaluation
+# -----------------------
+
+# Textbook notation rewritten into Python syntax in discrete mode
+_POSTFIX_FACTORIAL_RE = re.compile(r"(\d+|\))\s*!(?!=)")
+_MOD_WORD_RE = re.compile(r"\bmod\b")
+
+
+def _normalize(expr: str, mode: str) -> str:
+    expr = expr.strip()
+    if mode == "discrete":
+        expr = _MOD_WORD_RE.sub("%", expr)
+        # "5!" -> "factorial(5)"; "(n+1)!" is handled by wrapping the group
+        while True:
+            match = _POSTFIX_FACTORIAL_RE.search(expr)
+            if not match:
+                break
+            if match.group(1) == ")":
+                close = match.start(1)
+                depth, start = 0, close
+                for start in range(close, -1, -1):
+                    depth += {")": 1, "(": -1}.get(expr[start], 0)
+                    if depth == 0:
+                        break
+                expr = f"{expr[:start]}factorial{expr[start:close + 1]}{expr[match.end():]}"
+            else:
+                expr = f"{expr[:match.start()]}factorial({match.group(1)}){expr[match.end():]}"
+    return expr
+
+
+def _parse(expr: str, mode: str) -> ast.AST:
+    if mode not in MODES:
+        raise EvaluationError(f"Unknown mode: {mode}")
+    if len(expr) > MAX_EXPRESSION_CHARS:
+        raise EvaluationError(f"Expression too long (limit {MAX_EXPRESSION_CHARS} characters)")
+    try:
+        tree = ast.parse(_normalize(expr, mode), mode="eval")
+    except SyntaxError:
+        raise EvaluationError("Invalid expression")
+    if sum(1 for _ in ast.walk(tree)) > MAX_AST_NODES:
+        raise EvaluationError(f"Expression too complex (limit {MAX_AST_NODES} nodes)")
+    return tree.body
+
+
+def _eval(node: ast.AST, mode: str) -> Any:
+    discrete = mode == "discrete"
+    binops = DISCRETE_BINOPS if discrete else ARITHMETIC_BINOPS
+
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise EvaluationError("Unsupported constant")
+        return _check_number(node.value)
+
+    if isinstance(node, ast.BinOp) and type(node.op) in binops:
+        left, right = _eval(node.left, mode), _eval(node.right, mode)
+        is_set = isinstance(left, frozenset), isinstance(right, frozenset)
+        if isinstance(node.op, _SET_OPS) and not all(is_set):
+            raise EvaluationError("|, & and ^ are only supported between sets")
+        if any(is_set) and not (all(is_set) and isinstance(node.op, _SET_OPS + (ast.Sub,))):
+            raise EvaluationError("Unsupported operation on a set")
+        try:
+            result = binops[type(node.op)](left, right)
+        except ZeroDivisionError:
+            raise EvaluationError("Division by zero")
+        except OverflowError:
+            raise EvaluationError("Result is not a finite number")
+        return result if isinstance(result, frozenset) else _check_number(result)
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARYOPS:
+        operand = _eval(node.operand, mode)
+        if isinstance(operand, frozenset):
+            raise EvaluationError("Unsupported operation on a set")
+        return _check_number(UNARYOPS[type(node.op)](operand))
+
+    if discrete and isinstance(node, ast.Set):
+        if len(node.elts) > MAX_SET_SIZE:
+            raise EvaluationError(f"Set too large (limit {MAX_SET_SIZE})")
+        return frozenset(_eval(e, mode) for e in node.elts)
+
+    if discrete and isinstance(node, ast.Call):
+        if (
+            not isinstance(node.func, ast.Name)
+            or node.func.id not in DISCRETE_FUNCTIONS
+            or node.keywords
+        ):
+            raise EvaluationError("Unsupported function")
+        args = [_eval(a, mode) for a in node.args]
+        try:
+            result = DISCRETE_FUNCTIONS[node.func.id](*args)
+        except (TypeError, ValueError) as e:
+            if isinstance(e, EvaluationError):
+                raise
+            raise EvaluationError(f"{node.func.id}: {e}")
+        return _check_number(result)
+
+    raise EvaluationError("Unsupported expression")
+
+
+def _is_plain_arithmetic(node: ast.AST) -> bool:
+    """True if evaluating node is cheap by construction (no **, calls or sets)."""
+    for child in ast.walk(node):
+        if isinstance(child, (ast.Expression, ast.Constant, ast.UnaryOp, ast.operator, ast.unaryop)):
+            continue
+        if isinstance(child, ast.BinOp) and isinstance(child.op, (ast.Add, ast.Sub, ast.Mult, ast.Div)):
+            continue
+        return False
+    return True
+
+
+def evaluate_unbounded_time(expr: str, mode: str = "arithmetic") -> Any:
+    """
+    Evaluate expr in this process with all static limits but no time budget.
+    """
+    result = _eval(_parse(expr, mode), mode)
+    if isinstance(result, frozenset):
+        raise EvaluationError("Expression evaluates to a set; use len() for its size")
+    return result
+
+
+# -----------------------
+# Time-budgeted workers
+# -----------------------
+
+class _Worker:
+    """One evaluator process and the pipe to it."""
+
+    def __init__(self):
+        # spawn, not fork: workers are started from tool threads, and a
+        # forked child could inherit a lock another thread was holding
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_conn,), name="math-eval", daemon=True)
+        self.process.start()
+        child_conn.close()
+        # Startup (interpreter plus imports) does not count against an expression's budget
+        try:
+            if self.conn.poll(WORKER_START_TIMEOUT):
+                self.conn.recv()
+                return
+        except (EOFError, OSError):
+            pass
+        self.kill()
+        raise EvaluationWorkerError("Evaluation worker failed to start")
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def _serve(conn) -> None:
+    """Worker loop: evaluate (expr, mode) requests until the pipe closes."""
+    conn.send("ready")
+    while True:
+        try:
+            expr, mode = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, evaluate_unbounded_time(expr, mode)))
+        except Exception as e:
+            conn.send((False, e))
+
+
+# Idle workers, and how many are lent out; at most _max_workers in total
+_idle: List[_Worker] = []
+_busy = 0
+_max_workers = MAX_WORKERS
+_workers_changed = threading.Condition()
+
+
+def set_max_workers(n: int) -> None:
+    """Set how many expressions may be evaluated at once (one process each)."""
+    global _max_workers
+    if n < 1:
+        raise ValueError("max_workers must be at least 1")
+    with _workers_changed:
+        _max_workers = n
+        surplus = _idle[n:]
+        del _idle[n:]
+        _workers_changed.notify_all()
+    for worker in surplus:
+        worker.kill()
+
+
+def _checkout() -> _Worker:
+    global _busy
+    with _workers_changed:
+        while _busy >= _max_workers:
+            _workers_changed.wait()
+        _busy += 1
+        worker = _idle.pop() if _idle else None
+    if worker is not None and worker.process.is_alive():
+        return worker
+    try:
+        return _Worker()
+    except BaseException:
+        _checkin(None)
+        raise
+
+
+def _checkin(worker: Optional[_Worker]) -> None:
+    """Return a lent worker (None if it was killed) so the next caller can use its slot."""
+    global _busy
+    with _workers_changed:
+        _busy -= 1
+        if worker is not None and len(_idle) < _max_workers:
+            _idle.append(worker)
+            worker = None
+        _workers_changed.notify()
+    if worker is not None:
+        worker.kill()
+
+
+def evaluate(expr: str, mode: str = "arithmetic", timeout: Optional[float] = DEFAULT_TIMEOUT) -> Any:
+    """
+    Evaluate a math expression safely.
+
+    Plain arithmetic (+ - * / on numbers) runs in-process. Anything else runs
+    in a worker process that is killed if it exceeds `timeout` seconds; up
+    to set_max_workers() expressions run at once, in separate workers.
+
+    Args:
+        expr: Expression text
+        mode: "arithmetic" or "discrete"
+        timeout: Seconds allowed per expression (None disables the worker)
+
+    Raises:
+        EvaluationError: unsupported syntax or a limit was exceeded
+        EvaluationTimeout: the time budget was exceeded
+        EvaluationWorkerError: the worker process failed
+    """
+    tree = _parse(expr, mode)
+    if timeout is None or _is_plain_arithmetic(tree):
+        return evaluate_unbounded_time(expr, mode)
+
+    worker = _checkout()
+    try:
+        worker.conn.send((expr, mode))
+        if not worker.conn.poll(timeout):
+            # This worker is stuck; kill it, the others keep serving
+            worker.kill()
+            worker = None
+            raise EvaluationTimeout(f"Evaluation exceeded {timeout}s time budget")
+        ok, value = worker.conn.recv()
+    except (EOFError, OSError):
+        # The worker died mid-expression (e.g. killed for memory)
+        if worker is not None:
+            worker.kill()
+            worker = None
+        raise EvaluationWorkerError("Evaluation worker exited unexpectedly")
+    finally:
+        _checkin(worker)
+    if not ok:
+        raise value
+    return value
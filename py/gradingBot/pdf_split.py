@@ -0,0 +1,185 @@
+"""
+Parallel PDF splitting.
+
+Page ranges are handed to a process pool; each worker opens its own
+PdfReader, so no parsed PDF state crosses process boundaries. Results are
+always returned in page order, regardless of which worker finishes first.
+
+PDFs that are already in memory (an open file or a bytes-like buffer) are
+split in-process by iter_parts(), one part at a time, without touching disk.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+PdfBuffer = Union[BinaryIO, bytes, bytearray, memoryview]
+
+
+def page_ranges(total_pages: int, pages_per_range: int) -> List[Tuple[int, int]]:
+    """Split [0, total_pages) into consecutive (start, end) ranges."""
+    if pages_per_range < 1:
+        raise ValueError("pages_per_range must be at least 1")
+    return [
+        (start, min(start + pages_per_range, total_pages))
+        for start in range(0, total_pages, pages_per_range)
+    ]
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only stream over a bytes-like object, without copying it."""
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview]):
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        n = len(chunk)
+        memoryview(buffer).cast("B")[:n] = chunk
+        self._pos += n
+        return n
+
+
+def _pdf_stream(source: PdfBuffer) -> BinaryIO:
+    """A seekable binary stream over an in-memory PDF, for PdfReader."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        # Buffered so PdfReader's many small reads stay fast
+        return io.BufferedReader(_BufferReader(source))
+    if not source.seekable():
+        return io.BytesIO(source.read())
+    return source
+
+
+def count_pages(filepath: Union[str, Path, PdfBuffer]) -> int:
+    """Return the number of pages in a PDF (a path or an in-memory PDF)."""
+    from PyPDF2 import PdfReader
+    if isinstance(filepath, (str, Path)):
+        return len(PdfReader(str(filepath)).pages)
+    return len(PdfReader(_pdf_stream(filepath)).pages)
+
+
+def _available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _resolve_workers(max_workers: Optional[int], n_tasks: int) -> int:
+    workers = max_workers if max_workers is not None else _available_cpus()
+    return max(1, min(workers, n_tasks))
+
+
+# -----------------------
+# Worker functions (module level so they can be pickled)
+# -----------------------
+
+def _write_part(task: Tuple[str, int, int, str, Optional[int]]) -> str:
+    """Copy pages [start, end) of a PDF into a new file at out_path, within the out_path directory's quota."""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    from gradingBot.workspace import open_with_quota
+
+    src, start, end, out_path, quota_bytes = task
+    reader = PdfReader(src)
+    writer = PdfWriter()
+    for i in range(start, end):
+        writer.add_page(reader.pages[i])
+    with open_with_quota(out_path, quota_bytes=quota_bytes) as f:
+        writer.write(f)
+    return out_path
+
+
+def _run(func, tasks: list, max_workers: Optional[int]) -> list:
+    """Map func over tasks, in a process pool when more than one worker is useful."""
+    workers = _resolve_workers(max_workers, len(tasks))
+    if workers == 1:
+        return [func(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields in submission order, which keeps output deterministic
+        return list(pool.map(func, tasks))
+
+
+# -----------------------
+# Public API
+# -----------------------
+
+def split_pdf(
+    filepath: Union[str, Path],
+    out_dir: Union[str, Path],
+    max_pages_per_chunk: int,
+    max_workers: Optional[int] = None,
+    quota_bytes: Optional[int] = None,
+) -> List[Path]:
+    """
+    Split a PDF into parts of at most max_pages_per_chunk pages.
+
+    Args:
+        filepath: Path to the source PDF.
+        out_dir: Directory the parts are written to.
+        max_pages_per_chunk: Max pages per part.
+        max_workers: Worker processes to use (default: CPU count; 1 disables the pool).
+        quota_bytes: Max bytes of all files in out_dir, checked while the
+                     parts are written (None = unlimited).
+
+    Returns:
+        Paths of the parts, named {stem}_partN.pdf, in page order.
+
+    Raises:
+        WorkspaceQuotaError: A part would take out_dir past quota_bytes
+    """
+    filepath = Path(filepath)
+    out_dir = Path(out_dir)
+    ranges = page_ranges(count_pages(filepath), max_pages_per_chunk)
+
+    tasks = [
+        (str(filepath), start, end, str(out_dir / f"{filepath.stem}_part{n}.pdf"), quota_bytes)
+        for n, (start, end) in enumerate(ranges, 1)
+    ]
+    return [Path(p) for p in _run(_write_part, tasks, max_workers)]
+
+
+def iter_parts(source: PdfBuffer, max_pages_per_chunk: int) -> Iterator[io.BytesIO]:
+    """
+    Split an in-memory PDF into parts of at most max_pages_per_chunk pages.
+
+    The source is parsed in place (no copy to disk or to a new buffer) and
+    parts are produced one at a time, so only one part is held in memory
+    while the caller uploads it.
+
+    Args:
+        source: Open binary file (read from its start) or bytes-like buffer.
+        max_pages_per_chunk: Max pages per part.
+
+    Yields:
+        Each part as a BytesIO positioned at 0, in page order.
+    """
+    from PyPDF2 import PdfReader, PdfWriter
+
+    if hasattr(source, "seek") and source.seekable():
+        source.seek(0)
+    reader = PdfReader(_pdf_stream(source))
+    for start, end in page_ranges(len(reader.pages), max_pages_per_chunk):
+        writer = PdfWriter()
+        for i in range(start, end):
+            writer.add_page(reader.pages[i])
+        part = io.BytesIO()
+        writer.write(part)
+        part.seek(0)
+        yield part
@@ -0,0 +1,218 @@
+"""
+Profiling mode for grading runs.
+
+A GradingProfiler wraps a batch of grades and measures:
+
+    phases   wall and CPU time of each grading phase (tool checks, waiting
+             for retrieval, formatting context, building the prompt, the
+             model call, parsing, storing), so client-side overhead can be
+             told apart from time spent waiting on the proxy
+    profile  either a sampling profile of every thread (mode "sample"),
+             written as folded stacks that flamegraph.pl, inferno or
+             speedscope render directly, with each stack rooted at the
+             grading phase it was sampled in; or a cProfile profile of the
+             grading thread (mode "cprofile"), written as a .prof file for
+             pstats, snakeviz or flameprof
+
+Usage:
+
+    with bot.profile("sample", output="profiles/hw1") as prof:
+        bot.grade_many(question, answers)
+    print(prof.format_report())
+
+or `python -m gradingBot.gradingBot ... --profile sample --profile-out profiles/hw1`.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+PROFILE_MODES = ("sample", "cprofile")
+
+# Phases spent waiting on the LLM proxy; everything else is client-side
+NETWORK_PHASES = frozenset(("retrieve_wait", "generate"))
+
+DEFAULT_INTERVAL = 0.005  # seconds between samples
+
+
+class _PhaseStats:
+    __slots__ = ("calls", "wall", "cpu")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+
+class GradingProfiler:
+    """Per-phase timer plus a sampling or cProfile profiler over one run."""
+
+    def __init__(self, mode: str = "sample", interval: float = DEFAULT_INTERVAL) -> None:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {PROFILE_MODES}")
+        self.mode = mode
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._phases: Dict[str, _PhaseStats] = {}
+        # thread id -> stack of phases that thread is in (read by the sampler)
+        self._current: Dict[int, List[str]] = {}
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._cprofile = None
+        self._started_wall = self._started_cpu = 0.0
+        self.wall = self.cpu = 0.0
+
+    # -------- Run --------
+
+    def start(self) -> "GradingProfiler":
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+        if self.mode == "cprofile":
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name="grading-profiler", daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self) -> None:
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        self.wall = time.perf_counter() - self._started_wall
+        self.cpu = time.process_time() - self._started_cpu
+
+    def __enter__(self) -> "GradingProfiler":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # -------- Phases --------
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a block as one grading phase (wall time and this thread's CPU time)."""
+        stack = self._current.setdefault(threading.get_ident(), [])
+        stack.append(name)
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            stack.pop()
+            with self._lock:
+                stats = self._phases.get(name)
+                if stats is None:
+                    stats = self._phases[name] = _PhaseStats()
+                stats.calls += 1
+                stats.wall += wall
+                stats.cpu += cpu
+
+    # -------- Sampling --------
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(self._frame_label(frame))
+                    frame = frame.f_back
+                phases = self._current.get(ident)
+                root = f"phase:{phases[-1]}" if phases else f"thread:{names.get(ident, ident)}"
+                self._stacks[";".join([root] + labels[::-1])] += 1
+            self._samples += 1
+
+    # -------- Results --------
+
+    def report(self) -> Dict:
+        """
+        Returns:
+            mode, total wall/CPU seconds, and per phase: calls, wall and CPU
+            seconds, and share of total wall time. client_seconds is the
+            wall time outside NETWORK_PHASES; network_seconds the rest.
+        """
+        with self._lock:
+            phases = {
+                name: {
+                    "calls": s.calls,
+                    "wall": s.wall,
+                    "cpu": s.cpu,
+                    "wall_share": s.wall / self.wall if self.wall else 0.0,
+                }
+                for name, s in sorted(self._phases.items(), key=lambda item: -item[1].wall)
+            }
+        network = sum(p["wall"] for name, p in phases.items() if name in NETWORK_PHASES)
+        return {
+            "mode": self.mode,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "network_seconds": network,
+            "client_seconds": self.wall - network,
+            "samples": self._samples,
+            "phases": phases,
+        }
+
+    def format_report(self) -> str:
+        report = self.report()
+        lines = [
+            f"{'phase':<18}{'calls':>7}{'wall s':>10}{'cpu s':>10}{'wall %':>8}",
+        ]
+        for name, p in report["phases"].items():
+            lines.append(
+                f"{name:<18}{p['calls']:>7}{p['wall']:>10.3f}{p['cpu']:>10.3f}{100 * p['wall_share']:>7.1f}%"
+            )
+        lines.append(
+            f"total {report['wall']:.3f}s wall, {report['cpu']:.3f}s CPU; "
+            f"waiting on proxy {report['network_seconds']:.3f}s, client-side {report['client_seconds']:.3f}s"
+        )
+        return "\n".join(lines)
+
+    def folded_stacks(self) -> str:
+        """Sampled stacks in folded format ("frame;frame;... count" per line)."""
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def write(self, output: Union[str, Path]) -> List[Path]:
+        """
+        Write the phase report (<output>.phases.json) and the profile
+        (<output>.folded for "sample", <output>.prof for "cprofile").
+
+        Returns:
+            The paths written
+        """
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        phases_path = output.with_name(output.name + ".phases.json")
+        phases_path.write_text(json.dumps(self.report(), indent=2))
+        if self.mode == "cprofile":
+            profile_path = output.with_name(output.name + ".prof")
+            self._cprofile.dump_stats(str(profile_path))
+        else:
+            profile_path = output.with_name(output.name + ".folded")
+            profile_path.write_text(self.folded_stacks())
+        return [phases_path, profile_path]
@@ -0,0 +1,224 @@
+"""
+Grading prompt layouts and prefix-sharing report.
+
+Provider-side prompt caching reuses the longest prefix that is byte-identical
+to an earlier request. Two layouts are available:
+
+    legacy  RAG context, tool results, then the query (assignment, question,
+            student answer, rubric, max points); the original order
+    prefix  ordered from most shared to most specific: system prompt, rubric,
+            question, shared course context, then the per-student tool
+            results and answer
+
+In the prefix layout every segment is canonicalized (NFC, "\\n" line endings,
+no trailing whitespace, fixed number formatting), so the same inputs always
+serialize to the same bytes. PrefixTracker measures how much of a batch of
+prompts shares a common prefix.
+"""
+import unicodedata
+from dataclasses import dataclass
+from os.path import commonprefix
+from typing import Dict, Iterable, Optional
+
+PROMPT_LAYOUTS = ("legacy", "prefix")
+
+GRADING_SYSTEM_PROMPT = """You are an expert teaching assistant grading a student submission for a Discrete Math course.
+
+Your task is to:
+1. Evaluate the student's answer for correctness, completeness, and clarity
+2. Compare it against the course materials and solutions provided in the context
+3. Provide constructive feedback highlighting what the student did well and what needs improvement
+4. Assign a score if maximum points are specified
+
+Guidelines:
+- Be fair and consistent in your grading
+- Reference specific course materials when relevant
+- Provide specific, actionable feedback
+- If the answer is partially correct, explain what parts are correct and what needs work
+- Consider mathematical rigor, notation, and explanation quality
+- If the answer is incorrect, guide the student toward the correct approach without giving away the full solution
+
+Format your response as:
+SCORE: [X/Y points] (if max_points provided)
+FEEDBACK:
+[Detailed feedback here]"""
+
+_SEPARATOR = "\n\n"
+
+
+# -----------------------
+# Canonical text
+# -----------------------
+
+def canonical_text(text: Optional[str]) -> str:
+    """Normalize a segment so equal content always yields equal bytes."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFC", str(text)).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+
+def format_points(points: Optional[float]) -> str:
+    """10, 10.0 and 10.00 all render as "10"."""
+    return f"{float(points):g}" if points else ""
+
+
+def serialize_prompt(system: str, query: str) -> bytes:
+    """The bytes a provider sees for one request, in order: system then query."""
+    return f"{system}{_SEPARATOR}{query}".encode("utf-8")
+
+
+# -----------------------
+# Layouts
+# -----------------------
+
+def build_query(
+    layout: str,
+    question: str,
+    student_answer: str,
+    max_points: Optional[float] = None,
+    rubric: Optional[str] = None,
+    assignment_name: Optional[str] = None,
+    rag_context: str = "",
+    tool_context: str = "",
+) -> str:
+    """
+    Assemble the grading query for a layout.
+
+    Args:
+        layout: One of PROMPT_LAYOUTS
+        question: Question or problem statement
+        student_answer: The answer being graded
+        max_points: Maximum points (optional)
+        rubric: Grading rubric (optional)
+        assignment_name: Assignment name (optional)
+        rag_context: Formatted course-material context
+        tool_context: Tool verification results for this answer
+
+    Returns:
+        The query string sent with the system prompt
+    """
+    if layout == "legacy":
+        parts = []
+        if rag_context:
+            parts.append(rag_context)
+        if tool_context:
+            parts.append("\nTOOL VERIFICATION RESULTS:\n" + tool_context)
+        parts.append(legacy_query(question, student_answer, max_points, rubric, assignment_name))
+        return "\n\n".join(parts)
+
+    if layout != "prefix":
+        raise ValueError(f"Unknown prompt layout: {layout!r} (expected one of {PROMPT_LAYOUTS})")
+
+    # Shared by every submission to this question
+    segments = []
+    if rubric:
+        segments.append("GRADING RUBRIC:\n" + canonical_text(rubric))
+    header = []
+    if assignment_name:
+        header.append("Assignment: " + canonical_text(assignment_name))
+    header.append("Question: " + canonical_text(question))
+    if max_points:
+        header.append("Maximum Points: " + format_points(max_points))
+    segments.append("\n".join(header))
+    if rag_context:
+        segments.append(canonical_text(rag_context))
+
+    # Specific to this student
+    if tool_context:
+        segments.append("TOOL VERIFICATION RESULTS:\n" + canonical_text(tool_context))
+    segments.append("STUDENT ANSWER:\n" + canonical_text(student_answer))
+    return _SEPARATOR.join(segments)
+
+
+def legacy_query(
+    question: str,
+    student_answer: Optional[str],
+    max_points: Optional[float] = None,
+    rubric: Optional[str] = None,
+    assignment_name: Optional[str] = None,
+) -> str:
+    """The original assignment/question/answer/rubric block (also the legacy retrieval query)."""
+    query_parts = []
+
+    if assignment_name:
+        query_parts.append(f"Assignment: {assignment_name}")
+
+    query_parts.append(f"Question: {question}")
+    if student_answer is not None:
+        query_parts.append(f"\nStudent Answer:\n{student_answer}")
+
+    if rubric:
+        query_parts.append(f"\nGrading Rubric:\n{rubric}")
+
+    if max_points:
+        query_parts.append(f"\nMaximum Points: {max_points}")
+
+    return "\n".join(query_parts)
+
+
+# -----------------------
+# Prefix report
+# -----------------------
+
+@dataclass
+class PrefixTracker:
+    """
+    Running shared-prefix statistics over a batch of serialized prompts.
+
+    Tracks the prefix common to every prompt and, since caches usually hit
+    on the previous request, the prefix each prompt shares with the one
+    before it.
+    """
+
+    count: int = 0
+    total_bytes: int = 0
+    min_bytes: int = 0
+    max_bytes: int = 0
+    adjacent_prefix_bytes: int = 0
+    _common: Optional[bytes] = None
+    _previous: Optional[bytes] = None
+
+    def add(self, prompt: bytes) -> None:
+        if self._previous is None:
+            self._common = prompt
+            self.min_bytes = self.max_bytes = len(prompt)
+        else:
+            self._common = commonprefix([self._common, prompt])
+            self.adjacent_prefix_bytes += len(commonprefix([self._previous, prompt]))
+            self.min_bytes = min(self.min_bytes, len(prompt))
+            self.max_bytes = max(self.max_bytes, len(prompt))
+        self._previous = prompt
+        self.count += 1
+        self.total_bytes += len(prompt)
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def report(self) -> Dict[str, float]:
+        """
+        Returns:
+            prompts, shared_prefix_bytes (common to all), shared_fraction (of
+            the shortest prompt), mean_adjacent_prefix_bytes (shared with the
+            previous prompt) and prompt sizes
+        """
+        shared = len(self._common or b"")
+        return {
+            "prompts": self.count,
+            "shared_prefix_bytes": shared,
+            "shared_fraction": shared / self.min_bytes if self.min_bytes else 0.0,
+            "mean_adjacent_prefix_bytes": (
+                self.adjacent_prefix_bytes / (self.count - 1) if self.count > 1 else 0.0
+            ),
+            "mean_prompt_bytes": self.total_bytes / self.count if self.count else 0.0,
+            "min_prompt_bytes": self.min_bytes,
+            "max_prompt_bytes": self.max_bytes,
+        }
+
+
+def shared_prefix_report(prompts: Iterable[bytes]) -> Dict[str, float]:
+    """PrefixTracker.report() for a finished batch of serialized prompts."""
+    tracker = PrefixTracker()
+    for prompt in prompts:
+        tracker.add(prompt)
+    return tracker.report()
@@ -0,0 +1,289 @@
+"""
+Persistent store of grading results.
+
+Every grade GradingBot produces is written to a SQLite database, indexed
+by student, assignment and question, so past grades can be looked up (for
+regrades, or instead of calling the model again) and summarized as score
+distributions.
+
+Questions, answers, rubrics and RAG context are stored as SHA-256 hashes
+for lookups; the question text and the feedback are stored in full. A
+rubric is keyed by its compiled fingerprint (gradingBot.rubric), so the
+same rubric pasted with different formatting finds the same grades.
+
+Environment:
+    GRADINGBOT_RESULTS_DB  path of the database
+                           (default: ~/.local/share/gradingbot/results.sqlite)
+"""
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
+
+if TYPE_CHECKING:
+    from gradingBot.rubric import Rubric
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS grades (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created REAL NOT NULL,
+        session_id TEXT NOT NULL,
+        student_id TEXT,
+        assignment TEXT,
+        question TEXT NOT NULL,
+        question_hash TEXT NOT NULL,
+        answer_hash TEXT NOT NULL,
+        rubric_hash TEXT,
+        score REAL,
+        max_points REAL,
+        feedback TEXT NOT NULL,
+        rag_context_hash TEXT,
+        model TEXT NOT NULL,
+        latency_seconds REAL,
+        prompt_tokens INTEGER,
+        completion_tokens INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_grades_student ON grades (student_id, created)",
+    "CREATE INDEX IF NOT EXISTS idx_grades_assignment ON grades (assignment, created)",
+    "CREATE INDEX IF NOT EXISTS idx_grades_question ON grades (question_hash, created)",
+    "CREATE INDEX IF NOT EXISTS idx_grades_answer ON grades (question_hash, answer_hash, rubric_hash, model, created)",
+)
+
+
+def content_hash(text: Optional[str]) -> Optional[str]:
+    """SHA-256 hex digest of a text, or None for empty text."""
+    if not text:
+        return None
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def rubric_hash(rubric) -> Optional[str]:
+    """Fingerprint of a rubric (text or compiled Rubric), or None for no rubric."""
+    from gradingBot.rubric import compile_rubric
+
+    compiled = compile_rubric(rubric)
+    return compiled.fingerprint if compiled is not None else None
+
+
+def default_path() -> Path:
+    env = os.getenv("GRADINGBOT_RESULTS_DB")
+    if env:
+        return Path(env)
+    return Path.home() / ".local" / "share" / "gradingbot" / "results.sqlite"
+
+
+@dataclass
+class GradeRecord:
+    session_id: str
+    question: str
+    student_answer: str
+    feedback: str
+    model: str
+    score: Optional[float] = None
+    max_points: Optional[float] = None
+    student_id: Optional[str] = None
+    assignment: Optional[str] = None
+    rubric: Union[str, "Rubric", None] = None
+    rag_context: Optional[str] = None
+    latency_seconds: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    created: float = field(default_factory=time.time)
+
+
+class ResultStore:
+    """SQLite-backed grade history with lookups and score distributions."""
+
+    def __init__(self, path: Union[str, Path, None] = None):
+        self.path = Path(path) if path is not None else default_path()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # -------- Writes --------
+
+    def add(self, record: GradeRecord) -> int:
+        """Store one grade; returns its row id."""
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute(
+                "INSERT INTO grades (created, session_id, student_id, assignment, question, "
+                "question_hash, answer_hash, rubric_hash, score, max_points, feedback, "
+                "rag_context_hash, model, latency_seconds, prompt_tokens, completion_tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record.created,
+                    record.session_id,
+                    record.student_id,
+                    record.assignment,
+                    record.question,
+                    content_hash(record.question),
+                    content_hash(record.student_answer) or "",
+                    rubric_hash(record.rubric),
+                    record.score,
+                    record.max_points,
+                    record.feedback,
+                    content_hash(record.rag_context),
+                    record.model,
+                    record.latency_seconds,
+                    record.prompt_tokens,
+                    record.completion_tokens,
+                ),
+            )
+            conn.commit()
+            return cur.lastrowid
+
+    # -------- Lookups --------
+
+    def _query(self, sql: str, params: tuple) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self._connect().execute(sql, params).fetchall()]
+
+    def by_student(self, student_id: str, assignment: Optional[str] = None) -> List[Dict]:
+        """A student's grades, newest first, optionally for one assignment."""
+        if assignment is None:
+            return self._query(
+                "SELECT * FROM grades WHERE student_id = ? ORDER BY created DESC", (student_id,)
+            )
+        return self._query(
+            "SELECT * FROM grades WHERE student_id = ? AND assignment = ? ORDER BY created DESC",
+            (student_id, assignment),
+        )
+
+    def by_assignment(self, assignment: str) -> List[Dict]:
+        """All grades for an assignment, newest first."""
+        return self._query(
+            "SELECT * FROM grades WHERE assignment = ? ORDER BY created DESC", (assignment,)
+        )
+
+    def by_question(self, question: str, assignment: Optional[str] = None) -> List[Dict]:
+        """All grades for a question (matched by exact text), newest first."""
+        if assignment is None:
+            return self._query(
+                "SELECT * FROM grades WHERE question_hash = ? ORDER BY created DESC",
+                (content_hash(question),),
+            )
+        return self._query(
+            "SELECT * FROM grades WHERE question_hash = ? AND assignment = ? ORDER BY created DESC",
+            (content_hash(question), assignment),
+        )
+
+    def latest(
+        self,
+        question: str,
+        student_answer: str,
+        rubric: Union[str, "Rubric", None] = None,
+        model: Optional[str] = None,
+        max_points: Optional[float] = None,
+    ) -> Optional[Dict]:
+        """
+        Most recent grade of this exact answer to this question (under the
+        same rubric and max_points, and model if given), or None.
+        """
+        sql = (
+            "SELECT * FROM grades WHERE question_hash = ? AND answer_hash = ? "
+            "AND rubric_hash IS ? AND max_points IS ?"
+        )
+        params: tuple = (
+            content_hash(question),
+            content_hash(student_answer) or "",
+            rubric_hash(rubric),
+            None if max_points is None else float(max_points),
+        )
+        if model is not None:
+            sql += " AND model = ?"
+            params += (model,)
+        rows = self._query(sql + " ORDER BY created DESC LIMIT 1", params)
+        return rows[0] if rows else None
+
+    # -------- Analytics --------
+
+    def score_distribution(
+        self,
+        assignment: Optional[str] = None,
+        question: Optional[str] = None,
+        bins: int = 10,
+    ) -> Dict:
+        """
+        Summary of scored grades, optionally filtered by assignment and/or
+        question.
+
+        Returns:
+            {"count", "mean", "stdev", "min", "max"} over score / max_points
+            (0..1), and "histogram": a list of bins counts over [0, 1]
+        """
+        where = ["score IS NOT NULL", "max_points > 0"]
+        params: tuple = ()
+        if assignment is not None:
+            where.append("assignment = ?")
+            params += (assignment,)
+        if question is not None:
+            where.append("question_hash = ?")
+            params += (content_hash(question),)
+        clause = " AND ".join(where)
+
+        with self._lock:
+            conn = self._connect()
+            count, mean, low, high = conn.execute(
+                "SELECT COUNT(*), AVG(score / max_points), MIN(score / max_points), MAX(score / max_points) "
+                f"FROM grades WHERE {clause}",
+                params,
+            ).fetchone()
+            variance = conn.execute(
+                f"SELECT AVG((score / max_points - ?) * (score / max_points - ?)) FROM grades WHERE {clause}",
+                (mean, mean) + params,
+            ).fetchone()[0] if count else None
+            histogram = [0] * bins
+            for bucket, n in conn.execute(
+                f"SELECT MIN(MAX(CAST(score / max_points * ? AS INTEGER), 0), ?) AS bucket, COUNT(*) "
+                f"FROM grades WHERE {clause} GROUP BY bucket",
+                (bins, bins - 1) + params,
+            ):
+                histogram[bucket] += n
+
+        return {
+            "count": count,
+            "mean": mean,
+            "stdev": math.sqrt(variance) if count else None,
+            "min": low,
+            "max": high,
+            "histogram": histogram,
+        }
+
+
+_default_store: Optional[ResultStore] = None
+_default_lock = threading.Lock()
+
+
+def get_store() -> ResultStore:
+    """Process-wide store at default_path(), opened on first write."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = ResultStore()
+        return _default_store
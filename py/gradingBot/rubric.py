@@ -0,0 +1,280 @@
+"""
+Compiled grading rubrics.
+
+A rubric pasted as text is parsed once (compile_rubric() memoizes on the
+text) into weighted criteria:
+
+    1. Correct base case (2 points)          -> C1 (2 pts): Correct base case
+    - Inductive step: 4 pts                  -> C2 (4 pts): Inductive step
+        uses the hypothesis explicitly          (indented lines extend C2)
+    Deduct 1 point for missing notation.     -> note
+    Total: 6 points                          -> stated total
+
+Lines with a positive point value become criteria, whatever words they
+contain ("Total derivative ...", "... the penalty term"). A line is a
+deduction only when it starts with a deduction verb or carries a negative
+value, and the stated total only when it is nothing but "Total"/"Max" and
+points; both are kept as notes with the other prose. A rubric without any
+point values treats its top-level bullets as equally weighted criteria.
+If the stated total disagrees with the criteria, the parse is not trusted:
+the prompt carries the rubric as written and the score is read from the
+SCORE line alone.
+
+The compiled rubric is sent in a compact form (no decoration, blank lines or
+repeated bullet syntax) that compiles back to the same rubric, and asks the
+grader for one "C1: x/2" line per criterion so the score can be summed from
+the criteria. Its fingerprint is a hash of that compact form, so the same
+rubric pasted with different formatting (say, by two sections) gets the
+same key in the result store.
+"""
+import hashlib
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+
+from gradingBot.prompt_layout import canonical_text, format_points
+
+_POINTS_RE = re.compile(
+    r"(?:(\d+(?:\.\d+)?)\s*[-–]\s*)?(\d+(?:\.\d+)?)\s*(?:points?|pts?|marks?)\b\.?",
+    re.IGNORECASE,
+)
+_BRACKET_POINTS_RE = re.compile(r"^[\[(](\d+(?:\.\d+)?)[\])]\s*|\s*[\[(](\d+(?:\.\d+)?)[\])]$")
+_BULLET_RE = re.compile(r"^(?:[-*•+]|\d+[.)]|[a-zA-Z][.)]|\(\w{1,3}\))\s+")
+_COMPACT_ID_RE = re.compile(r"^C\d+(?=\s*[(:])\s*")
+_EMPTY_BRACKETS_RE = re.compile(r"[\[(]\s*[\])]")
+# A deduction verb followed by its amount: "Deduct 1 point", "Penalty: 2 pts", "Lose up to 3"
+_DEDUCTION_RE = re.compile(
+    r"^(?:deduct\w*|minus|subtract\w*|lose|loses|penalt\w*|take off)\b[\s:]*(?:up to\s+)?\d",
+    re.IGNORECASE,
+)
+# A negative value: "-1 pt", "(-2)", "[-0.5 points]" (not the "1-2" of a range)
+_NEGATIVE_RE = re.compile(r"(?:^|[\s(\[])[-−]\d")
+# Nothing but the total: "Total: 10 points", "Maximum score = 10", "Out of 10 pts"
+_TOTAL_RE = re.compile(
+    r"^(?:total|max(?:imum)?|out of)(?:\s+(?:possible|available))?(?:\s+(?:points?|pts?|marks?|score))?"
+    r"\s*[:=]?\s*(\d+(?:\.\d+)?)\s*(?:points?|pts?|marks?)?\.?$",
+    re.IGNORECASE,
+)
+_DECORATION_RE = re.compile(r"^[\s=\-_*#~]+$")
+_NOTE_PREFIX_RE = re.compile(r"^notes?:\s*", re.IGNORECASE)
+_REPLY_RE = re.compile(
+    r"^[\s*\-]*\**(C\d+)\**\s*[:=\-]\s*(\d+(?:\.\d+)?)(?:\s*/\s*(\d+(?:\.\d+)?))?",
+    re.IGNORECASE | re.MULTILINE,
+)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+SCORING_INSTRUCTION = 'Score each criterion on its own line after SCORE, as "C1: x/{points}".'
+
+
+@dataclass(frozen=True)
+class Criterion:
+    id: str
+    description: str
+    points: Optional[float]  # None: share the points equally with other unweighted criteria
+
+
+@dataclass(frozen=True)
+class Rubric:
+    criteria: Tuple[Criterion, ...] = ()
+    notes: Tuple[str, ...] = ()
+    stated_total: Optional[float] = None
+    # The text it was compiled from, sent instead when the parse is not trusted
+    source: str = field(default="", compare=False, repr=False)
+
+    # -------- Points --------
+
+    @property
+    def total(self) -> Optional[float]:
+        """Points the rubric is out of: the stated total, else the sum of the criteria."""
+        if self.stated_total is not None:
+            return self.stated_total
+        points = [c.points for c in self.criteria if c.points is not None]
+        return sum(points) if points else None
+
+    @property
+    def consistent(self) -> bool:
+        """False when the stated total disagrees with the sum of the criteria's points."""
+        if self.stated_total is None or not self.criteria:
+            return True
+        points = [c.points for c in self.criteria]
+        if any(p is None for p in points):
+            return True
+        return abs(sum(points) - self.stated_total) < 1e-6
+
+    @property
+    def scored_by_criteria(self) -> bool:
+        """Whether the grader is asked for, and scored by, per-criterion lines."""
+        return bool(self.criteria) and self.consistent
+
+    def weights(self) -> Dict[str, float]:
+        """Criterion id -> share of the total (equal shares when no points are given)."""
+        if not self.criteria:
+            return {}
+        weighted = [c.points for c in self.criteria if c.points is not None]
+        if not weighted:
+            return {c.id: 1 / len(self.criteria) for c in self.criteria}
+        # Unweighted criteria among weighted ones get the mean weight
+        mean = sum(weighted) / len(weighted)
+        points = {c.id: c.points if c.points is not None else mean for c in self.criteria}
+        total = sum(points.values())
+        return {cid: p / total for cid, p in points.items()} if total else {}
+
+    def criterion_points(self, max_points: Optional[float] = None) -> Dict[str, float]:
+        """Criterion id -> points, scaled so they add up to max_points (default: the rubric's total)."""
+        target = max_points or self.total
+        if target is None:
+            target = float(len(self.criteria))
+        return {cid: weight * target for cid, weight in self.weights().items()}
+
+    # -------- Serialization --------
+
+    def compact(self) -> str:
+        """Compact text form; compile_rubric(rubric.compact()) == rubric."""
+        lines = []
+        for c in self.criteria:
+            points = f" ({format_points(c.points)} pts)" if c.points is not None else ""
+            lines.append(f"{c.id}{points}: {c.description}")
+        lines.extend(f"Note: {note}" for note in self.notes)
+        if self.stated_total is not None:
+            lines.append(f"Total: {format_points(self.stated_total)} points")
+        return "\n".join(lines)
+
+    def prompt_text(self) -> str:
+        """
+        The compact rubric plus the per-criterion scoring instruction, for
+        the grading prompt; the rubric as written when the parse is not trusted.
+        """
+        if not self.consistent and self.source:
+            return self.source
+        text = self.compact()
+        if self.scored_by_criteria:
+            example = format_points(round(self.criterion_points()[self.criteria[0].id], 2)) or "1"
+            text += "\n" + SCORING_INSTRUCTION.format(points=example)
+        return text
+
+    @property
+    def fingerprint(self) -> str:
+        """SHA-256 of the compact form: equal for the same rubric however it was formatted."""
+        return hashlib.sha256(self.compact().encode("utf-8")).hexdigest()
+
+    # -------- Scoring --------
+
+    def score_reply(self, text: str, max_points: Optional[float] = None) -> Tuple[List[Dict], Optional[float]]:
+        """
+        Read the per-criterion lines ("C1: 2/3") of a grader's reply.
+
+        Returns:
+            (one {"id", "description", "points", "score"} per criterion, with
+            score None when the reply has no line for it; the total, or None
+            unless every criterion was scored). Scores are read against the
+            rubric's own points (or the "/y" given) and scaled to max_points.
+            ([], None) when the rubric is not scored by criteria.
+        """
+        if not self.scored_by_criteria:
+            return [], None
+        own = self.criterion_points()
+        points = self.criterion_points(max_points)
+        found: Dict[str, float] = {}
+        for match in _REPLY_RE.finditer(text or ""):
+            cid = match.group(1).upper()
+            if cid not in points or cid in found:
+                continue
+            out_of = float(match.group(3)) if match.group(3) else own[cid]
+            if not out_of:
+                continue
+            value = float(match.group(2)) / out_of * points[cid]
+            found[cid] = min(max(value, 0.0), points[cid])
+        criteria = [
+            {"id": c.id, "description": c.description, "points": points[c.id], "score": found.get(c.id)}
+            for c in self.criteria
+        ]
+        total = sum(found.values()) if self.criteria and len(found) == len(self.criteria) else None
+        return criteria, total
+
+
+# -----------------------
+# Parsing
+# -----------------------
+
+def _clean(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text).strip(" \t-–—:;,")
+
+
+def _extract_points(line: str) -> Tuple[Optional[float], str]:
+    """(points, the line without them) for a criterion line."""
+    match = _POINTS_RE.search(line)
+    if match:
+        return float(match.group(2)), _clean(_EMPTY_BRACKETS_RE.sub("", line[:match.start()] + " " + line[match.end():]))
+    match = _BRACKET_POINTS_RE.search(line)
+    if match:
+        return float(match.group(1) or match.group(2)), _clean(line[:match.start()] + line[match.end():])
+    return None, line
+
+
+def _parse(text: str) -> Rubric:
+    entries: List[Tuple[List[str], Optional[float]]] = []  # (description parts, points)
+    notes: List[str] = []
+    stated_total = None
+    current = None  # description parts indented lines are added to
+    for raw in canonical_text(text).split("\n"):
+        if not raw.strip() or _DECORATION_RE.match(raw):
+            continue
+        indented = raw[:1] in (" ", "\t")
+        stripped = raw.strip()
+        is_item = bool(_BULLET_RE.match(stripped) or _COMPACT_ID_RE.match(stripped))
+        line = _COMPACT_ID_RE.sub("", _BULLET_RE.sub("", stripped))
+        if _NOTE_PREFIX_RE.match(line):
+            notes.append(_WHITESPACE_RE.sub(" ", _NOTE_PREFIX_RE.sub("", line)).strip())
+            current = None
+            continue
+        total = _TOTAL_RE.match(line)
+        if total:
+            stated_total = float(total.group(1))
+            current = None
+            continue
+        points, rest = _extract_points(line)
+        if indented and current is not None:
+            current.append(_clean(line))
+        elif _DEDUCTION_RE.match(line) or _NEGATIVE_RE.search(line):
+            # Keeps its sign: "-1 pt if no units"
+            notes.append(_WHITESPACE_RE.sub(" ", line).strip())
+            current = None
+        elif points is not None and points > 0:
+            current = [rest]
+            entries.append((current, points))
+        elif points is None and is_item:
+            current = [_clean(line)]
+            entries.append((current, None))
+        else:
+            notes.append(_clean(line))
+            current = None
+
+    # With point values anywhere, unpointed bullets are notes, not criteria
+    if any(points is not None for _, points in entries):
+        notes.extend("; ".join(parts) for parts, points in entries if points is None)
+        entries = [e for e in entries if e[1] is not None]
+    criteria = tuple(
+        Criterion(id=f"C{n}", description="; ".join(p for p in parts if p), points=points)
+        for n, (parts, points) in enumerate(entries, 1)
+    )
+    return Rubric(
+        criteria=criteria,
+        notes=tuple(n for n in notes if n),
+        stated_total=stated_total,
+        source=canonical_text(text).strip(),
+    )
+
+
+@lru_cache(maxsize=256)
+def _compile_text(text: str) -> Rubric:
+    return _parse(text)
+
+
+def compile_rubric(rubric: Union[str, Rubric, None]) -> Optional[Rubric]:
+    """Parse a rubric (memoized per text); Rubric objects and None pass through."""
+    if rubric is None or isinstance(rubric, Rubric):
+        return rubric
+    if not rubric.strip():
+        return None
+    return _compile_text(rubric)
@@ -0,0 +1,151 @@
+"""
+Prompt-level function calling for the grading model.
+
+The proxy's generate endpoint has no native tools parameter, so the tool
+schema is described in the system prompt and the model requests calls by
+answering with a single line:
+
+    TOOL_CALLS: [{"name": "calculator", "arguments": {"expression": "2+3"}}]
+
+GradingBot runs the requested calls in parallel and sends the results back
+in one follow-up turn. A TOOL_CALLS line that cannot be parsed raises
+ToolCallError, and no TOOL_CALLS text is ever kept in a final reply.
+"""
+import inspect
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+_TOOL_CALLS_RE = re.compile(r"TOOL_CALLS:\s*")
+_JSON_DECODER = json.JSONDecoder()
+
+MAX_CALLS_PER_ROUND = 8
+
+
+class ToolCallError(ValueError):
+    """A TOOL_CALLS request that is malformed or names no available tool."""
+
+
+@dataclass
+class ToolCall:
+    name: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+
+
+def build_tool_schema(tools: Mapping[str, Callable]) -> List[Dict]:
+    """
+    Describe each tool as {"name", "description", "parameters"} from its
+    signature and docstring.
+    """
+    schema = []
+    for name, func in tools.items():
+        properties: Dict[str, Dict] = {}
+        required: List[str] = []
+        for param in inspect.signature(func).parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            spec: Dict[str, Any] = {"type": _JSON_TYPES.get(param.annotation, "string")}
+            if param.default is param.empty:
+                required.append(param.name)
+            else:
+                spec["default"] = param.default
+            properties[param.name] = spec
+        doc = inspect.getdoc(func) or ""
+        schema.append({
+            "name": name,
+            "description": doc.split("\n\n")[0].replace("\n", " "),
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        })
+    return schema
+
+
+def render_tool_instructions(schema: List[Dict]) -> str:
+    """System-prompt section that offers the tools to the model."""
+    return (
+        "You may call tools to verify calculations or factual claims before grading. "
+        "Only call a tool when its result could change the grade.\n"
+        "Available tools (JSON schema):\n"
+        f"{json.dumps(schema, separators=(',', ':'))}\n"
+        "To call tools, reply with ONLY one line of the form\n"
+        'TOOL_CALLS: [{"name": "<tool>", "arguments": {...}}, ...]\n'
+        "listing every call you need at once. Otherwise, reply with the grade directly."
+    )
+
+
+def _find_tool_calls(text: str, start: int = 0) -> Optional[Tuple[int, int, Any]]:
+    """
+    (start, end, JSON payload) of the first TOOL_CALLS request at or after
+    start; the payload is None, and the request runs to the end of its line,
+    when no JSON value follows the marker.
+    """
+    match = _TOOL_CALLS_RE.search(text, start)
+    if not match:
+        return None
+    try:
+        payload, end = _JSON_DECODER.raw_decode(text, match.end())
+    except ValueError:
+        end = text.find("\n", match.end())
+        return match.start(), len(text) if end < 0 else end, None
+    return match.start(), end, payload
+
+
+def parse_tool_calls(text: str, tools: Mapping[str, Callable]) -> List[ToolCall]:
+    """
+    Extract valid tool calls from a model reply; [] when it requests none.
+
+    Unknown tools and unexpected arguments are dropped.
+
+    Raises:
+        ToolCallError: The reply has a TOOL_CALLS line that is not a JSON
+                       list, or that names no available tool
+    """
+    found = _find_tool_calls(text or "")
+    if found is None:
+        return []
+    raw = found[2]
+    if not isinstance(raw, list):
+        raise ToolCallError("TOOL_CALLS must be followed by a JSON list of calls")
+
+    calls: List[ToolCall] = []
+    for item in raw:
+        if not isinstance(item, dict) or item.get("name") not in tools:
+            continue
+        allowed = inspect.signature(tools[item["name"]]).parameters
+        arguments = item.get("arguments") or {}
+        if not isinstance(arguments, dict):
+            continue
+        calls.append(ToolCall(item["name"], {k: v for k, v in arguments.items() if k in allowed}))
+        if len(calls) >= MAX_CALLS_PER_ROUND:
+            break
+    if not calls:
+        raise ToolCallError(f"TOOL_CALLS names no available tool (available: {', '.join(tools)})")
+    return calls
+
+
+def render_tool_results(calls: List[ToolCall], results: List[Dict]) -> str:
+    """Follow-up section with the outcome of each call."""
+    lines = ["TOOL RESULTS:"]
+    for call, result in zip(calls, results):
+        lines.append(
+            f"- {call.name}({json.dumps(call.arguments, separators=(',', ':'))}) -> "
+            f"{json.dumps(result, default=str)[:500]}"
+        )
+    return "\n".join(lines)
+
+
+def strip_tool_calls(text: str) -> str:
+    """Remove every TOOL_CALLS request, parseable or not, from a reply that must be final."""
+    text = text or ""
+    parts = []
+    position = 0
+    found = _find_tool_calls(text)
+    while found is not None:
+        start, end, _ = found
+        parts.append(text[position:start])
+        position = end
+        found = _find_tool_calls(text, end)
+    parts.append(text[position:])
+    return "".join(parts).strip()
@@ -0,0 +1,232 @@
+"""
+Concurrent tool execution with per-tool budgets.
+
+Every tool call runs on a shared thread pool. Each tool has its own budget:
+    timeout          seconds from the call getting a concurrency slot until
+                     the caller gives up
+    max_concurrency  calls of this tool allowed to run at once
+    fallback         result returned on timeout (a dict, or a callable that
+                     receives the call's kwargs)
+    queue_timeout    seconds a call may wait for a slot (default: timeout);
+                     a call that never got one is dropped without running
+
+Time spent waiting for a slot does not count against a call's timeout.
+Calls that time out keep running in the background (threads cannot be
+killed) but the caller gets the fallback immediately. Per-tool timings are
+collected and available from ToolRunner.metrics().
+
+Calls run in a copy of the submitter's context, so context variables such
+as an llmproxy deadline() carry over to the tool.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+Fallback = Union[Dict, Callable[..., Dict], None]
+
+
+@dataclass
+class ToolBudget:
+    timeout: float = 10.0
+    max_concurrency: int = 4
+    fallback: Fallback = None
+    queue_timeout: Optional[float] = None  # None: same as timeout
+
+
+@dataclass
+class _ToolStats:
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    queue_timeouts: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class _CallState:
+    """Whether a queued call got its concurrency slot (and when) or was dropped."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started = threading.Event()
+        self.started_at = 0.0
+        self.cancelled = False
+
+    def start(self) -> bool:
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.started_at = time.monotonic()
+            self.started.set()
+            return True
+
+    def cancel(self) -> bool:
+        """Drop the call unless it already started."""
+        with self._lock:
+            if not self.started.is_set():
+                self.cancelled = True
+            return self.cancelled
+
+
+class ToolFuture:
+    """Handle for a submitted tool call; result() enforces the tool's budget."""
+
+    def __init__(
+        self,
+        runner: "ToolRunner",
+        name: str,
+        kwargs: Dict,
+        future: Optional[Future],
+        budget: ToolBudget,
+        state: Optional[_CallState] = None,
+    ):
+        self._runner = runner
+        self.name = name
+        self.kwargs = kwargs
+        self._future = future
+        self._timeout = budget.timeout
+        queue_timeout = budget.timeout if budget.queue_timeout is None else budget.queue_timeout
+        self._queue_deadline = time.monotonic() + queue_timeout
+        self._state = state
+
+    def result(self) -> Dict:
+        if self._future is None:
+            return {"error": f"Tool '{self.name}' not found"}
+        # The timeout runs from when the call got its slot
+        state = self._state
+        if not state.started.wait(timeout=max(0.0, self._queue_deadline - time.monotonic())) and state.cancel():
+            self._runner._record_timeout(self.name, queued=True)
+            return self._runner._fallback(self.name, self.kwargs)
+        try:
+            return self._future.result(timeout=max(0.0, state.started_at + self._timeout - time.monotonic()))
+        except FutureTimeoutError:
+            self._runner._record_timeout(self.name)
+            return self._runner._fallback(self.name, self.kwargs)
+
+
+class ToolRunner:
+    """Runs registered tools concurrently under per-tool budgets."""
+
+    def __init__(
+        self,
+        registry: Mapping[str, Callable[..., Dict]],
+        budgets: Optional[Dict[str, ToolBudget]] = None,
+        default_budget: Optional[ToolBudget] = None,
+        max_workers: int = 16,
+    ):
+        """
+        Args:
+            registry: Tool name -> callable. Looked up on every call, so a
+                      live mapping (e.g. GradingBot.tools) picks up changes.
+            budgets: Per-tool budgets
+            default_budget: Budget for tools without their own entry
+            max_workers: Size of the shared thread pool
+        """
+        self.registry = registry
+        self.budgets: Dict[str, ToolBudget] = dict(budgets or {})
+        self.default_budget = default_budget or ToolBudget()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._stats: Dict[str, _ToolStats] = {}
+        self._lock = threading.Lock()
+
+    # -------- Budgets & metrics --------
+
+    def budget(self, name: str) -> ToolBudget:
+        return self.budgets.get(name, self.default_budget)
+
+    def set_budget(self, name: str, budget: ToolBudget) -> None:
+        with self._lock:
+            self.budgets[name] = budget
+            self._semaphores.pop(name, None)
+
+    def _semaphore(self, name: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if name not in self._semaphores:
+                self._semaphores[name] = threading.BoundedSemaphore(max(1, self.budget(name).max_concurrency))
+            return self._semaphores[name]
+
+    def _record(self, name: str, seconds: float, error: bool) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, _ToolStats())
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def _record_timeout(self, name: str, queued: bool = False) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, _ToolStats())
+            if queued:
+                stats.queue_timeouts += 1
+            else:
+                stats.timeouts += 1
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """Per-tool call counts and timings (seconds) since creation or reset."""
+        with self._lock:
+            return {
+                name: {
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "timeouts": s.timeouts,
+                    "queue_timeouts": s.queue_timeouts,
+                    "total_seconds": s.total_seconds,
+                    "mean_seconds": s.total_seconds / s.calls if s.calls else 0.0,
+                    "max_seconds": s.max_seconds,
+                }
+                for name, s in self._stats.items()
+            }
+
+    def reset_metrics(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def _fallback(self, name: str, kwargs: Dict) -> Dict:
+        budget = self.budget(name)
+        if callable(budget.fallback):
+            return budget.fallback(**kwargs)
+        if budget.fallback is not None:
+            return dict(budget.fallback)
+        return {"error": f"Tool '{name}' timed out after {budget.timeout}s", "timed_out": True}
+
+    # -------- Execution --------
+
+    def _call(self, name: str, func: Callable[..., Dict], kwargs: Dict, state: _CallState) -> Optional[Dict]:
+        with self._semaphore(name):
+            if not state.start():
+                return None  # the caller gave up before a slot was free
+            start = time.perf_counter()
+            try:
+                result = func(**kwargs)
+            except Exception as e:
+                result = {"error": str(e)}
+            elapsed = time.perf_counter() - start
+        self._record(name, elapsed, isinstance(result, dict) and "error" in result)
+        return result
+
+    def submit(self, name: str, **kwargs: Any) -> ToolFuture:
+        """Start a tool call and return a handle to its result."""
+        budget = self.budget(name)
+        func = self.registry.get(name)
+        if func is None:
+            return ToolFuture(self, name, kwargs, None, budget)
+        state = _CallState()
+        future = self._executor.submit(contextvars.copy_context().run, self._call, name, func, kwargs, state)
+        return ToolFuture(self, name, kwargs, future, budget, state)
+
+    def run(self, name: str, **kwargs: Any) -> Dict:
+        """Run one tool call and wait for it (within its budget)."""
+        return self.submit(name, **kwargs).result()
+
+    def run_many(self, calls: List[Tuple[str, Dict]]) -> List[Dict]:
+        """Run (name, kwargs) calls concurrently; results are in input order."""
+        futures = [self.submit(name, **kwargs) for name, kwargs in calls]
+        return [f.result() for f in futures]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -1,64 +1,106 @@
-import math
-import ast
-import operator as op
-
-# Safe operators
-SAFE_OPERATORS = {
-    ast.Add: op.add,
-    ast.Sub: op.sub,
-    ast.Mult: op.mul,
-    ast.Div: op.truediv,
-    ast.Pow: op.pow,
-    ast.USub: op.neg,
-}
-
-def safe_eval(expr):
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from gradingBot.math_eval import (
+    DEFAULT_TIMEOUT,
+    EvaluationError,
+    EvaluationTimeout,
+    EvaluationWorkerError,
+    evaluate,
+    evaluate_unbounded_time,
+)
+
+
+def safe_eval(expr, mode="arithmetic"):
+    """
+    Safely evaluate math expressions, in-process.
+    Supports +, -, *, /, ** with exponent and magnitude limits; mode="discrete"
+    adds factorial, binomials, mod, gcd/lcm and set sizes. See gradingBot.math_eval.
     """
-    Safely evaluate math expressions.
-    Supports +, -, *, /, ** only.
+    return evaluate_unbounded_time(expr, mode)
+
+
+@lru_cache(maxsize=4096)
+def _calculate(expression: str, mode: str) -> Tuple[str, object]:
+    """
+    Memoized core of calculator_tool; returns ("result" | "error", value).
+
+    Only results and deterministic errors are returned (and so cached);
+    timeouts and worker failures depend on load and are raised instead.
     """
-    def eval_node(node):
-        if isinstance(node, ast.Num):
-            return node.n
-        elif isinstance(node, ast.BinOp):
-            return SAFE_OPERATORS[type(node.op)](
-                eval_node(node.left),
-                eval_node(node.right)
-            )
-        elif isinstance(node, ast.UnaryOp):
-            return SAFE_OPERATORS[type(node.op)](
-                eval_node(node.operand)
-            )
-        else:
-            raise TypeError("Unsupported expression")
-
-    return eval_node(ast.parse(expr, mode='eval').body)
-
-
-def calculator_tool(expression: str):
     try:
-        result = safe_eval(expression)
-        return {"result": result}
+        return "result", evaluate(expression, mode=mode, timeout=DEFAULT_TIMEOUT)
+    except (EvaluationTimeout, EvaluationWorkerError):
+        raise
+    except EvaluationError as e:
+        return "error", str(e)
+
+
+def calculator_tool(expression: str, mode: str = "arithmetic"):
+    """
+    Evaluates a math expression exactly. mode="discrete" adds n!, C(n,k),
+    perm, mod, gcd/lcm and set sizes like len({1,2} | {2,3}).
+    """
+    # Collapse whitespace so "2 +  3" and "2 + 3" share a cache entry
+    try:
+        key, value = _calculate(" ".join(expression.split()), mode)
     except Exception as e:
-        return {"error": str(e)}
-    
+        key, value = "error", str(e)
+    return {key: value}
+
+
+# Simple "a op b" arithmetic in free text, compiled once
+MATH_EXPR_RE = re.compile(r"\b\d+\s*[\+\-\*\/]\s*\d+\b")
+
+# Upper bound on expressions checked per answer, so a pathological answer with
+# thousands of "a+b" fragments cannot stall a grading worker
+MAX_EXPRESSIONS_PER_ANSWER = 50
+
+
+def find_math_expressions(text: str, limit: int = MAX_EXPRESSIONS_PER_ANSWER) -> List[str]:
+    """
+    Return up to `limit` distinct arithmetic expressions from text, in order of appearance.
+    """
+    found: Dict[str, None] = {}
+    for match in MATH_EXPR_RE.finditer(text):
+        if len(found) >= limit:
+            break
+        found.setdefault(match.group(0), None)
+    return list(found)
 
-import requests
 
 def web_api_tool(query: str):
     """
     Fetches a short answer for a question using DuckDuckGo Instant Answer API.
+
+    Goes through the shared verifier in gradingBot.web_verify, which pools
+    connections, enforces timeouts and caches answers.
     """
+    from gradingBot.web_verify import get_verifier
+
     try:
-        url = "https://api.duckduckgo.com/"
-        params = {
-            "q": query,
-            "format": "json",
-            "t": "gradingBot"
-        }
-        response = requests.get(url, params=params)
-        data = response.json()
-        answer = data.get("AbstractText") or "No answer found."
-        return {"result": answer}
+        return get_verifier().lookup(query)
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+# Phrases in an answer that mark a factual claim worth verifying
+CLAIM_KEYWORDS = ("according to", "research shows", "wikipedia", "study")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+MAX_CLAIMS_PER_ANSWER = 3
+MAX_CLAIM_CHARS = 200
+
+
+def find_claims(text: str, limit: int = MAX_CLAIMS_PER_ANSWER) -> List[str]:
+    """
+    Return up to `limit` distinct sentences from text that contain a claim keyword.
+    """
+    claims: Dict[str, None] = {}
+    for sentence in _SENTENCE_SPLIT_RE.split(text):
+        if len(claims) >= limit:
+            break
+        lowered = sentence.lower()
+        if any(keyword in lowered for keyword in CLAIM_KEYWORDS):
+            claims.setdefault(" ".join(sentence.split())[:MAX_CLAIM_CHARS], None)
+    return list(claims)
@@ -0,0 +1,222 @@
+"""
+Web verification backend for the web_api tool.
+
+Lookups go through a pluggable backend:
+    DuckDuckGoBackend  DuckDuckGo Instant Answer API over a shared, pooled
+                       requests session with strict connect/read timeouts
+    FixtureBackend     canned answers from a dict or JSON file, for offline
+                       tests and demos
+
+Successful answers are stored in a persistent SQLite cache with a TTL.
+Several claims are looked up concurrently by running web_api calls through
+the ToolRunner (gradingBot.tool_runner), which shares one verifier.
+
+Environment:
+    GRADINGBOT_WEB_FIXTURES  path to a JSON {query: answer} file; selects the
+                             fixture backend instead of the live API
+    GRADINGBOT_CACHE_DIR     directory for the response cache
+                             (default: ~/.cache/gradingbot)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+DEFAULT_TIMEOUT: Tuple[float, float] = (3.05, 5.0)   # (connect, read) seconds
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_WORKERS = 4  # concurrent web_api calls the connection pool is sized for
+NO_ANSWER = "No answer found."
+
+
+# -----------------------
+# Backends
+# -----------------------
+
+class WebBackend(ABC):
+    """Interface for web lookup backends."""
+
+    name = "base"
+
+    @abstractmethod
+    def lookup(self, query: str) -> Dict:
+        """Return {"result": text} or {"error": message}."""
+
+
+class DuckDuckGoBackend(WebBackend):
+    """DuckDuckGo Instant Answer API with a shared connection pool."""
+
+    name = "duckduckgo"
+    url = "https://api.duckduckgo.com/"
+
+    _session = None
+    _session_lock = threading.Lock()
+
+    def __init__(self, timeout: Tuple[float, float] = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+
+    @classmethod
+    def session(cls):
+        """Process-wide session, built on first use."""
+        with cls._session_lock:
+            if cls._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                s = requests.Session()
+                retries = Retry(total=1, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504))
+                adapter = HTTPAdapter(max_retries=retries, pool_connections=4, pool_maxsize=DEFAULT_MAX_WORKERS * 2)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                cls._session = s
+            return cls._session
+
+    def lookup(self, query: str) -> Dict:
+        import requests
+
+        params = {
+            "q": query,
+            "format": "json",
+            "no_html": 1,
+            "t": "gradingBot"
+        }
+        try:
+            response = self.session().get(self.url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            return {"error": str(e)}
+        return {"result": data.get("AbstractText") or NO_ANSWER}
+
+
+class FixtureBackend(WebBackend):
+    """Offline backend answering from a {query: answer} mapping (case-insensitive)."""
+
+    name = "fixture"
+
+    def __init__(self, answers: Union[Dict[str, str], str, Path, None] = None):
+        if isinstance(answers, (str, Path)):
+            answers = json.loads(Path(answers).read_text(encoding="utf-8"))
+        self.answers = {k.strip().lower(): v for k, v in (answers or {}).items()}
+
+    def lookup(self, query: str) -> Dict:
+        return {"result": self.answers.get(query.strip().lower(), NO_ANSWER)}
+
+
+# -----------------------
+# Persistent cache
+# -----------------------
+
+class ResponseCache:
+    """SQLite-backed {key: answer} store with per-entry expiry."""
+
+    def __init__(self, path: Union[str, Path, None] = None, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        if path is None:
+            cache_dir = Path(os.getenv("GRADINGBOT_CACHE_DIR") or Path.home() / ".cache" / "gradingbot")
+            path = cache_dir / "web_cache.sqlite"
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    "SELECT value FROM responses WHERE key = ? AND expires > ?", (key, time.time())
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)",
+                    (key, value, time.time() + self.ttl_seconds),
+                )
+                conn.commit()
+            except sqlite3.Error:
+                pass  # caching is best-effort
+
+    def purge_expired(self) -> int:
+        """Delete expired entries; returns the number removed."""
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+            conn.commit()
+            return cur.rowcount
+
+
+# -----------------------
+# Verifier
+# -----------------------
+
+class WebVerifier:
+    """Cached lookups through a backend; safe to share between threads."""
+
+    def __init__(
+        self,
+        backend: Optional[WebBackend] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        self.backend = backend or backend_from_env()
+        self.cache = cache if cache is not None else ResponseCache()
+
+    def _key(self, query: str) -> str:
+        return f"{self.backend.name}:{' '.join(query.lower().split())}"
+
+    def lookup(self, query: str) -> Dict:
+        """Look up one query, serving from the cache when possible."""
+        key = self._key(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {"result": cached, "cached": True}
+        result = self.backend.lookup(query)
+        if "result" in result:
+            self.cache.set(key, result["result"])
+        return result
+
+
+def backend_from_env() -> WebBackend:
+    """Fixture backend if GRADINGBOT_WEB_FIXTURES is set, live API otherwise."""
+    fixtures = os.getenv("GRADINGBOT_WEB_FIXTURES")
+    if fixtures:
+        return FixtureBackend(fixtures)
+    return DuckDuckGoBackend()
+
+
+_default_verifier: Optional[WebVerifier] = None
+_default_lock = threading.Lock()
+
+
+def get_verifier() -> WebVerifier:
+    """Process-wide verifier shared by all web_api tool calls."""
+    global _default_verifier
+    with _default_lock:
+        if _default_verifier is None:
+            _default_verifier = WebVerifier()
+        return _default_verifier
+
+
+def set_verifier(verifier: Optional[WebVerifier]) -> None:
+    """Replace the shared verifier (e.g. with a FixtureBackend); None resets it."""
+    global _default_verifier
+    with _default_lock:
+        _default_verifier = verifier
@@ -0,0 +1,427 @@
+"""
+Multiprocess grading: a SQLite job queue and the workers that drain it.
+
+GradingBot.grade_pool() splits a batch into jobs (whole clusters of
+near-identical answers stay together), queues them in a SQLite file,
+starts N worker processes and merges their results. Workers on other hosts
+join by pointing at the same file (on a shared filesystem):
+
+    python -m gradingBot.worker_pool /shared/queue.sqlite --wait
+
+Each job is leased to one worker. A job whose worker died is handed out
+again (at once if the worker was one of the pool's own processes, else
+when its lease expires), up to MAX_ATTEMPTS times. Every worker's
+LLMProxy takes its request tokens from one token bucket kept in the same
+file (llmproxy.rate_limit), so the pool as a whole stays within the
+proxy's rate limit however many processes or hosts take part.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Union
+
+DEFAULT_LEASE = 900.0  # seconds a worker may hold a job before it is handed out again
+MAX_ATTEMPTS = 3
+JOB_SIZE = 8  # answers per job (a cluster is never split)
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS batches (
+        id TEXT PRIMARY KEY,
+        created REAL NOT NULL,
+        settings TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        batch TEXT NOT NULL,
+        submissions TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        worker TEXT,
+        claimed REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        results TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, batch, id)",
+)
+
+
+# -----------------------
+# Queue
+# -----------------------
+
+class GradingQueue:
+    """SQLite queue of grading jobs, safe to share between processes and hosts."""
+
+    def __init__(self, path: Union[str, Path], lease: float = DEFAULT_LEASE):
+        self.path = Path(path)
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # -------- Producer --------
+
+    def add_batch(self, settings: Dict, jobs: List[Mapping[str, str]]) -> str:
+        """Queue one batch: its grading settings and jobs of student_id -> answer. Returns the batch id."""
+        batch = uuid.uuid4().hex
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO batches (id, created, settings) VALUES (?, ?, ?)",
+                (batch, time.time(), json.dumps(settings)),
+            )
+            conn.executemany(
+                "INSERT INTO jobs (batch, submissions) VALUES (?, ?)",
+                [(batch, json.dumps(dict(job))) for job in jobs],
+            )
+            conn.execute("COMMIT")
+        return batch
+
+    def progress(self, batch: str) -> Dict[str, int]:
+        """Number of the batch's jobs per status (pending, running, done)."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE batch = ? GROUP BY status", (batch,)
+            ).fetchall()
+        counts = {"pending": 0, "running": 0, "done": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def results(self, batch: str) -> Dict[str, Dict]:
+        """student_id -> result, merged from the batch's finished jobs."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT results FROM jobs WHERE batch = ? AND status = 'done' ORDER BY id", (batch,)
+            ).fetchall()
+        merged: Dict[str, Dict] = {}
+        for (results,) in rows:
+            merged.update(json.loads(results))
+        return merged
+
+    # -------- Consumer --------
+
+    def settings(self, batch: str) -> Dict:
+        with self._lock:
+            row = self._connect().execute("SELECT settings FROM batches WHERE id = ?", (batch,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown batch: {batch}")
+        return json.loads(row[0])
+
+    def claim(self, worker: str, batch: Optional[str] = None) -> Optional[Dict]:
+        """
+        Lease the oldest pending job (or one whose lease expired) to worker.
+
+        Returns:
+            {"id", "batch", "submissions", "attempts"}, or None if there is
+            nothing to do. A job past MAX_ATTEMPTS is finished with an
+            error result for each of its answers instead of being handed out.
+        """
+        with self._lock:
+            conn = self._connect()
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT id, batch, submissions, attempts FROM jobs "
+                    "WHERE (status = 'pending' OR (status = 'running' AND claimed < ?)) "
+                    "AND (? IS NULL OR batch = ?) ORDER BY id LIMIT 1",
+                    (time.time() - self.lease, batch, batch),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                job_id, job_batch, submissions, attempts = row
+                if attempts >= MAX_ATTEMPTS:
+                    error = {
+                        "error": f"Grading job failed: no result after {attempts} attempts",
+                        "status_code": None,
+                    }
+                    conn.execute(
+                        "UPDATE jobs SET status = 'done', results = ? WHERE id = ?",
+                        (json.dumps({sid: error for sid in json.loads(submissions)}), job_id),
+                    )
+                    conn.execute("COMMIT")
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, claimed = ?, attempts = attempts + 1 WHERE id = ?",
+                    (worker, time.time(), job_id),
+                )
+                conn.execute("COMMIT")
+                return {
+                    "id": job_id,
+                    "batch": job_batch,
+                    "submissions": json.loads(submissions),
+                    "attempts": attempts + 1,
+                }
+
+    def release(self, worker: str) -> int:
+        """Put the jobs a (dead) worker holds back in the queue; returns how many."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET status = 'pending', worker = NULL WHERE worker = ? AND status = 'running'",
+                (worker,),
+            )
+            return cursor.rowcount
+
+    def complete(self, job_id: int, worker: str, results: Mapping[str, Dict]) -> bool:
+        """Store a job's results; False if the lease was lost to another worker meanwhile."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET status = 'done', results = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (json.dumps(results, default=str), job_id, worker),
+            )
+            return cursor.rowcount == 1
+
+
+# -----------------------
+# Workers
+# -----------------------
+
+# GradingBot arguments a worker is rebuilt from (clients and stores are per process)
+_BOT_SETTINGS = (
+    "session_id", "model", "max_tool_expressions", "tool_mode", "max_tool_rounds",
+    "tool_loop_budget", "prompt_layout", "deadline", "rag_max_chars",
+)
+
+
+def bot_settings(bot) -> Dict:
+    """JSON-serializable settings to rebuild a GradingBot like bot in a worker."""
+    settings = {name: getattr(bot, name) for name in _BOT_SETTINGS}
+    settings["cascade"] = asdict(bot.cascade) if bot.cascade is not None else None
+    settings["retrieval"] = asdict(bot.retrieval) if bot.retrieval is not None else None
+    settings["store_results"] = bot.result_store is not None
+    settings["results_db"] = str(bot.result_store.path) if bot.result_store is not None else None
+    return settings
+
+
+def _make_bot(settings: Dict, queue_path: Path):
+    from llmproxy import LLMProxy, RateLimit
+    from gradingBot.gradingBot import GradingBot
+
+    rate_limit = settings.get("rate_limit")
+    client = LLMProxy(
+        # The bucket lives in the queue file, so all workers share it
+        rate_limit=RateLimit(rate_limit["requests_per_second"], rate_limit.get("burst"), path=str(queue_path))
+        if rate_limit else None
+    )
+    bot_kwargs = dict(settings["bot"])
+    cascade = bot_kwargs.pop("cascade", None)
+    if cascade is not None:
+        from gradingBot.cascade import CascadeConfig
+        cascade = CascadeConfig(**{k: tuple(v) if isinstance(v, list) else v for k, v in cascade.items()})
+    retrieval = bot_kwargs.pop("retrieval", None)
+    if retrieval is not None:
+        from gradingBot.adaptive_rag import AdaptiveRetrieval
+        retrieval = AdaptiveRetrieval(**retrieval)
+    results_db = bot_kwargs.pop("results_db", None)
+    result_store = None
+    if bot_kwargs.get("store_results") and results_db:
+        from gradingBot.result_store import ResultStore
+        result_store = ResultStore(results_db)
+    return GradingBot(client=client, cascade=cascade, retrieval=retrieval, result_store=result_store, **bot_kwargs)
+
+
+def run_worker(
+    queue_path: Union[str, Path],
+    batch: Optional[str] = None,
+    wait: bool = False,
+    poll: float = 1.0,
+    worker_id: Optional[str] = None,
+) -> int:
+    """
+    Grade queued jobs until there are none left (or, with wait=True, forever).
+
+    Args:
+        queue_path: The queue's SQLite file
+        batch: Only take jobs of this batch (default: any)
+        wait: Keep polling for new jobs instead of exiting when idle
+        poll: Seconds between polls while waiting
+        worker_id: Name recorded on claimed jobs (default: host:pid)
+
+    Returns:
+        Number of jobs completed
+    """
+    queue = GradingQueue(queue_path)
+    worker = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    bots: Dict[str, object] = {}
+    settings_by_batch: Dict[str, Dict] = {}
+    completed = 0
+    try:
+        while True:
+            job = queue.claim(worker, batch)
+            if job is None:
+                if not wait:
+                    return completed
+                time.sleep(poll)
+                continue
+            settings = settings_by_batch.get(job["batch"])
+            if settings is None:
+                settings = settings_by_batch[job["batch"]] = queue.settings(job["batch"])
+            key = json.dumps([settings["bot"], settings.get("rate_limit")], sort_keys=True)
+            bot = bots.get(key)
+            if bot is None:
+                bot = bots[key] = _make_bot(settings, queue.path)
+            try:
+                results = bot.grade_many(settings["question"], job["submissions"], **settings["grade"])
+            except Exception as e:  # one bad job must not take the worker down
+                error = {"error": f"Grading failed in worker {worker}: {e}", "status_code": None}
+                results = {sid: error for sid in job["submissions"]}
+            if queue.complete(job["id"], worker, results):
+                completed += 1
+    finally:
+        queue.close()
+
+
+# -----------------------
+# Pool
+# -----------------------
+
+def _split_jobs(
+    submissions: Mapping[str, str],
+    dedupe: bool,
+    similarity_threshold: float,
+    job_size: int,
+) -> List[Dict[str, str]]:
+    """Pack answers into jobs of about job_size, keeping each cluster in one job."""
+    student_ids = list(submissions)
+    if dedupe:
+        from gradingBot.dedupe import cluster_answers
+        groups = [c.members for c in cluster_answers([submissions[s] for s in student_ids], threshold=similarity_threshold)]
+    else:
+        groups = [[n] for n in range(len(student_ids))]
+    jobs: List[Dict[str, str]] = []
+    current: Dict[str, str] = {}
+    for members in groups:
+        for n in members:
+            current[student_ids[n]] = submissions[student_ids[n]]
+        if len(current) >= job_size:
+            jobs.append(current)
+            current = {}
+    if current:
+        jobs.append(current)
+    return jobs
+
+
+def grade_pool(
+    bot,
+    question: str,
+    submissions: Mapping[str, str],
+    workers: Optional[int] = None,
+    queue_path: Optional[Union[str, Path]] = None,
+    requests_per_second: Optional[float] = None,
+    job_size: int = JOB_SIZE,
+    poll: float = 0.2,
+    **grade_kwargs,
+) -> Dict[str, Dict]:
+    """Implementation of GradingBot.grade_pool(); see there."""
+    import multiprocessing
+    import tempfile
+
+    if grade_kwargs.get("rubric") is not None:
+        from gradingBot.rubric import compile_rubric
+        # Queued as text that compiles back to the same rubric: the text it
+        # was compiled from (sent as is if its parse is not trusted), else
+        # the compact form
+        compiled = compile_rubric(grade_kwargs["rubric"])
+        grade_kwargs["rubric"] = (compiled.source or compiled.compact()) if compiled is not None else None
+    dedupe = grade_kwargs.get("dedupe", True)
+    similarity_threshold = grade_kwargs.get("similarity_threshold", 0.9)
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    if requests_per_second is None and bot.client.config.rate_limit is not None:
+        requests_per_second = bot.client.config.rate_limit.requests_per_second
+
+    tmpdir = None
+    if queue_path is None:
+        tmpdir = tempfile.TemporaryDirectory(prefix="gradingbot-queue-")
+        queue_path = Path(tmpdir.name) / "queue.sqlite"
+    queue = GradingQueue(queue_path)
+    processes = []
+    try:
+        with bot._phase("dedupe"):
+            jobs = _split_jobs(submissions, dedupe, similarity_threshold, job_size)
+        settings = {
+            "question": question,
+            "grade": grade_kwargs,
+            "bot": bot_settings(bot),
+            "rate_limit": {"requests_per_second": requests_per_second} if requests_per_second else None,
+        }
+        batch = queue.add_batch(settings, jobs)
+
+        # spawn, not fork: the parent has live threads, sockets and SQLite handles
+        context = multiprocessing.get_context("spawn")
+        for n in range(min(workers, len(jobs))):
+            worker_id = f"{socket.gethostname()}:{batch[:8]}:{n}"
+            process = context.Process(
+                target=run_worker,
+                args=(str(queue_path), batch),
+                kwargs={"worker_id": worker_id},
+                name=f"grading-worker-{n}",
+                daemon=True,
+            )
+            process.start()
+            processes.append((worker_id, process))
+
+        # Wait for the batch; with workers=0 jobs are left to workers elsewhere
+        released = set()
+        while queue.progress(batch)["done"] < len(jobs):
+            for worker_id, process in processes:
+                if process.exitcode not in (None, 0) and worker_id not in released:
+                    # Crashed: its job goes back to the queue now, not when the lease runs out
+                    queue.release(worker_id)
+                    released.add(worker_id)
+            if processes and not any(p.is_alive() for _, p in processes):
+                # No local worker left; grade what remains in this process
+                if run_worker(queue_path, batch, worker_id=f"{socket.gethostname()}:{os.getpid()}"):
+                    continue
+                # Nothing to claim: the rest is leased by workers elsewhere
+            time.sleep(poll)
+
+        results = queue.results(batch)
+    finally:
+        for _, process in processes:
+            process.join(timeout=5)
+        queue.close()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    missing = {"error": "Grading job produced no result", "status_code": None}
+    return {sid: results.get(sid, missing) for sid in submissions}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Grade jobs from a shared grading queue")
+    parser.add_argument("queue", type=str, help="Queue SQLite file (shared with GradingBot.grade_pool)")
+    parser.add_argument("--batch", type=str, default=None, help="Only grade jobs of this batch")
+    parser.add_argument("--wait", action="store_true", help="Keep waiting for new jobs instead of exiting when idle")
+    parser.add_argument("--poll", type=float, default=1.0, help="Seconds between polls while waiting")
+    args = parser.parse_args()
+
+    done = run_worker(args.queue, args.batch, wait=args.wait, poll=args.poll)
+    print(f"Completed {done} job(s)")
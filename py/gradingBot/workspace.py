@@ -0,0 +1,203 @@
+"""
+Per-job scratch space for uploads and split PDF parts.
+
+Every job gets its own uniquely named directory under a common root, so
+concurrent uploads of files with the same name never collide. The directory
+is removed when the job finishes, whether it succeeded or failed. Writes are
+checked against a byte quota as they happen (every QUOTA_CHECK_BYTES), also
+by other processes writing into the directory through open_with_quota(),
+so one oversized file cannot fill the disk before the quota is noticed.
+
+Example:
+    with Workspace() as ws:
+        path = ws.save("hw1.pdf", data)
+        ...  # path and everything else in ws.path is deleted on exit
+"""
+import io
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+# Defaults; GradingBot passes its own values through
+DEFAULT_ROOT = Path(tempfile.gettempdir()) / "gradingbot"
+DEFAULT_QUOTA_BYTES = 2 * 1024 * 1024 * 1024   # 2 GB per job
+QUOTA_CHECK_BYTES = 1024 * 1024               # writes between two quota checks
+_PREFIX = "job-"
+
+
+class WorkspaceQuotaError(OSError):
+    """Raised when a write would push a workspace over its byte quota."""
+
+
+def tree_bytes(path: Union[str, Path]) -> int:
+    """Bytes of all files under path."""
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(directory, name)).st_size
+            except OSError:
+                continue  # removed meanwhile
+    return total
+
+
+def _quota_error(used: int, quota_bytes: int) -> WorkspaceQuotaError:
+    return WorkspaceQuotaError(f"Workspace quota exceeded: {used} bytes requested, quota is {quota_bytes} bytes")
+
+
+class _QuotaFile(io.FileIO):
+    """Write-only file that stops before its directory tree outgrows a quota."""
+
+    def __init__(self, path: Union[str, Path], root: Union[str, Path], quota_bytes: int):
+        super().__init__(str(path), "wb")
+        self._root = root
+        self._quota_bytes = quota_bytes
+        self._unchecked = QUOTA_CHECK_BYTES  # check on the first write
+
+    def write(self, data) -> int:
+        n = memoryview(data).nbytes
+        self._unchecked += n
+        if self._unchecked >= QUOTA_CHECK_BYTES:
+            self._unchecked = 0
+            used = tree_bytes(self._root) + n
+            if used > self._quota_bytes:
+                raise _quota_error(used, self._quota_bytes)
+        return super().write(data)
+
+
+def open_with_quota(
+    path: Union[str, Path],
+    root: Union[str, Path, None] = None,
+    quota_bytes: Optional[int] = None,
+) -> BinaryIO:
+    """
+    Open path for writing; a write that would take the files under root
+    (default: path's directory) past quota_bytes raises WorkspaceQuotaError.
+    Usable from any process, e.g. PDF split workers.
+    """
+    if quota_bytes is None:
+        return open(path, "wb")
+    raw = _QuotaFile(path, root if root is not None else Path(path).parent, quota_bytes)
+    return io.BufferedWriter(raw, buffer_size=QUOTA_CHECK_BYTES)
+
+
+class Workspace:
+    """A unique, self-cleaning scratch directory with a byte quota."""
+
+    def __init__(
+        self,
+        root: Union[str, Path, None] = None,
+        quota_bytes: Optional[int] = DEFAULT_QUOTA_BYTES,
+        keep: bool = False,
+    ):
+        """
+        Args:
+            root: Parent directory for job directories (default: $TMPDIR/gradingbot)
+            quota_bytes: Max bytes this job may write to disk (None = unlimited)
+            keep: Leave the directory in place on close (for debugging)
+        """
+        self.root = Path(root) if root is not None else DEFAULT_ROOT
+        self.quota_bytes = quota_bytes
+        self.keep = keep
+        self._path: Optional[Path] = None
+
+    # -------- Lifecycle --------
+
+    @property
+    def path(self) -> Path:
+        """The job directory, created on first access."""
+        if self._path is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._path = Path(tempfile.mkdtemp(prefix=_PREFIX, dir=self.root))
+        return self._path
+
+    def close(self) -> None:
+        """Delete the job directory and everything in it."""
+        if self._path is not None and not self.keep:
+            shutil.rmtree(self._path, ignore_errors=True)
+        self._path = None
+
+    def __enter__(self) -> "Workspace":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # -------- Quota --------
+
+    def used_bytes(self) -> int:
+        """Bytes currently on disk in the job directory."""
+        if self._path is None:
+            return 0
+        return tree_bytes(self._path)
+
+    def reserve(self, n_bytes: int) -> None:
+        """
+        Check that n_bytes more can be written without exceeding the quota.
+
+        Raises:
+            WorkspaceQuotaError: if the write would exceed the quota
+        """
+        if self.quota_bytes is None:
+            return
+        used = self.used_bytes()
+        if used + n_bytes > self.quota_bytes:
+            raise _quota_error(used + n_bytes, self.quota_bytes)
+
+    def check_quota(self) -> None:
+        """Raise WorkspaceQuotaError if files written by others exceeded the quota."""
+        self.reserve(0)
+
+    # -------- Files --------
+
+    def file(self, name: str) -> Path:
+        """
+        Path for a file inside the job directory.
+
+        Only the final component of name is used, so client-supplied names
+        cannot escape the workspace.
+        """
+        safe = Path(name).name or "file"
+        return self.path / safe
+
+    def open(self, name: str) -> BinaryIO:
+        """Open a file in the workspace for writing; writes past the quota raise WorkspaceQuotaError."""
+        return open_with_quota(self.file(name), self.path, self.quota_bytes)
+
+    def save(self, name: str, data: Union[bytes, bytearray, memoryview, BinaryIO]) -> Path:
+        """Write bytes or a binary stream to a file in the workspace and return its path."""
+        target = self.file(name)
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self.reserve(memoryview(data).nbytes)
+            target.write_bytes(data)
+            return target
+
+        with self.open(name) as f:
+            shutil.copyfileobj(data, f, QUOTA_CHECK_BYTES)
+        return target
+
+
+def sweep_stale(root: Union[str, Path, None] = None, older_than_seconds: float = 24 * 3600) -> int:
+    """
+    Remove job directories left behind by crashed processes.
+
+    Returns:
+        Number of directories removed
+    """
+    root = Path(root) if root is not None else DEFAULT_ROOT
+    if not root.exists():
+        return 0
+    cutoff = time.time() - older_than_seconds
+    removed = 0
+    for entry in root.iterdir():
+        if entry.is_dir() and entry.name.startswith(_PREFIX):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry, ignore_errors=True)
+                    removed += 1
+            except OSError:
+                continue
+    return removed
@@ -1,5 +1,13 @@
 # llmproxy/__init__.py
 
-from .main import LLMProxy
+from .main import DeadlineExceeded, HedgePolicy, LLMProxy, StreamError, deadline
+from .circuit_breaker import BreakerPolicy, CircuitOpenError
+from .rate_limit import RateLimit
+from .conversation import ConversationManager
+from .rag_context import FormattedContext, format_rag_context
 
-__all__ = ["LLMProxy"]
+__all__ = [
+    "LLMProxy", "StreamError", "DeadlineExceeded", "HedgePolicy", "deadline",
+    "BreakerPolicy", "CircuitOpenError", "RateLimit", "ConversationManager",
+    "FormattedContext", "format_rag_context",
+]
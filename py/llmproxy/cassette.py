@@ -0,0 +1,457 @@
+"""
+Record and replay LLMProxy traffic.
+
+In record mode every HTTP exchange is appended to a cassette: one JSON line
+per request with its type, a fingerprint of the body, the response status,
+headers and body, and timing (seconds until the response headers arrived,
+and the offset of every body chunk after that, so streamed responses keep
+their pacing). Connection errors and timeouts are recorded too. Cassettes
+ending in .gz are gzip-compressed as they are written.
+
+In replay mode no network is used: each request is answered from the
+cassette, at the recorded speed or `speed` times faster (0 = no waiting).
+Requests are matched by fingerprint (request type + body, with multipart
+boundaries removed), the n-th identical request getting the n-th recorded
+answer. Unless `strict`, a request with no identical recording gets the
+next unused recording of the same request type, so a cassette stays usable
+after prompts change.
+
+Secrets never reach the cassette: x-api-key, Authorization and cookie
+headers are replaced by "[scrubbed]".
+
+Usage:
+
+    LLMProxy(record="grading.jsonl.gz")            # or LLMPROXY_RECORD=...
+    LLMProxy(replay="grading.jsonl.gz", replay_speed=10)
+    python -m llmproxy.cassette grading.jsonl.gz   # latency summary
+"""
+from __future__ import annotations
+
+import base64
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+import weakref
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+FORMAT_VERSION = 1
+SECRET_HEADERS = frozenset(("x-api-key", "authorization", "proxy-authorization", "cookie", "set-cookie"))
+SCRUBBED = "[scrubbed]"
+
+# Request headers worth keeping; the rest (User-Agent, Accept, ...) are noise
+_RECORDED_REQUEST_HEADERS = ("request_type", "content-type", "content-encoding", "x-api-key")
+# Response headers that describe the body as sent, not as recorded (decoded)
+_DROPPED_RESPONSE_HEADERS = frozenset(("content-encoding", "content-length", "transfer-encoding"))
+_BOUNDARY_RE = re.compile(r"boundary=\"?([^\";\s]+)")
+
+# Exceptions that are recorded and raised again on replay
+_ERRORS = {
+    cls.__name__: cls
+    for cls in (
+        requests.exceptions.ConnectTimeout,
+        requests.exceptions.ReadTimeout,
+        requests.exceptions.Timeout,
+        requests.exceptions.SSLError,
+        requests.exceptions.ConnectionError,
+    )
+}
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """Replay found no recorded response for a request."""
+
+
+def scrub_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    return {k: SCRUBBED if k.lower() in SECRET_HEADERS else v for k, v in headers.items()}
+
+
+def _body_bytes(request: requests.PreparedRequest) -> bytes:
+    body = request.body
+    if body is None:
+        return b""
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return bytes(body)
+    # Seekable stream (LLMProxy's multipart upload body): read it and rewind
+    position = body.tell()
+    data = body.read()
+    body.seek(position)
+    return data
+
+
+def request_fingerprint(request: requests.PreparedRequest) -> Tuple[str, str, int]:
+    """(request type, SHA-256 of the body without multipart boundaries, body size)."""
+    request_type = request.headers.get("request_type", "")
+    body = _body_bytes(request)
+    match = _BOUNDARY_RE.search(request.headers.get("Content-Type", ""))
+    if match:
+        body = body.replace(match.group(1).encode("ascii"), b"")
+    digest = hashlib.sha256(request_type.encode("utf-8") + b"\0" + body).hexdigest()
+    return request_type, digest, len(body)
+
+
+def _encode_chunks(chunks: List[Tuple[float, bytes]]) -> Dict[str, Any]:
+    try:
+        return {"chunks": [[round(t, 4), c.decode("utf-8")] for t, c in chunks]}
+    except UnicodeDecodeError:
+        return {"chunks_b64": [[round(t, 4), base64.b64encode(c).decode("ascii")] for t, c in chunks]}
+
+
+def _decode_chunks(response: Dict[str, Any]) -> List[Tuple[float, bytes]]:
+    if "chunks_b64" in response:
+        return [(t, base64.b64decode(c)) for t, c in response["chunks_b64"]]
+    return [(t, c.encode("utf-8")) for t, c in response.get("chunks", [])]
+
+
+def _read_timeout(timeout: Any) -> Optional[float]:
+    if isinstance(timeout, tuple):
+        return timeout[1]
+    if isinstance(timeout, (int, float)):
+        return float(timeout)
+    return getattr(timeout, "read_timeout", None)
+
+
+# -----------------------
+# Cassette file
+# -----------------------
+
+def read_entries(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """Entries of a cassette, in order. A cut-off last line (e.g. after a crash) is skipped."""
+    path = Path(path)
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+        except EOFError:  # gzip stream without its trailer
+            return
+
+
+class Cassette:
+    """
+    An append-only recording (mode "record") or a recording being replayed
+    (mode "replay").
+    """
+
+    def __init__(self, path: Union[str, Path], mode: str, speed: float = 1.0, strict: bool = False) -> None:
+        if mode not in ("record", "replay"):
+            raise ValueError("mode must be 'record' or 'replay'")
+        self.path = Path(path)
+        self.mode = mode
+        self.speed = speed
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._seq = 0
+        self._file = None
+        self._stats = {"recorded": 0, "exact": 0, "approximate": 0, "misses": 0}
+        if mode == "replay":
+            self._entries = list(read_entries(self.path))
+            self._by_key: Dict[str, Deque[int]] = defaultdict(deque)
+            self._by_type: Dict[str, Deque[int]] = defaultdict(deque)
+            self._last_by_key: Dict[str, int] = {}
+            self._used = set()
+            for i, entry in enumerate(self._entries):
+                request = entry["request"]
+                self._by_key[request["sha256"]].append(i)
+                self._by_type[request["type"]].append(i)
+
+    # -------- Recording --------
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                if self.path.suffix == ".gz":
+                    self._file = gzip.open(self.path, "at", encoding="utf-8")
+                else:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                weakref.finalize(self, self._file.close)
+            self._file.write(line)
+            self._file.flush()
+            self._stats["recorded"] += 1
+
+    def new_entry(self, request: requests.PreparedRequest) -> Dict[str, Any]:
+        request_type, digest, size = request_fingerprint(request)
+        headers = {k: v for k, v in request.headers.items() if k.lower() in _RECORDED_REQUEST_HEADERS}
+        with self._lock:
+            seq = self._seq
+            self._seq += 1
+        return {
+            "v": FORMAT_VERSION,
+            "seq": seq,
+            "at": round(time.monotonic() - self._started, 4),
+            "request": {"type": request_type, "sha256": digest, "bytes": size, "headers": scrub_headers(headers)},
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # -------- Replaying --------
+
+    def _take(self, queue: Deque[int]) -> Optional[int]:
+        while queue and queue[0] in self._used:
+            queue.popleft()
+        if not queue:
+            return None
+        index = queue.popleft()
+        self._used.add(index)
+        return index
+
+    def match(self, request: requests.PreparedRequest) -> Dict[str, Any]:
+        """The recorded entry answering a request; raises CassetteMiss if there is none."""
+        request_type, digest, _ = request_fingerprint(request)
+        with self._lock:
+            index = self._take(self._by_key.get(digest, deque()))
+            if index is None:
+                # Asked more often than recorded: answer as last time
+                index = self._last_by_key.get(digest)
+            if index is not None:
+                self._last_by_key[digest] = index
+                self._stats["exact"] += 1
+                return self._entries[index]
+            if not self.strict:
+                index = self._take(self._by_type.get(request_type, deque()))
+                if index is not None:
+                    self._stats["approximate"] += 1
+                    return self._entries[index]
+            self._stats["misses"] += 1
+        raise CassetteMiss(f"No recorded '{request_type}' response in {self.path} matches this request")
+
+    def sleep_until(self, start: float, offset: float) -> None:
+        """Wait until `offset` recorded seconds after `start`, scaled by speed."""
+        if self.speed <= 0:
+            return
+        delay = start + offset / self.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, int]:
+        """Entries recorded, or requests replayed exactly / approximately / missed."""
+        with self._lock:
+            return dict(self._stats)
+
+
+# -----------------------
+# Transport adapters
+# -----------------------
+
+class _RecordingBody:
+    """Wraps a response's raw stream and records each decoded chunk with its time."""
+
+    def __init__(self, raw: Any, started: float, finish) -> None:
+        self._raw = raw
+        self._started = started
+        self._finish = finish
+        self._chunks: List[Tuple[float, bytes]] = []
+        self._done = False
+
+    def _add(self, chunk: bytes) -> None:
+        if chunk:
+            self._chunks.append((time.monotonic() - self._started, bytes(chunk)))
+
+    def _complete(self, truncated: bool) -> None:
+        if not self._done:
+            self._done = True
+            self._finish(self._chunks, truncated)
+
+    def stream(self, amt: Optional[int] = 2 ** 16, decode_content: Optional[bool] = None) -> Iterator[bytes]:
+        finished = False
+        try:
+            for chunk in self._raw.stream(amt, decode_content=True):
+                self._add(chunk)
+                yield chunk
+            finished = True
+        finally:
+            self._complete(truncated=not finished)
+
+    def read(self, amt: Optional[int] = None, decode_content: Optional[bool] = None, **kwargs: Any) -> bytes:
+        data = self._raw.read(amt, decode_content=True, **kwargs)
+        self._add(data)
+        if amt is None or not data:
+            self._complete(truncated=False)
+        return data
+
+    def close(self) -> None:
+        self._complete(truncated=True)
+        self._raw.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """HTTPAdapter that appends every exchange to a cassette."""
+
+    def __init__(self, cassette: Cassette, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, **kwargs: Any) -> requests.Response:
+        entry = self.cassette.new_entry(request)
+        started = time.monotonic()
+        try:
+            resp = super().send(request, stream=stream, **kwargs)
+        except requests.exceptions.RequestException as e:
+            entry["error"] = {"class": type(e).__name__, "message": str(e), "elapsed": round(time.monotonic() - started, 4)}
+            self.cassette.append(entry)
+            raise
+        headers_at = time.monotonic()
+        entry["response"] = {
+            "status": resp.status_code,
+            "reason": resp.reason,
+            "headers": scrub_headers({
+                k: v for k, v in resp.headers.items() if k.lower() not in _DROPPED_RESPONSE_HEADERS
+            }),
+            "elapsed": round(headers_at - started, 4),
+        }
+
+        def finish(chunks: List[Tuple[float, bytes]], truncated: bool) -> None:
+            entry["response"].update(_encode_chunks(chunks))
+            if truncated:
+                entry["response"]["truncated"] = True
+            self.cassette.append(entry)
+
+        resp.raw = _RecordingBody(resp.raw, headers_at, finish)
+        return resp
+
+
+class _ReplayBody:
+    """Raw stream of a replayed response: the recorded chunks, at the recorded pace."""
+
+    _original_response = None  # keeps requests' cookie extraction away
+
+    def __init__(self, chunks: List[Tuple[float, bytes]], cassette: Cassette, started: float) -> None:
+        self._chunks = deque(chunks)
+        self._cassette = cassette
+        self._started = started
+
+    def stream(self, amt: Optional[int] = 2 ** 16, decode_content: Optional[bool] = None) -> Iterator[bytes]:
+        while self._chunks:
+            offset, chunk = self._chunks.popleft()
+            self._cassette.sleep_until(self._started, offset)
+            yield chunk
+
+    def read(self, amt: Optional[int] = None, decode_content: Optional[bool] = None, **kwargs: Any) -> bytes:
+        if amt is None:
+            return b"".join(self.stream())
+        return next(self.stream(), b"")
+
+    def close(self) -> None:
+        self._chunks.clear()
+
+    def release_conn(self) -> None:
+        pass
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter that answers every request from a cassette, offline."""
+
+    def __init__(self, cassette: Cassette) -> None:
+        super().__init__()
+        self.cassette = cassette
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Any = None,
+        verify: Any = True,
+        cert: Any = None,
+        proxies: Any = None,
+    ) -> requests.Response:
+        entry = self.cassette.match(request)
+        started = time.monotonic()
+        read_timeout = _read_timeout(timeout)
+
+        error = entry.get("error")
+        if error is not None:
+            self.cassette.sleep_until(started, error.get("elapsed", 0.0))
+            raise _ERRORS.get(error["class"], requests.exceptions.ConnectionError)(
+                f"[replayed] {error['message']}", request=request
+            )
+
+        recorded = entry["response"]
+        elapsed = recorded.get("elapsed", 0.0)
+        speed = self.cassette.speed
+        if read_timeout is not None and speed > 0 and elapsed / speed > read_timeout:
+            # The caller would have given up before this answer arrived
+            time.sleep(read_timeout)
+            raise requests.exceptions.ReadTimeout(
+                f"[replayed] Read timed out. (read timeout={read_timeout})", request=request
+            )
+        self.cassette.sleep_until(started, elapsed)
+
+        resp = requests.Response()
+        resp.status_code = recorded["status"]
+        resp.reason = recorded.get("reason")
+        resp.headers = CaseInsensitiveDict(recorded.get("headers", {}))
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.raw = _ReplayBody(_decode_chunks(recorded), self.cassette, time.monotonic())
+        resp.url = request.url
+        resp.request = request
+        resp.connection = self
+        return resp
+
+    def close(self) -> None:
+        pass
+
+
+# -----------------------
+# Summary
+# -----------------------
+
+def summarize(path: Union[str, Path]) -> Dict[str, Dict[str, Any]]:
+    """Per request type: count, errors, and p50/p95/max seconds to the last byte."""
+    durations: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    for entry in read_entries(path):
+        request_type = entry["request"]["type"]
+        if "error" in entry:
+            errors[request_type] += 1
+            durations[request_type].append(entry["error"].get("elapsed", 0.0))
+            continue
+        response = entry["response"]
+        chunks = response.get("chunks") or response.get("chunks_b64") or []
+        durations[request_type].append(response.get("elapsed", 0.0) + (chunks[-1][0] if chunks else 0.0))
+    summary = {}
+    for request_type, values in durations.items():
+        values.sort()
+        summary[request_type] = {
+            "count": len(values),
+            "errors": errors[request_type],
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(0.95 * len(values)))],
+            "max": values[-1],
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize an LLMProxy cassette")
+    parser.add_argument("cassette", type=str)
+    args = parser.parse_args()
+    print(f"{'request_type':<16}{'count':>7}{'errors':>8}{'p50 s':>9}{'p95 s':>9}{'max s':>9}")
+    for request_type, row in sorted(summarize(args.cassette).items()):
+        print(f"{request_type:<16}{row['count']:>7}{row['errors']:>8}"
+              f"{row['p50']:>9.3f}{row['p95']:>9.3f}{row['max']:>9.3f}")
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional
+
+import requests
+
+
+# -----------------------
+# Policy & errors
+# -----------------------
+
+@dataclass(frozen=True)
+class BreakerPolicy:
+    """
+    When a request type's circuit opens and how it recovers.
+
+    The circuit opens after `failure_threshold` consecutive failed calls
+    (network errors, timeouts, 429/5xx after retries) or `slow_call_threshold`
+    consecutive slow ones. A call is slow when it takes longer than
+    `slow_call_seconds`, or `latency_spike_factor` times the median of
+    recent calls (once `min_samples` are known). After `reset_timeout`
+    seconds one probe call is let through ("half-open"): success closes the
+    circuit, failure opens it again.
+    """
+    failure_threshold: int = 5
+    slow_call_threshold: int = 5
+    slow_call_seconds: Optional[float] = None
+    latency_spike_factor: float = 5.0
+    min_samples: int = 20
+    window: int = 100  # recent latencies the median is taken over
+    reset_timeout: float = 30.0
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without contacting the server while a request type's circuit is open."""
+
+    def __init__(self, request_type: str, retry_in: float, reason: Optional[str] = None) -> None:
+        message = f"Circuit open for '{request_type}' requests; next attempt in {retry_in:.1f}s"
+        if reason:
+            message += f" (opened after {reason})"
+        super().__init__(message)
+        self.request_type = request_type
+        self.retry_in = retry_in
+
+
+# -----------------------
+# Breaker
+# -----------------------
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Thread-safe closed / open / half-open state for one request type."""
+
+    def __init__(self, request_type: str, policy: BreakerPolicy) -> None:
+        self.request_type = request_type
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._slow = 0
+        self._latencies: Deque[float] = deque(maxlen=policy.window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._reason: Optional[str] = None
+        self._trips = 0
+
+    def _refresh(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.policy.reset_timeout:
+            self._state = HALF_OPEN
+
+    def _retry_in(self) -> float:
+        return max(0.0, self._opened_at + self.policy.reset_timeout - time.monotonic())
+
+    def _trip(self, reason: str) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self._reason = reason
+        self._trips += 1
+
+    def _is_slow(self, seconds: float) -> bool:
+        if self.policy.slow_call_seconds is not None and seconds > self.policy.slow_call_seconds:
+            return True
+        if len(self._latencies) < self.policy.min_samples:
+            return False
+        return seconds > self.policy.latency_spike_factor * statistics.median(self._latencies)
+
+    # -------- Call protocol: acquire(), then exactly one of the record/release calls --------
+
+    def acquire(self) -> None:
+        """Admit a call, or raise CircuitOpenError. In half-open state only one probe is admitted."""
+        with self._lock:
+            self._refresh()
+            if self._state == OPEN:
+                raise CircuitOpenError(self.request_type, self._retry_in(), self._reason)
+            if self._state == HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpenError(self.request_type, 0.0, self._reason)
+                self._probing = True
+
+    def record_success(self, seconds: float) -> None:
+        with self._lock:
+            slow = self._is_slow(seconds)
+            self._failures = 0
+            if self._state == HALF_OPEN:
+                # The server answers again; if it is now slower across the
+                # board, learn the new latency instead of re-opening forever
+                self._state = CLOSED
+                self._probing = False
+                self._slow = 0
+                if slow:
+                    self._latencies.clear()
+                self._latencies.append(seconds)
+                return
+            if not slow:
+                self._slow = 0
+                self._latencies.append(seconds)
+                return
+            self._slow += 1
+            if self._slow >= self.policy.slow_call_threshold:
+                self._trip(f"{self._slow} slow calls ({seconds:.1f}s)")
+                self._slow = 0
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self._failures += 1
+            self._slow = 0
+            if self._state == HALF_OPEN:
+                self._trip(f"failed probe: {error}")
+            elif self._failures >= self.policy.failure_threshold:
+                self._trip(f"{self._failures} consecutive failures, last: {error}")
+                self._failures = 0
+
+    def release(self) -> None:
+        """End a call that says nothing about the server (e.g. a client-side error)."""
+        with self._lock:
+            self._probing = False
+
+    # -------- State --------
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def retry_in(self) -> float:
+        """Seconds until calls are admitted again (0 unless open)."""
+        with self._lock:
+            self._refresh()
+            return self._retry_in() if self._state == OPEN else 0.0
+
+    def reset(self) -> None:
+        """Close the circuit and forget failures (latency history is kept)."""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = self._slow = 0
+            self._probing = False
+            self._reason = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "consecutive_slow": self._slow,
+                "retry_in": self._retry_in() if self._state == OPEN else 0.0,
+                "reason": self._reason,
+                "trips": self._trips,
+                "median_latency": statistics.median(self._latencies) if self._latencies else None,
+            }
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+from .main import LLMProxy
+
+
+# -----------------------
+# History primitives
+# -----------------------
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) for budget checks."""
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text at a word boundary so estimate_tokens() of it is at most max_tokens."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    cut = text[:4 * max_tokens - 1]
+    head, space, _ = cut.rpartition(" ")
+    return (head if space and head else cut).rstrip() + "…"
+
+
+@dataclass
+class Turn:
+    user: str
+    assistant: str
+
+    def render(self) -> str:
+        return f"User: {self.user}\nAssistant: {self.assistant}"
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.user) + estimate_tokens(self.assistant)
+
+
+@dataclass
+class SessionHistory:
+    """Running summary of older turns plus a ring buffer of recent ones."""
+
+    max_turns: int
+    summary: str = ""
+    turns: Deque[Turn] = field(default_factory=deque)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self) -> None:
+        self.turns = deque(self.turns, maxlen=self.max_turns)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(t.tokens for t in self.turns)
+
+
+_SUMMARY_SYSTEM = (
+    "You maintain the memory of an ongoing conversation. Merge the existing summary "
+    "and the new turns into one concise summary that keeps every fact, decision, "
+    "number and open question needed to continue, most important first, in at most "
+    "{words} words. Reply with the summary only."
+)
+
+
+# -----------------------
+# Conversation manager
+# -----------------------
+
+class ConversationManager:
+    """
+    Client-side multi-turn history on top of LLMProxy.generate().
+
+    Each session keeps its recent turns in a ring buffer. When the history
+    grows past max_context_tokens, the oldest turns are folded into a running
+    summary by the model, so every request carries a bounded context: the
+    summary is cut to max_summary_tokens, and only as many recent turns are
+    kept verbatim as fit in the rest of the budget. Requests are sent with
+    lastk=0; the server-side history is not used.
+    """
+
+    def __init__(
+        self,
+        client: LLMProxy,
+        model: str,
+        system: str,
+        max_context_tokens: int = 2000,
+        keep_recent_turns: int = 4,
+        max_turns: int = 64,
+        temperature: Optional[float] = None,
+        summary_model: Optional[str] = None,
+        max_summary_tokens: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            client: LLMProxy used for replies and summaries
+            model: Model for replies
+            system: System prompt for every turn
+            max_context_tokens: History size (estimated tokens) that triggers compaction
+            keep_recent_turns: Most turns kept verbatim when compacting (fewer
+                               when they do not fit next to the summary)
+            max_turns: Ring-buffer capacity; turns evicted before compaction are lost
+            temperature: Sampling temperature for replies
+            summary_model: Model for summaries (default: same as model)
+            max_summary_tokens: Longest summary (estimated tokens; default:
+                                half of max_context_tokens)
+        """
+        if max_summary_tokens is None:
+            max_summary_tokens = max_context_tokens // 2
+        if not 0 < max_summary_tokens < max_context_tokens:
+            raise ValueError("max_summary_tokens must be positive and below max_context_tokens")
+        self.client = client
+        self.model = model
+        self.system = system
+        self.max_context_tokens = max_context_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.max_turns = max_turns
+        self.temperature = temperature
+        self.summary_model = summary_model or model
+        self.max_summary_tokens = max_summary_tokens
+        self._sessions: Dict[str, SessionHistory] = {}
+        self._lock = threading.Lock()
+
+    def _session(self, session_id: str) -> SessionHistory:
+        with self._lock:
+            if session_id not in self._sessions:
+                self._sessions[session_id] = SessionHistory(max_turns=self.max_turns)
+            return self._sessions[session_id]
+
+    def history(self, session_id: str) -> List[Turn]:
+        """Recent turns kept verbatim for a session."""
+        return list(self._session(session_id).turns)
+
+    def summary(self, session_id: str) -> str:
+        """Summary of compacted turns for a session ("" if none yet)."""
+        return self._session(session_id).summary
+
+    def reset(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def build_query(self, session_id: str, message: str) -> str:
+        """The bounded query sent for message: summary, recent turns, then the new message."""
+        history = self._session(session_id)
+        parts = []
+        if history.summary:
+            parts.append(f"Summary of the conversation so far:\n{history.summary}")
+        if history.turns:
+            parts.append("Recent turns:\n" + "\n\n".join(t.render() for t in history.turns))
+        parts.append(f"User: {message}")
+        return "\n\n".join(parts)
+
+    def send(self, session_id: str, message: str) -> Dict:
+        """
+        Send a message in a session and record the turn.
+
+        Returns:
+            The generate() response (an "error" key on failure; failed turns are not recorded)
+        """
+        history = self._session(session_id)
+        with history.lock:
+            response = self.client.generate(
+                model=self.model,
+                system=self.system,
+                query=self.build_query(session_id, message),
+                temperature=self.temperature,
+                lastk=0,
+                session_id=session_id,
+                rag_usage=False,
+            )
+            if "error" in response:
+                return response
+
+            history.turns.append(Turn(message, str(response.get("result", ""))))
+            if history.tokens > self.max_context_tokens:
+                self._compact(session_id, history)
+            return response
+
+    def _compact(self, session_id: str, history: SessionHistory) -> None:
+        """
+        Fold all but the most recent turns into the running summary. At most
+        keep_recent_turns are kept, and only as many as fit in
+        max_context_tokens next to a summary of max_summary_tokens.
+        """
+        room = self.max_context_tokens - self.max_summary_tokens
+        n_keep = 0
+        for turn in reversed(history.turns):
+            if n_keep >= self.keep_recent_turns or turn.tokens > room:
+                break
+            room -= turn.tokens
+            n_keep += 1
+        n_old = len(history.turns) - n_keep
+        if n_old <= 0:
+            return
+        old = [history.turns.popleft() for _ in range(n_old)]
+
+        query_parts = []
+        if history.summary:
+            query_parts.append(f"Existing summary:\n{history.summary}")
+        query_parts.append("New turns:\n" + "\n\n".join(t.render() for t in old))
+
+        response = self.client.generate(
+            model=self.summary_model,
+            # ~0.75 words per token
+            system=_SUMMARY_SYSTEM.format(words=max(1, self.max_summary_tokens * 3 // 4)),
+            query="\n\n".join(query_parts),
+            temperature=0.0,
+            lastk=0,
+            session_id=f"{session_id}-summary",
+            rag_usage=False,
+        )
+        if "error" in response:
+            # Keep the turns rather than lose them; retry on the next turn
+            history.turns.extendleft(reversed(old))
+            return
+        history.summary = truncate_to_tokens(str(response.get("result", "")).strip(), self.max_summary_tokens)
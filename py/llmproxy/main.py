@@ -1,81 +1,575 @@
 from __future__ import annotations
 
+import contextvars
+import io
+import itertools
 import json
+import math
 import os
-from dataclasses import dataclass
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Any, Dict, Optional, TypedDict, Union
+from typing import (
+    Any, AsyncIterator, BinaryIO, Callable, Deque, Dict, Iterator, List, Optional, Tuple, TypedDict, Union,
+)
 
 import requests
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from urllib3 import encode_multipart_formdata
+from urllib3.filepost import choose_boundary
 
-
-from dotenv import load_dotenv
+from .circuit_breaker import BreakerPolicy, CircuitBreaker, CircuitOpenError
+from .rate_limit import RateLimit, make_bucket
 
 
 # -----------------------
 # Config & HTTP utilities
 # -----------------------
 
+# Stand-in endpoint when replaying a cassette without LLMPROXY_ENDPOINT set
+REPLAY_ENDPOINT = "http://llmproxy-replay.invalid"
+
+# Configs already built by ClientConfig.from_env(), keyed by .env path
+_CONFIG_CACHE: Dict[Path, "ClientConfig"] = {}
+_CONFIG_LOCK = threading.Lock()
+
+
+@dataclass(frozen=True)
+class HedgePolicy:
+    """
+    When to send a duplicate ("hedge") of a slow request.
+
+    A request that has not answered after the `quantile` latency of recent
+    requests of its type gets one duplicate, and whichever answers first is
+    used. Hedges are capped at `max_fraction` of requests.
+    """
+    quantile: float = 0.95
+    max_fraction: float = 0.05
+    min_samples: int = 20  # latencies needed per request type before hedging
+    window: int = 200  # recent latencies kept per request type
+    request_types: Tuple[str, ...] = ("call", "retrieve", "retrieve_batch", "model_info")
+
+
 @dataclass(frozen=True)
 class ClientConfig:
     endpoint: str
     api_key: str
-    timeout: float = 118.0  # seconds, applied to both connect & read
-
+    timeout: float = 118.0  # seconds, read timeout (longest wait for data from the server)
+    compression: Optional[str] = None  # request-body Content-Encoding: "gzip", "zstd" or None
+    compression_min_bytes: int = 8 * 1024  # smaller bodies are sent as-is
+    connect_timeout: float = 10.0  # seconds to establish a connection
+    deadline: Optional[float] = None  # seconds one call may take, retries included (None: unbounded)
+    hedge: Optional[HedgePolicy] = None  # duplicate slow requests (None: off)
+    breaker: Optional[BreakerPolicy] = BreakerPolicy()  # per-request-type circuit breaker (None: off)
+    record: Optional[str] = None  # cassette path to append all traffic to
+    replay: Optional[str] = None  # cassette path to answer all requests from, offline
+    replay_speed: float = 1.0  # replay pace: 1 = as recorded, 10 = ten times faster, 0 = no waiting
+    rate_limit: Optional[RateLimit] = None  # cap on requests per second (None: unlimited)
 
     @staticmethod
-    def from_env() -> "ClientConfig":
+    def from_env(refresh: bool = False) -> "ClientConfig":
+        """
+        Build the config from the environment and the .env file in the cwd.
 
+        The result is memoized per .env path, so creating many clients only
+        reads the file once. Pass refresh=True to re-read it.
+        """
         # Explicitly load .env from current working directory
         cwd_env = Path.cwd() / ".env."
-        load_dotenv(dotenv_path=cwd_env, override=True)
-
-        endpoint = os.getenv("LLMPROXY_ENDPOINT")
-        api_key  = os.getenv("LLMPROXY_API_KEY")
-
-        if not endpoint or not api_key:
-            raise ValueError(
-                "LLMProxy configuration error:\n"
-                "Missing LLMPROXY_ENDPOINT or LLMPROXY_API_KEY.\n\n"
-                "Make sure your .env file is in the SAME DIRECTORY where you run python.\n"
-                "\nExample .env:\n"
-                "    LLMPROXY_ENDPOINT=https://your-endpoint\n"
-                "    LLMPROXY_API_KEY=your-api-key\n"
-            )
 
-        return ClientConfig(endpoint=endpoint, api_key=api_key)
+        with _CONFIG_LOCK:
+            if not refresh and cwd_env in _CONFIG_CACHE:
+                return _CONFIG_CACHE[cwd_env]
+
+            from dotenv import load_dotenv
+            load_dotenv(dotenv_path=cwd_env, override=True)
 
+            endpoint = os.getenv("LLMPROXY_ENDPOINT")
+            api_key  = os.getenv("LLMPROXY_API_KEY")
+            replay = os.getenv("LLMPROXY_REPLAY") or None
+            if replay is not None:
+                # Replays never reach the network
+                endpoint = endpoint or REPLAY_ENDPOINT
+                api_key = api_key or ""
 
+            if not endpoint or (not api_key and replay is None):
+                raise ValueError(
+                    "LLMProxy configuration error:\n"
+                    "Missing LLMPROXY_ENDPOINT or LLMPROXY_API_KEY.\n\n"
+                    "Make sure your .env file is in the SAME DIRECTORY where you run python.\n"
+                    "\nExample .env:\n"
+                    "    LLMPROXY_ENDPOINT=https://your-endpoint\n"
+                    "    LLMPROXY_API_KEY=your-api-key\n"
+                )
 
+            compression = (os.getenv("LLMPROXY_COMPRESSION") or "").strip().lower()
+            min_bytes = os.getenv("LLMPROXY_COMPRESSION_MIN_BYTES")
+            connect_timeout = os.getenv("LLMPROXY_CONNECT_TIMEOUT")
+            read_timeout = os.getenv("LLMPROXY_READ_TIMEOUT")
+            deadline = os.getenv("LLMPROXY_DEADLINE")
+            hedge = (os.getenv("LLMPROXY_HEDGE") or "").strip().lower()
+            breaker = (os.getenv("LLMPROXY_BREAKER") or "").strip().lower()
+            replay_speed = os.getenv("LLMPROXY_REPLAY_SPEED")
+            rate_limit = os.getenv("LLMPROXY_RATE_LIMIT")
 
-def _build_session() -> requests.Session:
-    """Session with retries and connection pooling."""
+            config = ClientConfig(
+                endpoint=endpoint,
+                api_key=api_key,
+                compression=None if compression in ("", "none", "off") else compression,
+                compression_min_bytes=int(min_bytes) if min_bytes else ClientConfig.compression_min_bytes,
+                connect_timeout=float(connect_timeout) if connect_timeout else ClientConfig.connect_timeout,
+                timeout=float(read_timeout) if read_timeout else ClientConfig.timeout,
+                deadline=float(deadline) if deadline else None,
+                hedge=HedgePolicy() if hedge in ("1", "true", "on", "yes") else None,
+                breaker=None if breaker in ("0", "false", "off", "no") else BreakerPolicy(),
+                record=os.getenv("LLMPROXY_RECORD") or None,
+                replay=replay,
+                replay_speed=float(replay_speed) if replay_speed else ClientConfig.replay_speed,
+                rate_limit=RateLimit.parse(rate_limit, os.getenv("LLMPROXY_RATE_LIMIT_DB") or None)
+                if rate_limit else None,
+            )
+            _CONFIG_CACHE[cwd_env] = config
+            return config
+
+
+
+
+def _build_session(config: "ClientConfig") -> requests.Session:
+    """
+    Session with connection pooling. Retries are done by LLMProxy._send(),
+    which can stop them at the caller's deadline. With record/replay set in
+    the config, traffic goes through a cassette adapter instead.
+    """
     s = requests.Session()
-    retries = Retry(
-        total=3,
-        connect=3,
-        read=3,
-        backoff_factor=0.5,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods=frozenset(["POST"]),
-        raise_on_status=False,
-    )
-    adapter = HTTPAdapter(max_retries=retries, pool_connections=10, pool_maxsize=10)
+    if config.record and config.replay:
+        raise ValueError("LLMProxy cannot record and replay at the same time")
+    if config.replay:
+        from .cassette import Cassette, ReplayAdapter
+        adapter = ReplayAdapter(Cassette(config.replay, "replay", speed=config.replay_speed))
+    elif config.record:
+        from .cassette import Cassette, RecordingAdapter
+        adapter = RecordingAdapter(
+            Cassette(config.record, "record"), max_retries=0, pool_connections=10, pool_maxsize=10
+        )
+    else:
+        adapter = HTTPAdapter(max_retries=0, pool_connections=10, pool_maxsize=10)
     s.mount("http://", adapter)
     s.mount("https://", adapter)
     return s
 
 
+# Retry policy: connection errors, timeouts and these statuses are retried
+# up to _MAX_RETRIES times with exponential backoff (0s, 1s, 2s)
+_RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+_MAX_RETRIES = 3
+_BACKOFF_FACTOR = 0.5
+_MAX_BACKOFF = 120.0
+
+# Seconds retrieve_many() uses single requests after a batch probe that
+# failed without saying whether the server supports retrieve_batch
+_BATCH_PROBE_COOLDOWN = 60.0
+
+
+def _backoff(attempt: int) -> float:
+    return 0.0 if attempt == 0 else min(_BACKOFF_FACTOR * 2 ** attempt, _MAX_BACKOFF)
+
+
+def _retry_after(resp: requests.Response) -> Optional[float]:
+    """Seconds asked for by a Retry-After header (delay or HTTP date), if any."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+COMPRESSIONS = ("gzip", "zstd")
+
+
+def _compressor(name: str) -> Callable[[bytes], bytes]:
+    """
+    Body compressor for a Content-Encoding. zstd uses the stdlib module on
+    Python 3.14+ and the optional `zstandard` package otherwise.
+    """
+    if name == "gzip":
+        import gzip
+        return lambda data: gzip.compress(data, compresslevel=6, mtime=0)
+    if name == "zstd":
+        try:
+            from compression import zstd  # Python 3.14+
+            return zstd.compress
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd request compression needs the 'zstandard' package") from e
+        # Compressor objects are not thread-safe; build one per body
+        return lambda data: zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Unsupported compression {name!r}; expected one of {COMPRESSIONS}")
+
+
+# Upload sources: a path, an open binary file, or an in-memory buffer
+BytesLike = Union[bytes, bytearray, memoryview]
+FileSource = Union[str, Path, BinaryIO, BytesLike]
+
+
+class _MultipartBody(io.RawIOBase):
+    """
+    Read-only, seekable request body made of consecutive segments (bytes,
+    memoryviews or binary file objects), read lazily without copying them.
+
+    It has a length, so requests sends it with Content-Length instead of
+    chunked encoding, and urllib3 can rewind it when a request is retried.
+    """
+
+    def __init__(self, segments: List[Union[BytesLike, BinaryIO]]) -> None:
+        super().__init__()
+        # (source, offset of the data within the source, length)
+        self._segments: List[tuple] = []
+        for seg in segments:
+            if hasattr(seg, "read"):
+                try:
+                    start = seg.tell()
+                    length = seg.seek(0, io.SEEK_END) - start
+                    seg.seek(start)
+                except (AttributeError, OSError):
+                    # Not seekable (e.g. a pipe): buffer what is left
+                    seg, start, length = memoryview(seg.read()), 0, None
+            else:
+                seg, start, length = memoryview(seg).cast("B"), 0, None
+            self._segments.append((seg, start, len(seg) if length is None else length))
+        self._length = sum(length for _, _, length in self._segments)
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._length}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        out = memoryview(buffer).cast("B")
+        seg_start = 0
+        for source, offset, length in self._segments:
+            if self._pos < seg_start + length:
+                within = self._pos - seg_start
+                n = min(len(out), length - within)
+                if isinstance(source, memoryview):
+                    out[:n] = source[within:within + n]
+                else:
+                    source.seek(offset + within)
+                    if hasattr(source, "readinto"):
+                        n = source.readinto(out[:n]) or 0
+                    else:
+                        data = source.read(n)
+                        n = len(data)
+                        out[:n] = data
+                self._pos += n
+                return n
+            seg_start += length
+        return 0
+
+
+# -----------------------
+# Deadlines
+# -----------------------
+
+# time.monotonic() by which requests made in this context must be done
+_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llmproxy_deadline", default=None)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The deadline passed before the request could complete."""
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Give every request made inside the block one shared time budget.
+
+    Retries, backoff sleeps and per-attempt timeouts are cut to what is left
+    of it. Nested deadlines keep the earlier one, and seconds=None leaves any
+    outer deadline as it is. The deadline is a context variable: it follows
+    the code into asyncio tasks and into threads started with
+    contextvars.copy_context().run (as retrieve_many does).
+
+    Yields the absolute time.monotonic() deadline, or None.
+    """
+    outer = _DEADLINE.get()
+    if seconds is None:
+        yield outer
+        return
+    at = time.monotonic() + seconds
+    if outer is not None:
+        at = min(at, outer)
+    token = _DEADLINE.set(at)
+    try:
+        yield at
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one."""
+    at = _DEADLINE.get()
+    return None if at is None else at - time.monotonic()
+
+
+# -----------------------
+# Hedging
+# -----------------------
+
+class _Hedger:
+    """Per-request-type latency windows and the hedge budget of one client."""
+
+    def __init__(self, policy: HedgePolicy) -> None:
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._requests = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def record(self, request_type: str, seconds: float) -> None:
+        with self._lock:
+            window = self._latencies.get(request_type)
+            if window is None:
+                window = self._latencies[request_type] = deque(maxlen=self.policy.window)
+            window.append(seconds)
+
+    def _delay(self, request_type: str) -> Optional[float]:
+        window = self._latencies.get(request_type)
+        if window is None or len(window) < self.policy.min_samples:
+            return None
+        ordered = sorted(window)
+        return ordered[max(0, math.ceil(self.policy.quantile * len(ordered)) - 1)]
+
+    def begin(self, request_type: str) -> Optional[float]:
+        """Count a hedgeable request; returns the delay before hedging it, or None."""
+        with self._lock:
+            self._requests += 1
+            return self._delay(request_type)
+
+    def acquire(self) -> bool:
+        """Take one hedge from the budget, if it is not used up."""
+        with self._lock:
+            if self._hedged + 1 > self.policy.max_fraction * self._requests:
+                return False
+            self._hedged += 1
+            return True
+
+    def won(self) -> None:
+        with self._lock:
+            self._hedge_wins += 1
+
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llmproxy-hedge")
+            return self._executor
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "hedged": self._hedged,
+                "hedge_wins": self._hedge_wins,
+                "hedge_delay": {t: self._delay(t) for t in self._latencies},
+            }
+
+
+def _close_response(future: Future) -> None:
+    """Done-callback for the losing request of a hedged pair."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+# -----------------------
+# Streaming utilities
+# -----------------------
+
+class StreamError(RuntimeError):
+    """Raised by the streaming generators when the request cannot be completed."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _stream_delta(obj: Any) -> str:
+    """Pull the partial text out of one decoded stream event."""
+    if not isinstance(obj, dict):
+        return "" if obj is None else str(obj)
+    if "error" in obj:
+        raise StreamError(str(obj["error"]), obj.get("status_code"))
+    for key in ("delta", "result", "text"):
+        if obj.get(key):
+            return str(obj[key])
+    return ""
+
+
+def _iter_stream_text(resp: requests.Response) -> Iterator[str]:
+    """
+    Decode a streamed response body into text fragments.
+
+    Understands server-sent events, newline-delimited JSON and plain chunked
+    text. A server without streaming support answers with one JSON document,
+    which is yielded as a single fragment.
+    """
+    content_type = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+
+    if content_type == "text/event-stream":
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                return
+            try:
+                delta = _stream_delta(json.loads(data))
+            except ValueError:
+                delta = data
+            if delta:
+                yield delta
+    elif content_type in ("application/x-ndjson", "application/jsonl"):
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            try:
+                delta = _stream_delta(json.loads(line))
+            except ValueError:
+                delta = line
+            if delta:
+                yield delta
+    elif content_type == "application/json":
+        try:
+            delta = _stream_delta(resp.json())
+        except ValueError:
+            raise StreamError("Invalid JSON in response", resp.status_code)
+        if delta:
+            yield delta
+    else:
+        resp.encoding = resp.encoding or "utf-8"
+        for chunk in resp.iter_content(chunk_size=None, decode_unicode=True):
+            if chunk:
+                yield chunk
+
+
 # -----------------------
 # Core client
 # -----------------------
 
 class LLMProxy:
-    def __init__(self) -> None:
-        self.config = ClientConfig.from_env()
-        self.session = _build_session()
+    def __init__(
+        self,
+        compression: Optional[str] = None,
+        compression_min_bytes: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        hedge: Union[bool, HedgePolicy, None] = None,
+        breaker: Union[bool, BreakerPolicy, None] = None,
+        record: Optional[Union[str, Path]] = None,
+        replay: Optional[Union[str, Path]] = None,
+        replay_speed: Optional[float] = None,
+        rate_limit: Union[float, RateLimit, None] = None,
+    ) -> None:
+        """
+        Args:
+            compression: Compress request bodies with "gzip" or "zstd"
+                         (default: LLMPROXY_COMPRESSION, off if unset)
+            compression_min_bytes: Only compress bodies at least this large
+                                   (default: LLMPROXY_COMPRESSION_MIN_BYTES or 8 KiB)
+            connect_timeout: Seconds to establish a connection
+                             (default: LLMPROXY_CONNECT_TIMEOUT or 10)
+            read_timeout: Longest wait in seconds for data from the server
+                          (default: LLMPROXY_READ_TIMEOUT or 118)
+            deadline: Seconds each call may take in total, retries included
+                      (default: LLMPROXY_DEADLINE, unbounded if unset); an
+                      earlier deadline() around the call still wins
+            hedge: True or a HedgePolicy to duplicate requests slower than
+                   their p95 latency, False to disable
+                   (default: on with LLMPROXY_HEDGE=1)
+            breaker: True or a BreakerPolicy for per-request-type circuit
+                     breakers that fail fast while the proxy is down, False
+                     to disable (default: on unless LLMPROXY_BREAKER=0)
+            record: Append every request and response, with timing, to this
+                    cassette file (default: LLMPROXY_RECORD); see llmproxy.cassette
+            replay: Answer every request from this cassette instead of the
+                    network (default: LLMPROXY_REPLAY)
+            replay_speed: Replay pace; 1 is the recorded speed, 10 ten times
+                          faster, 0 no waiting (default: LLMPROXY_REPLAY_SPEED or 1)
+            rate_limit: Requests per second, or a RateLimit (shared across
+                        processes when it has a path); 0 for no limit
+                        (default: LLMPROXY_RATE_LIMIT and LLMPROXY_RATE_LIMIT_DB)
+        """
+        try:
+            self.config = ClientConfig.from_env()
+        except ValueError:
+            if replay is None:
+                raise
+            # Replaying works offline, without endpoint or API key
+            self.config = ClientConfig(endpoint=REPLAY_ENDPOINT, api_key="")
+        overrides = {
+            "compression": compression,
+            "compression_min_bytes": compression_min_bytes,
+            "connect_timeout": connect_timeout,
+            "timeout": read_timeout,
+            "deadline": deadline,
+            "replay_speed": replay_speed,
+        }
+        overrides = {k: v for k, v in overrides.items() if v is not None}
+        if hedge is not None:
+            overrides["hedge"] = hedge if isinstance(hedge, HedgePolicy) else HedgePolicy() if hedge else None
+        if rate_limit is not None:
+            overrides["rate_limit"] = (
+                rate_limit if isinstance(rate_limit, RateLimit) else RateLimit(rate_limit) if rate_limit else None
+            )
+        if breaker is not None:
+            overrides["breaker"] = breaker if isinstance(breaker, BreakerPolicy) else BreakerPolicy() if breaker else None
+        # An explicit cassette argument also turns off the other mode set in the environment
+        if record is not None:
+            overrides.update(record=str(record), replay=None)
+        elif replay is not None:
+            overrides.update(replay=str(replay), record=None)
+        if overrides:
+            self.config = replace(self.config, **overrides)
+        self._compress = _compressor(self.config.compression) if self.config.compression else None
+        self._hedger = _Hedger(self.config.hedge) if self.config.hedge is not None else None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        self._rate_bucket = make_bucket(self.config.rate_limit) if self.config.rate_limit is not None else None
+        self.session = _build_session(self.config)
+        # None until the first retrieve_many() probes for the batch protocol
+        self._batch_retrieve_supported: Optional[bool] = None
+        # time.monotonic() before which an unanswered probe is not repeated
+        self._batch_probe_after = 0.0
+        # Set to False once the server rejects a compressed body (HTTP 415)
+        self._compression_supported: Optional[bool] = None
 
     def _headers(self, request_type: str, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
         base = {
@@ -86,23 +580,292 @@ class LLMProxy:
             base.update(extra)
         return base
 
-    def _post_json(
+    def _encode_body(self, body: bytes, content_type: str) -> Tuple[bytes, Dict[str, str]]:
+        """Compress a request body when enabled, large enough and accepted by the server."""
+        headers = {"Content-Type": content_type}
+        if (
+            self._compress is not None
+            and self._compression_supported is not False
+            and len(body) >= self.config.compression_min_bytes
+        ):
+            compressed = self._compress(body)
+            if len(compressed) < len(body):
+                headers["Content-Encoding"] = self.config.compression
+                return compressed, headers
+        return body, headers
+
+    # -------- Sending: deadlines, retries, hedging --------
+
+    def _call_deadline(self) -> Optional[float]:
+        """Absolute deadline of a call starting now: the context's or the config's, whichever is first."""
+        at = _DEADLINE.get()
+        if self.config.deadline is not None:
+            own = time.monotonic() + self.config.deadline
+            at = own if at is None else min(at, own)
+        return at
+
+    def _attempt_timeout(self, at: Optional[float]) -> Tuple[float, float]:
+        """(connect, read) timeouts for one attempt, cut to the time left."""
+        connect, read = self.config.connect_timeout, self.config.timeout
+        if at is None:
+            return connect, read
+        left = at - time.monotonic()
+        if left <= 0:
+            raise DeadlineExceeded("Deadline exceeded before the request could be sent")
+        return min(connect, left), min(read, left)
+
+    def _wait_for_rate_limit(self, at: Optional[float]) -> None:
+        """Take a request token from the rate limit, waiting at most until the deadline."""
+        if self._rate_bucket is not None and not self._rate_bucket.acquire(until=at):
+            raise DeadlineExceeded("Deadline exceeded waiting for the rate limit")
+
+    def _breaker(self, request_type: str) -> Optional[CircuitBreaker]:
+        if self.config.breaker is None:
+            return None
+        with self._breakers_lock:
+            breaker = self._breakers.get(request_type)
+            if breaker is None:
+                breaker = self._breakers[request_type] = CircuitBreaker(request_type, self.config.breaker)
+            return breaker
+
+    def _send(self, request_type: str, data: Any, headers: Dict[str, str], **kwargs: Any) -> requests.Response:
+        """
+        POST one request body through the request type's circuit breaker.
+
+        Raises CircuitOpenError without contacting the server while the
+        circuit is open. Otherwise the outcome of the whole call (after
+        retries) is recorded: connection errors, timeouts and a final 429/5xx
+        count as failures, any other answer as a success with its latency.
+        Running out of the caller's deadline() is not held against the server.
+        """
+        at = self._call_deadline()
+        if at is not None and at <= time.monotonic():
+            raise DeadlineExceeded("Deadline exceeded before the request could be sent")
+        self._wait_for_rate_limit(at)
+        breaker = self._breaker(request_type)
+        if breaker is None:
+            return self._send_with_retries(request_type, data, headers, at, kwargs)
+
+        breaker.acquire()
+        start = time.monotonic()
+        try:
+            resp = self._send_with_retries(request_type, data, headers, at, kwargs)
+        except DeadlineExceeded as e:
+            # The caller's budget ran out, which says nothing about the server
+            # unless the server was unreachable
+            cause = e.__cause__
+            if isinstance(cause, requests.exceptions.ConnectionError) and not isinstance(
+                cause, requests.exceptions.Timeout
+            ):
+                breaker.record_failure(type(cause).__name__)
+            else:
+                breaker.release()
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            breaker.record_failure(type(e).__name__)
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        if resp.status_code in _RETRY_STATUSES:
+            breaker.record_failure(f"HTTP {resp.status_code}")
+        else:
+            breaker.record_success(time.monotonic() - start)
+        return resp
+
+    def _send_with_retries(
         self,
         request_type: str,
-        payload: Dict[str, Any],
-    ) -> Dict:
+        data: Any,
+        headers: Dict[str, str],
+        at: Optional[float],
+        kwargs: Dict[str, Any],
+    ) -> requests.Response:
+        """
+        POST one request body with retries, within the call's deadline `at`.
+
+        Connection errors, timeouts and 429/5xx answers are retried (see
+        _RETRY_STATUSES), honoring Retry-After, but no attempt or backoff
+        sleep may run past the deadline: then the last failing response is
+        returned, or DeadlineExceeded raised if there is none.
+        """
+        for attempt in itertools.count():
+            if attempt:
+                self._wait_for_rate_limit(at)
+            timeout = self._attempt_timeout(at)
+            if hasattr(data, "seek"):
+                data.seek(0)
+            try:
+                resp = self._attempt(request_type, data, headers, timeout, kwargs)
+            except DeadlineExceeded:
+                raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                delay = _backoff(attempt)
+                if at is not None and time.monotonic() + delay >= at:
+                    raise DeadlineExceeded(f"Deadline exceeded: {e}") from e
+                if attempt >= _MAX_RETRIES:
+                    raise
+            else:
+                if resp.status_code not in _RETRY_STATUSES or attempt >= _MAX_RETRIES:
+                    return resp
+                delay = _retry_after(resp)
+                if delay is None:
+                    delay = _backoff(attempt)
+                if delay > _MAX_BACKOFF or (at is not None and time.monotonic() + delay >= at):
+                    return resp
+                resp.close()
+            time.sleep(delay)
+
+    def _timed_post(
+        self,
+        request_type: str,
+        data: Any,
+        headers: Dict[str, str],
+        timeout: Tuple[float, float],
+        kwargs: Dict[str, Any],
+    ) -> requests.Response:
+        start = time.monotonic()
+        resp = self.session.post(
+            self.config.endpoint,
+            headers=self._headers(request_type, headers),
+            data=data,
+            timeout=timeout,
+            **kwargs,
+        )
+        if self._hedger is not None and resp.status_code < 500:
+            self._hedger.record(request_type, time.monotonic() - start)
+        return resp
+
+    def _attempt(
+        self,
+        request_type: str,
+        data: Any,
+        headers: Dict[str, str],
+        timeout: Tuple[float, float],
+        kwargs: Dict[str, Any],
+    ) -> requests.Response:
+        """
+        One attempt. With hedging on, a request (with an in-memory body) that
+        outlives its type's hedge delay gets a duplicate; the first of the two
+        to answer is returned and the other is cancelled if it has not been
+        sent yet, or closed when it finishes. No duplicate is sent when the
+        attempt would time out (e.g. at the deadline) before the hedge delay.
+        """
+        hedger = self._hedger
+        if (
+            hedger is None
+            or request_type not in hedger.policy.request_types
+            or not isinstance(data, (bytes, bytearray))
+        ):
+            return self._timed_post(request_type, data, headers, timeout, kwargs)
+        hedge_after = hedger.begin(request_type)
+        if hedge_after is None or hedge_after >= timeout[1]:
+            return self._timed_post(request_type, data, headers, timeout, kwargs)
+
+        pool = hedger.executor()
+        primary = pool.submit(self._timed_post, request_type, data, headers, timeout, kwargs)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done or not hedger.acquire():
+            return primary.result()
+        backup = pool.submit(self._timed_post, request_type, data, headers, timeout, kwargs)
+
+        pending = {primary, backup}
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    first_error = first_error or future.exception()
+                    continue
+                for other in pending:
+                    if not other.cancel():
+                        other.add_done_callback(_close_response)
+                if future is backup:
+                    hedger.won()
+                return future.result()
+        raise first_error
+
+    def hedge_stats(self) -> Dict[str, Any]:
+        """
+        Hedging counters: hedgeable requests, hedges sent, hedges that
+        answered first, and the current hedge delay per request type.
+        Empty when hedging is off.
+        """
+        return self._hedger.stats() if self._hedger is not None else {}
+
+    def circuit_state(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Circuit breaker state per request type seen so far: state ("closed",
+        "open" or "half_open"), consecutive failures and slow calls, seconds
+        until the next attempt, why it last opened, trips and median latency.
+        """
+        with self._breakers_lock:
+            breakers = list(self._breakers.values())
+        return {b.request_type: b.snapshot() for b in breakers}
+
+    def circuit_wait(self, request_types: Optional[List[str]] = None) -> float:
+        """
+        Seconds until every circuit among request_types (default: all) will
+        admit calls again; 0 when none of them is open.
+        """
+        with self._breakers_lock:
+            breakers = [b for t, b in self._breakers.items() if request_types is None or t in request_types]
+        return max((b.retry_in() for b in breakers), default=0.0)
+
+    @property
+    def cassette(self):
+        """The llmproxy.cassette.Cassette being recorded or replayed, or None."""
+        return getattr(self.session.get_adapter(self.config.endpoint), "cassette", None)
+
+    def reset_circuits(self) -> None:
+        """Close all circuits, e.g. after the proxy is known to be back."""
+        with self._breakers_lock:
+            breakers = list(self._breakers.values())
+        for breaker in breakers:
+            breaker.reset()
+
+    # Context manager shared by all clients; see the module-level deadline()
+    deadline = staticmethod(deadline)
+
+    def _post(self, request_type: str, body: bytes, content_type: str, **kwargs: Any) -> requests.Response:
+        """
+        POST a raw body, compressed per the config. A server that answers a
+        compressed body with 415 gets the plain body once, and compression
+        stays off for this client afterwards. Responses are decompressed by
+        requests (gzip/deflate, plus zstd/br when those packages are installed).
+        """
+        data, extra = self._encode_body(body, content_type)
+        resp = self._send(request_type, data, extra, **kwargs)
+        if resp.status_code == 415 and "Content-Encoding" in extra:
+            resp.close()
+            self._compression_supported = False
+            resp = self._send(request_type, body, {"Content-Type": content_type}, **kwargs)
+        elif "Content-Encoding" in extra and 200 <= resp.status_code < 300:
+            self._compression_supported = True
+        return resp
+
+    @staticmethod
+    def _network_error(e: requests.exceptions.RequestException) -> Dict:
+        """Error dict for a request that got no HTTP answer."""
+        if isinstance(e, CircuitOpenError):
+            return {"error": str(e), "status_code": None, "circuit_open": True, "retry_in": e.retry_in}
+        return {"error": f"Network error: {e}", "status_code": None}
+
+    @staticmethod
+    def _json_body(payload: Dict[str, Any]) -> bytes:
         # Remove None values to avoid sending nulls unnecessarily
         clean_payload = {k: v for k, v in payload.items() if v is not None}
+        return json.dumps(clean_payload, allow_nan=False).encode("utf-8")
 
+    def _post_json(
+        self,
+        request_type: str,
+        payload: Dict[str, Any],
+    ) -> Dict:
         try:
-            resp = self.session.post(
-                self.config.endpoint,
-                headers=self._headers(request_type),
-                json=clean_payload,
-                timeout=self.config.timeout,
-            )
+            resp = self._post(request_type, self._json_body(payload), "application/json")
         except requests.exceptions.RequestException as e:
-            return {"error": f"Network error: {e}", "status_code": None}
+            return self._network_error(e)
 
         if 200 <= resp.status_code < 300:
             try:
@@ -139,6 +902,74 @@ class LLMProxy:
         }
         return self._post_json("retrieve", payload)
 
+    def retrieve_many(
+        self,
+        queries: List[Union[str, Dict[str, Any]]],
+        session_id: str,
+        rag_threshold: float,
+        rag_k: int,
+        max_workers: int = 8,
+        batch: Optional[bool] = None,
+    ) -> List[Any]:
+        """
+        Runs several retrievals at once. Returns one result per query, in input order.
+
+        Each query is either a string or a dict with "query" and optional
+        per-query "session_id", "rag_threshold" and "rag_k" overrides. A failed
+        query yields its own {"error": ...} entry without affecting the others.
+
+        batch=None sends one "retrieve_batch" request if the server supports it
+        and falls back to concurrent single requests otherwise; True/False force
+        either path. A probe that fails with a 5xx or network error is not
+        repeated for _BATCH_PROBE_COOLDOWN seconds.
+        """
+        payloads = []
+        for q in queries:
+            item = {"query": q} if isinstance(q, str) else dict(q)
+            payloads.append({
+                "query": item["query"],
+                "session_id": item.get("session_id", session_id),
+                "rag_threshold": item.get("rag_threshold", rag_threshold),
+                "rag_k": item.get("rag_k", rag_k),
+            })
+        if not payloads:
+            return []
+
+        use_batch = batch
+        if use_batch is None:
+            supported = self._batch_retrieve_supported
+            use_batch = supported or (supported is None and time.monotonic() >= self._batch_probe_after)
+        if use_batch:
+            res = self._post_json("retrieve_batch", {"queries": payloads})
+            results = res.get("results") if isinstance(res, dict) else None
+            if isinstance(results, list) and len(results) == len(payloads):
+                self._batch_retrieve_supported = True
+                return results
+            if batch:
+                error = res if isinstance(res, dict) and "error" in res else {
+                    "error": "Malformed retrieve_batch response", "status_code": None
+                }
+                return [dict(error) for _ in payloads]
+            # Servers without the batch protocol reject the request type or
+            # answer with something else; remember that and fall back
+            if not isinstance(res, dict) or res.get("status_code") in (400, 404, 405, 501) or "error" not in res:
+                self._batch_retrieve_supported = False
+            elif self._batch_retrieve_supported is None:
+                # A 5xx or network error says nothing about the protocol;
+                # probe again after a cooldown rather than on every call
+                self._batch_probe_after = time.monotonic() + _BATCH_PROBE_COOLDOWN
+
+        if len(payloads) == 1:
+            return [self._post_json("retrieve", payloads[0])]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(payloads))) as pool:
+            # Each worker runs in a copy of this context, so a deadline() set
+            # by the caller applies to every retrieval
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._post_json, "retrieve", p)
+                for p in payloads
+            ]
+            return [f.result() for f in futures]
+
     def model_info(self) -> Dict:
         """
         Fetches model info.
@@ -180,9 +1011,105 @@ class LLMProxy:
         # rag_context = res.get("rag_context")
         # return {"response": result_text, "rag_context": rag_context, "raw": res}
 
+    def generate_stream(
+        self,
+        model: str,
+        system: str,
+        query: str,
+        temperature: Optional[float] = None,
+        lastk: Optional[int] = None,
+        session_id: Optional[str] = "GenericSession",
+        rag_threshold: Optional[float] = 0.5,
+        rag_usage: Optional[bool] = False,
+        rag_k: Optional[int] = 5,
+    ) -> Iterator[str]:
+        """
+        Streaming variant of generate(). Yields partial response text as it arrives.
+
+        Raises StreamError on network or HTTP errors, or when the deadline
+        passes while the response is still streaming.
+        """
+        payload = {
+            "model": model,
+            "system": system,
+            "query": query,
+            "temperature": temperature,
+            "lastk": lastk,
+            "session_id": session_id,
+            "rag_threshold": rag_threshold,
+            "rag_usage": rag_usage,
+            "rag_k": rag_k,
+            "stream": True,
+        }
+        at = self._call_deadline()
+        try:
+            with self.deadline(None if at is None else at - time.monotonic()):
+                resp = self._post("call", self._json_body(payload), "application/json", stream=True)
+        except CircuitOpenError as e:
+            raise StreamError(str(e)) from e
+        except requests.exceptions.RequestException as e:
+            raise StreamError(f"Network error: {e}") from e
+
+        with resp:
+            if not 200 <= resp.status_code < 300:
+                try:
+                    detail = resp.json().get("error", resp.text)
+                except ValueError:
+                    detail = resp.text
+                raise StreamError(f"HTTP {resp.status_code}: {detail}", resp.status_code)
+            try:
+                for delta in _iter_stream_text(resp):
+                    if at is not None and time.monotonic() > at:
+                        raise StreamError("Deadline exceeded while streaming")
+                    yield delta
+            except requests.exceptions.RequestException as e:
+                raise StreamError(f"Network error: {e}") from e
+
+    async def agenerate_stream(self, *args: Any, **kwargs: Any) -> AsyncIterator[str]:
+        """
+        Async variant of generate_stream(); accepts the same arguments.
+
+        The blocking HTTP stream runs on a worker thread and fragments are handed
+        to the event loop as they arrive.
+        """
+        # Imported here: asyncio costs tens of milliseconds at import time
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[Any]" = asyncio.Queue()
+        done = object()
+        cancelled = threading.Event()
+
+        def pump() -> None:
+            try:
+                for delta in self.generate_stream(*args, **kwargs):
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, delta)
+            except BaseException as e:  # re-raised on the consumer side
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        # The worker runs in a copy of this context so deadline() applies to it
+        worker = threading.Thread(
+            target=contextvars.copy_context().run, args=(pump,), name="llmproxy-stream", daemon=True
+        )
+        worker.start()
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
     def upload_file(
         self,
-        file_path: Union[str, Path],
+        file_path: FileSource,
         session_id: str,
         mime_type: str = None,
         description: Optional[str] = None,
@@ -190,15 +1117,46 @@ class LLMProxy:
     ) -> Dict:
         """
         Generic uploader for any file. Uses streaming upload and returns server JSON or error.
+
+        file_path may also be an open binary file object, read from its
+        current position and left open, or a bytes-like buffer such as a
+        memoryview. Either is streamed as-is, without an intermediate copy.
         """
-        path = Path(file_path)
-        if not path.exists():
-            return {"error": f"File not found: {path}", "status_code": None}
+        if isinstance(file_path, (bytes, bytearray, memoryview)):
+            fileobj = file_path
+            path = Path("upload")
+        elif hasattr(file_path, "read"):
+            fileobj = file_path
+            path = Path(str(getattr(fileobj, "name", None) or "upload"))
+        else:
+            path = Path(file_path)
+            if not path.exists():
+                return {"error": f"File not found: {path}", "status_code": None}
+            fileobj = None
 
         if mime_type is None:
             # Minimal sniffing; caller can override
             mime_type = "application/pdf" if path.suffix.lower() == ".pdf" else "application/octet-stream"
 
+        if fileobj is None:
+            with path.open("rb") as f:
+                return self._upload_fileobj(f, session_id, mime_type, description, strategy)
+        return self._upload_fileobj(fileobj, session_id, mime_type, description, strategy)
+
+    def _upload_fileobj(
+        self,
+        fileobj: Union[BinaryIO, BytesLike],
+        session_id: str,
+        mime_type: str,
+        description: Optional[str],
+        strategy: Optional[str],
+    ) -> Dict:
+        """
+        Posts an open binary file or buffer as the 'file' part of an upload.
+
+        The multipart body is streamed from the source rather than
+        assembled in memory.
+        """
         params = {
             "description": description,
             "session_id": session_id,
@@ -207,21 +1165,27 @@ class LLMProxy:
         # Remove None values
         params = {k: v for k, v in params.items() if v is not None}
 
-        files = {
-            # Include a filename so the server can store it meaningfully
-            "params": (None, json.dumps(params), "application/json"),
-            "file": (None, path.open("rb"), mime_type),
-        }
+        boundary = choose_boundary()
+
+        def part_header(name: str, content_type: str) -> bytes:
+            return (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"\r\n'
+                f"Content-Type: {content_type}\r\n\r\n"
+            ).encode("utf-8")
+
+        body = _MultipartBody([
+            part_header("params", "application/json"),
+            json.dumps(params).encode("utf-8"),
+            b"\r\n" + part_header("file", mime_type),
+            fileobj,
+            f"\r\n--{boundary}--\r\n".encode("ascii"),
+        ])
 
         try:
-            resp = self.session.post(
-                self.config.endpoint,
-                headers=self._headers("add"),
-                files=files,
-                timeout=self.config.timeout,
-            )
+            resp = self._send("add", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
         except requests.exceptions.RequestException as e:
-            return {"error": f"Network error: {e}", "status_code": None}
+            return self._network_error(e)
 
         if 200 <= resp.status_code < 300:
             try:
@@ -254,20 +1218,17 @@ class LLMProxy:
         params = {k: v for k, v in params.items() if v is not None}
 
 
-        files = {
+        fields = {
             "params": (None, json.dumps(params), "application/json"),            
             "text": (None, text, "application/text"),
         }
+        # Encoded here rather than by requests so the body can be compressed
+        body, content_type = encode_multipart_formdata(fields)
 
         try:
-            resp = self.session.post(
-                self.config.endpoint,
-                headers=self._headers("add"),
-                files=files,
-                timeout=self.config.timeout,
-            )
+            resp = self._post("add", body, content_type)
         except requests.exceptions.RequestException as e:
-            return {"error": f"Network error: {e}", "status_code": None}
+            return self._network_error(e)
 
         if 200 <= resp.status_code < 300:
             try:
@@ -0,0 +1,271 @@
+"""
+Local mock of the LLMProxy endpoint for offline development.
+
+Run with:
+
+    python -m llmproxy.mock_server --port 8765
+
+then point the client at it:
+
+    LLMPROXY_ENDPOINT=http://127.0.0.1:8765
+    LLMPROXY_API_KEY=mock
+
+Requests with "stream": true in the payload are answered with a chunked
+newline-delimited JSON body, one {"delta": ...} event per word.
+
+Request bodies sent with Content-Encoding gzip or zstd are decompressed
+(415 for other encodings, or for all of them with --no-compression; 400 if
+the body does not decode). JSON responses above 1 KiB are gzipped when the
+client sends Accept-Encoding: gzip.
+
+--tail-delay/--tail-fraction hold a random share of requests back before
+answering, to reproduce tail latency (e.g. when trying out hedging), and
+--error-fraction answers a random share with 503, to reproduce an outage
+(error_fraction can be changed on a running server's handler class).
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+# -----------------------
+# Canned responses
+# -----------------------
+
+def _decompress(encoding: str, data: bytes) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "zstd":
+        try:
+            from compression import zstd  # Python 3.14+
+            return zstd.decompress(data)
+        except ImportError:
+            import zstandard
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError(f"Unsupported Content-Encoding: {encoding}")
+
+
+_CRITERION_RE = re.compile(r"^(C\d+)(?: \((\d+(?:\.\d+)?) pts\))?:", re.MULTILINE)
+
+
+def _mock_result(payload: Dict[str, Any]) -> str:
+    query = str(payload.get("query", ""))
+    preview = " ".join(query.split()[:12])
+    # Graders that ask for a confidence line (cascade mode) get one
+    confidence = "CONFIDENCE: 0.9\n" if "CONFIDENCE" in str(payload.get("system", "")) else ""
+    # Compiled rubrics ask for one line per criterion; give each 80%
+    criteria = ""
+    if "Score each criterion" in query:
+        criteria = "".join(
+            f"{cid}: {0.8 * float(points or 1):g}/{float(points or 1):g}\n"
+            for cid, points in _CRITERION_RE.findall(query)
+        )
+    return (
+        f"SCORE: 8/10 points\n{confidence}{criteria}"
+        f"FEEDBACK:\nMock response from {payload.get('model', 'unknown')} to: {preview}"
+    )
+
+
+def _mock_rag_context(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "doc_id": "mock-doc-1",
+            "doc_summary": "Mock course material",
+            "chunks": [f"Mock chunk relevant to: {payload.get('query', '')[:40]}"],
+            "score": 0.9,
+        }
+    ]
+
+
+# -----------------------
+# HTTP handler
+# -----------------------
+
+class MockProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "LLMProxyMock/0.1"
+
+    # Set by make_server()
+    chunk_delay: float = 0.02
+    api_key: Optional[str] = None
+    batch_retrieve: bool = True
+    accept_compression: bool = True
+    gzip_min_bytes: int = 1024
+    tail_delay: float = 0.0
+    tail_fraction: float = 0.0
+    error_fraction: float = 0.0
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - stdlib signature
+        pass
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status: int, obj: Any) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        gzipped = len(body) >= self.gzip_min_bytes and "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = gzip.compress(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_stream(self, text: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == len(words) - 1 else word + " "
+            self._write_chunk(json.dumps({"delta": delta}).encode("utf-8") + b"\n")
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+        self._write_chunk(json.dumps({"done": True}).encode("utf-8") + b"\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_POST(self) -> None:  # noqa: N802 - stdlib naming
+        if self.api_key is not None and self.headers.get("x-api-key") != self.api_key:
+            self._read_body()
+            self._send_json(403, {"error": "Forbidden"})
+            return
+
+        request_type = self.headers.get("request_type", "")
+        raw = self._read_body()
+
+        if self.tail_delay and random.random() < self.tail_fraction:
+            time.sleep(self.tail_delay)
+        if self.error_fraction and random.random() < self.error_fraction:
+            self._send_json(503, {"error": "Mock outage"})
+            return
+
+        encoding = self.headers.get("Content-Encoding", "identity").strip().lower()
+        if encoding != "identity":
+            if not self.accept_compression or encoding not in ("gzip", "zstd"):
+                self._send_json(415, {"error": f"Unsupported Content-Encoding: {encoding}"})
+                return
+            try:
+                raw = _decompress(encoding, raw)
+            except Exception as e:  # corrupt body or missing zstd support
+                self._send_json(400, {"error": f"Could not decode {encoding} body: {e}"})
+                return
+
+        if request_type == "add":
+            self._send_json(200, {"message": "Mock upload accepted", "bytes": len(raw)})
+            return
+
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "Invalid JSON body"})
+            return
+
+        if request_type == "call":
+            result = _mock_result(payload)
+            if payload.get("stream"):
+                self._send_stream(result)
+            else:
+                self._send_json(200, {"result": result, "rag_context": None})
+        elif request_type == "retrieve":
+            self._send_json(200, _mock_rag_context(payload))
+        elif request_type == "retrieve_batch" and self.batch_retrieve:
+            queries = payload.get("queries") or []
+            self._send_json(200, {"results": [_mock_rag_context(q) for q in queries]})
+        elif request_type == "model_info":
+            self._send_json(200, {"models": ["4o-mini", "gpt-4", "gpt-3.5-turbo"]})
+        else:
+            self._send_json(400, {"error": f"Unknown request_type: {request_type}"})
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    chunk_delay: float = 0.02,
+    api_key: Optional[str] = None,
+    batch_retrieve: bool = True,
+    accept_compression: bool = True,
+    tail_delay: float = 0.0,
+    tail_fraction: float = 0.0,
+    error_fraction: float = 0.0,
+) -> ThreadingHTTPServer:
+    """Build (but do not start) a mock server. Use port=0 for an ephemeral port."""
+    handler = type(
+        "ConfiguredMockProxyHandler",
+        (MockProxyHandler,),
+        {
+            "chunk_delay": chunk_delay,
+            "api_key": api_key,
+            "batch_retrieve": batch_retrieve,
+            "accept_compression": accept_compression,
+            "tail_delay": tail_delay,
+            "tail_fraction": tail_fraction,
+            "error_fraction": error_fraction,
+        },
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_in_background(**kwargs: Any) -> ThreadingHTTPServer:
+    """
+    Start a mock server on a daemon thread and return it.
+
+    The endpoint URL is http://{host}:{server.server_port}; call
+    server.shutdown() when done.
+    """
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, name="llmproxy-mock", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock LLMProxy endpoint")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--chunk-delay", type=float, default=0.02,
+                        help="Seconds between streamed chunks")
+    parser.add_argument("--api-key", type=str, default=None,
+                        help="Require this x-api-key (default: accept any)")
+    parser.add_argument("--no-batch-retrieve", action="store_true",
+                        help="Reject retrieve_batch requests like an older server")
+    parser.add_argument("--no-compression", action="store_true",
+                        help="Reject compressed request bodies with 415")
+    parser.add_argument("--tail-delay", type=float, default=0.0,
+                        help="Seconds to hold back a slow request")
+    parser.add_argument("--tail-fraction", type=float, default=0.0,
+                        help="Share of requests that are held back by --tail-delay")
+    parser.add_argument("--error-fraction", type=float, default=0.0,
+                        help="Share of requests answered with 503 (1 = outage)")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.chunk_delay, args.api_key,
+                         batch_retrieve=not args.no_batch_retrieve,
+                         accept_compression=not args.no_compression,
+                         tail_delay=args.tail_delay, tail_fraction=args.tail_fraction,
+                         error_fraction=args.error_fraction)
+    print(f"Mock LLMProxy listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
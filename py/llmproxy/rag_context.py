@@ -0,0 +1,239 @@
+"""
+Render `retrieve()` results as prompt context.
+
+    formatted = format_rag_context(client.retrieve(query=q, session_id=s))
+    query = f"{q}\\n{formatted.text}"
+
+Retrieval often returns the same passage more than once: a textbook split
+into parts is indexed as several documents sharing pages, and overlapping
+chunks repeat most of their neighbour. format_rag_context therefore:
+
+    groups     chunks by doc_id, so a document that comes back in several
+               collections is shown once, under one summary
+    dedupes    chunks whose normalized text was already shown (exact), or
+               whose word 3-grams are mostly contained in an earlier chunk
+               (near-duplicate, e.g. a chunk that is a slice of a longer one)
+    budgets    the rendered text to max_chars, keeping chunks in retrieval
+               order and skipping the ones that no longer fit
+    cites      every chunk shown with an ID ("2.1" = document 2, chunk 1)
+
+The text is assembled with one join, so formatting cost grows linearly with
+the context size.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+import zlib
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+DEFAULT_HEADER = "The following context from course materials may be helpful:\n\n"
+DEFAULT_NEAR_DUPLICATE_THRESHOLD = 0.9  # share of a chunk's 3-grams found in an earlier chunk
+SHINGLE_WORDS = 3
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+# -----------------------
+# Results
+# -----------------------
+
+@dataclass(frozen=True)
+class Citation:
+    id: str                 # "document.chunk" as rendered, e.g. "2.1"
+    doc_id: Optional[str]
+    chunk: str
+    score: Optional[float] = None
+    # doc_ids of the collections whose copies of this chunk were dropped as duplicates
+    duplicates_from: Tuple[str, ...] = ()
+
+
+@dataclass
+class FormattedContext:
+    text: str
+    citations: List[Citation] = field(default_factory=list)
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    omitted: int = 0        # chunks left out by max_chars
+
+    def __str__(self) -> str:
+        return self.text
+
+    @property
+    def citation_ids(self) -> List[str]:
+        return [c.id for c in self.citations]
+
+
+# -----------------------
+# Duplicate detection
+# -----------------------
+
+def normalize_chunk(text: str) -> str:
+    """Comparison form of a chunk: Unicode-normalized, lower case, single spaces."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+def _shingles(normalized: str) -> Set[int]:
+    words = normalized.split(" ")
+    if len(words) <= SHINGLE_WORDS:
+        return {zlib.crc32(normalized.encode("utf-8"))}
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+class _ChunkIndex:
+    """Chunks kept so far, looked up by exact text and by shared 3-grams."""
+
+    def __init__(self, threshold: Optional[float]) -> None:
+        self.threshold = threshold
+        self._exact: Dict[str, int] = {}
+        self._postings: Dict[int, List[int]] = defaultdict(list)
+
+    def match(self, normalized: str) -> Tuple[Optional[int], Optional[Set[int]], bool]:
+        """(kept chunk this duplicates or None, the chunk's shingles, exact match)."""
+        kept = self._exact.get(normalized)
+        if kept is not None:
+            return kept, None, True
+        if self.threshold is None:
+            return None, None, False
+        shingles = _shingles(normalized)
+        overlap: Counter = Counter()
+        for shingle in shingles:
+            overlap.update(self._postings.get(shingle, ()))
+        if overlap:
+            kept, shared = overlap.most_common(1)[0]
+            if shared / len(shingles) >= self.threshold:
+                return kept, shingles, False
+        return None, shingles, False
+
+    def add(self, key: int, normalized: str, shingles: Optional[Set[int]]) -> None:
+        self._exact[normalized] = key
+        if self.threshold is not None:
+            for shingle in shingles if shingles is not None else _shingles(normalized):
+                self._postings[shingle].append(key)
+
+
+# -----------------------
+# Formatting
+# -----------------------
+
+@dataclass
+class _Doc:
+    doc_id: Optional[str]
+    summary: str
+    chunks: List[Tuple[str, Optional[float]]] = field(default_factory=list)
+    had_chunks: bool = False
+
+
+def _collections(rag_context: Any) -> Iterable[Dict[str, Any]]:
+    if isinstance(rag_context, dict):
+        rag_context = rag_context.get("rag_context") or []
+    if not isinstance(rag_context, list):
+        return []
+    return [c for c in rag_context if isinstance(c, dict)]
+
+
+def format_rag_context(
+    rag_context: Any,
+    header: str = DEFAULT_HEADER,
+    max_chars: Optional[int] = None,
+    near_duplicate_threshold: Optional[float] = DEFAULT_NEAR_DUPLICATE_THRESHOLD,
+    include_summaries: bool = True,
+) -> FormattedContext:
+    """
+    Format a retrieve() result (a list of {"doc_id", "doc_summary", "chunks"}
+    collections, or a response dict holding one under "rag_context").
+
+    Args:
+        header: Line(s) put before the documents
+        max_chars: Upper bound on len(text); None for no limit
+        near_duplicate_threshold: Drop a chunk when at least this share of
+            its word 3-grams appear in one earlier chunk; None keeps near
+            duplicates (exact ones are always dropped)
+        include_summaries: Show each document's doc_summary line
+
+    Returns:
+        FormattedContext; its text is "" when there is nothing to show
+    """
+    docs: Dict[Any, _Doc] = {}
+    index = _ChunkIndex(near_duplicate_threshold)
+    # kept chunk key -> (doc key, position in doc), and doc_ids merged into it
+    kept_at: List[Tuple[Any, int]] = []
+    merged: Dict[int, List[str]] = defaultdict(list)
+    exact = near = 0
+
+    for position, collection in enumerate(_collections(rag_context)):
+        doc_id = collection.get("doc_id")
+        summary = str(collection.get("doc_summary") or "").strip()
+        key = doc_id if doc_id is not None else ("summary", summary) if summary else ("position", position)
+        doc = docs.get(key)
+        if doc is None:
+            doc = docs[key] = _Doc(doc_id=None if doc_id is None else str(doc_id), summary=summary)
+        elif not doc.summary:
+            doc.summary = summary
+        score = collection.get("score")
+        for chunk in collection.get("chunks") or []:
+            doc.had_chunks = True
+            chunk = str(chunk).strip()
+            if not chunk:
+                continue
+            normalized = normalize_chunk(chunk)
+            duplicate_of, shingles, is_exact = index.match(normalized)
+            if duplicate_of is not None:
+                if is_exact:
+                    exact += 1
+                else:
+                    near += 1
+                if doc.doc_id is not None and doc.doc_id not in merged[duplicate_of]:
+                    merged[duplicate_of].append(doc.doc_id)
+                continue
+            index.add(len(kept_at), normalized, shingles)
+            kept_at.append((key, len(doc.chunks)))
+            doc.chunks.append((chunk, score if isinstance(score, (int, float)) else None))
+
+    result = FormattedContext(text="", exact_duplicates=exact, near_duplicates=near)
+    chunk_keys = {at: i for i, at in enumerate(kept_at)}
+    parts: List[str] = [header]
+    used = len(header)
+    doc_number = 0
+    for key, doc in docs.items():
+        if doc.had_chunks and not doc.chunks:
+            continue  # everything it had is shown under an earlier document
+        summary_line = f"[Document {doc_number + 1}]: {doc.summary}\n" if include_summaries and doc.summary else ""
+        doc_parts: List[str] = []
+        doc_citations: List[Citation] = []
+        doc_used = len(summary_line) + 1  # + the blank line closing the document
+        for position, (chunk, score) in enumerate(doc.chunks):
+            citation_id = f"{doc_number + 1}.{len(doc_parts) + 1}"
+            line = f"  {citation_id}. {chunk}\n"
+            if max_chars is not None and used + doc_used + len(line) > max_chars:
+                result.omitted += 1
+                continue
+            doc_parts.append(line)
+            doc_used += len(line)
+            merged_from = merged.get(chunk_keys[(key, position)], [])
+            doc_citations.append(Citation(
+                id=citation_id,
+                doc_id=doc.doc_id,
+                chunk=chunk,
+                score=score,
+                duplicates_from=tuple(d for d in merged_from if d != doc.doc_id),
+            ))
+        if not doc_parts and (doc.chunks or not summary_line):
+            continue
+        if max_chars is not None and used + doc_used > max_chars:
+            continue  # a summary-only document that does not fit
+        doc_number += 1
+        parts.append(summary_line)
+        parts.extend(doc_parts)
+        parts.append("\n")
+        used += doc_used
+        result.citations.extend(doc_citations)
+
+    if doc_number:
+        result.text = "".join(parts)
+    return result
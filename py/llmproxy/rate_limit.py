@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+# -----------------------
+# Policy
+# -----------------------
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    Token-bucket limit on requests sent to the proxy.
+
+    `requests_per_second` tokens are added per second, up to `burst`
+    (default: one second's worth); every request (and every retry) takes
+    one. With `path` set, the bucket lives in that SQLite file and is shared
+    by every process, on any host, that uses the same file, so a pool of
+    workers stays within one global budget.
+    """
+    requests_per_second: float
+    burst: Optional[float] = None
+    path: Optional[str] = None
+    name: str = "default"  # separate budgets can share one file
+
+    @property
+    def capacity(self) -> float:
+        return self.burst if self.burst is not None else max(1.0, self.requests_per_second)
+
+    @staticmethod
+    def parse(value: str, path: Optional[str] = None) -> "RateLimit":
+        """Read "10", "10/s" or "600/min" (requests per second or minute)."""
+        amount, _, unit = value.strip().lower().partition("/")
+        per = {"": 1.0, "s": 1.0, "sec": 1.0, "m": 60.0, "min": 60.0}.get(unit.strip())
+        if per is None:
+            raise ValueError(f"Unknown rate limit unit: {value!r}")
+        return RateLimit(float(amount) / per, path=path)
+
+
+# -----------------------
+# Buckets
+# -----------------------
+
+class TokenBucket:
+    """In-process token bucket shared by the threads of one client."""
+
+    def __init__(self, limit: RateLimit) -> None:
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._tokens = limit.capacity
+        self._updated = time.monotonic()
+        self.waited = 0.0  # total seconds callers spent waiting for a token
+
+    def _take(self) -> float:
+        """Take a token if there is one; else the seconds until there will be."""
+        with self._lock:
+            now = time.monotonic()
+            rate = self.limit.requests_per_second
+            self._tokens = min(self.limit.capacity, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / rate
+
+    def acquire(self, until: Optional[float] = None) -> bool:
+        """
+        Wait for a token. Returns False, without taking one, when none is
+        available before `until` (a time.monotonic() deadline).
+        """
+        started = time.monotonic()
+        while True:
+            wait = self._take()
+            if wait == 0:
+                self.waited += time.monotonic() - started
+                return True
+            if until is not None and time.monotonic() + wait > until:
+                self.waited += time.monotonic() - started
+                return False
+            time.sleep(wait)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket kept in a SQLite file, for processes and hosts that share
+    one budget. Each take is one short write transaction; the bucket is
+    refilled from wall-clock time, so hosts need roughly synchronized clocks.
+    """
+
+    def __init__(self, limit: RateLimit) -> None:
+        if limit.path is None:
+            raise ValueError("SharedTokenBucket needs RateLimit.path")
+        super().__init__(limit)
+        self._conn = None
+        self._pid = 0
+
+    def _connect(self):
+        # A connection must not cross a fork
+        if self._conn is None or self._pid != os.getpid():
+            import sqlite3
+            os.makedirs(os.path.dirname(os.path.abspath(self.limit.path)), exist_ok=True)
+            conn = sqlite3.connect(self.limit.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _take(self) -> float:
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            rate = self.limit.requests_per_second
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT tokens, updated FROM rate_buckets WHERE name = ?", (self.limit.name,)
+                ).fetchone()
+                tokens = self.limit.capacity if row is None else min(
+                    self.limit.capacity, row[0] + max(0.0, now - row[1]) * rate
+                )
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / rate
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                    (self.limit.name, tokens, now),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return wait
+
+
+def make_bucket(limit: RateLimit) -> TokenBucket:
+    return SharedTokenBucket(limit) if limit.path else TokenBucket(limit)
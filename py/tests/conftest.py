@@ -0,0 +1,14 @@
+import pytest
+
+from llmproxy import main as llmproxy_main
+
+
+@pytest.fixture
+def proxy_env(monkeypatch, tmp_path):
+    """Environment for building an LLMProxy client without a server."""
+    monkeypatch.setenv("LLMPROXY_ENDPOINT", "http://127.0.0.1:9")
+    monkeypatch.setenv("LLMPROXY_API_KEY", "test")
+    monkeypatch.setenv("GRADINGBOT_RESULTS_DB", str(tmp_path / "results.sqlite"))
+    # Clients read their endpoint from a memoized config; start each test afresh
+    monkeypatch.setattr(llmproxy_main, "_CONFIG_CACHE", {})
+    return tmp_path
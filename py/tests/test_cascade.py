@@ -0,0 +1,67 @@
+from contextlib import nullcontext
+
+from gradingBot.cascade import CascadeConfig
+from gradingBot.gradingBot import GradingBot
+
+
+class StubClient:
+    """Answers retrieval with no context and each model with a canned reply."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.models = []
+
+    def deadline(self, seconds):
+        return nullcontext()
+
+    def retrieve(self, **kwargs):
+        return {"rag_context": []}
+
+    def generate(self, model, **kwargs):
+        self.models.append(model)
+        return self.replies[model]
+
+
+def _bot(replies):
+    cascade = CascadeConfig(models=("small", "large"))
+    return GradingBot("test", client=StubClient(replies), store_results=False, tool_mode="none", cascade=cascade)
+
+
+def test_failed_escalation_keeps_the_earlier_grade():
+    bot = _bot({
+        "small": {"result": "SCORE: 7/10\nCONFIDENCE: 0.2\nFEEDBACK: mostly right"},
+        "large": {"error": "HTTP 503: unavailable", "status_code": 503},
+    })
+
+    result = bot.grade_submission("Q", "answer", max_points=10)
+
+    assert bot.client.models == ["small", "large"]
+    assert result["score"] == 7.0
+    assert result["model"] == "small"
+    assert result["confidence"] == 0.2
+    assert "mostly right" in result["feedback"]
+    assert [a["escalation_reason"] for a in result["cascade"]] == ["low_confidence", "error"]
+    assert result["cascade"][-1]["error"] == "HTTP 503: unavailable"
+
+
+def test_cascade_fails_only_when_every_stage_failed():
+    failure = {"error": "HTTP 503: unavailable", "status_code": 503}
+    bot = _bot({"small": failure, "large": failure})
+
+    result = bot.grade_submission("Q", "answer", max_points=10)
+
+    assert result["error"] == "Grading generation failed: HTTP 503: unavailable"
+    assert result["request_type"] == "call"
+
+
+def test_failed_first_stage_escalates():
+    bot = _bot({
+        "small": {"error": "Network error: refused", "status_code": None},
+        "large": {"result": "SCORE: 4/10\nCONFIDENCE: 0.9\nFEEDBACK: incomplete"},
+    })
+
+    result = bot.grade_submission("Q", "answer", max_points=10)
+
+    assert result["score"] == 4.0
+    assert result["model"] == "large"
+    assert [a["escalation_reason"] for a in result["cascade"]] == ["error", None]
@@ -0,0 +1,83 @@
+import gzip
+import json
+
+import pytest
+import requests
+
+from llmproxy import LLMProxy, mock_server
+from llmproxy.cassette import SCRUBBED, Cassette, CassetteMiss, ReplayAdapter, read_entries
+
+
+def _exchange(client):
+    """The same few requests, made against a live server or a cassette."""
+    return [
+        client.retrieve(query="What is a heap?", session_id="s", rag_threshold=0.3, rag_k=2),
+        client.generate(model="4o-mini", system="Grade it.", query="Q: 2+2\nA: 4", session_id="s"),
+        client.retrieve(query="What is a stack?", session_id="s", rag_threshold=0.3, rag_k=2),
+    ]
+
+
+@pytest.fixture
+def recorded(proxy_env, monkeypatch):
+    """A gzip cassette recorded against the mock proxy, and what the live calls returned."""
+    server = mock_server.serve_in_background(port=0, chunk_delay=0, api_key="test")
+    monkeypatch.setenv("LLMPROXY_ENDPOINT", f"http://127.0.0.1:{server.server_port}")
+    path = proxy_env / "session.jsonl.gz"
+    client = LLMProxy(record=path, breaker=None)
+    try:
+        live = _exchange(client)
+    finally:
+        client.session.get_adapter(client.config.endpoint).cassette.close()
+        server.shutdown()
+        server.server_close()
+    return path, live
+
+
+def test_replay_matches_the_recording_offline(recorded, monkeypatch):
+    path, live = recorded
+    assert all("error" not in result for result in live)
+    # Nothing listens here any more: every answer has to come from the cassette
+    client = LLMProxy(replay=path, replay_speed=0, breaker=None)
+
+    assert _exchange(client) == live
+    assert client.session.get_adapter(client.config.endpoint).cassette.stats()["exact"] == 3
+
+
+def test_api_key_is_scrubbed(recorded):
+    path, _ = recorded
+    entries = list(read_entries(path))
+
+    assert len(entries) == 3
+    assert all(e["request"]["headers"]["x-api-key"] == SCRUBBED for e in entries)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert '"test"' not in f.read()
+
+
+def _replay_session(cassette):
+    session = requests.Session()
+    session.mount("http://", ReplayAdapter(cassette))
+    return session
+
+
+def test_strict_replay_raises_on_unrecorded_request(recorded):
+    path, _ = recorded
+    body = json.dumps({"query": "never asked", "session_id": "s"}).encode("utf-8")
+    headers = {"request_type": "retrieve", "Content-Type": "application/json"}
+
+    with pytest.raises(CassetteMiss):
+        _replay_session(Cassette(path, "replay", speed=0, strict=True)).post("http://replay", data=body, headers=headers)
+    # Without strict, the next unused retrieve recording answers instead
+    resp = _replay_session(Cassette(path, "replay", speed=0)).post("http://replay", data=body, headers=headers)
+    assert resp.status_code == 200
+
+
+def test_truncated_gzip_cassette_still_loads(recorded, tmp_path):
+    path, live = recorded
+    data = path.read_bytes()
+    cut = tmp_path / "cut.jsonl.gz"
+    cut.write_bytes(data[:-20])
+
+    entries = list(read_entries(cut))
+    assert 1 <= len(entries) < 3
+    client = LLMProxy(replay=cut, replay_speed=0, breaker=None)
+    assert client.retrieve(query="What is a heap?", session_id="s", rag_threshold=0.3, rag_k=2) == live[0]
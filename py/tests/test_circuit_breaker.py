@@ -0,0 +1,34 @@
+import pytest
+import requests
+
+from llmproxy import LLMProxy
+from llmproxy.circuit_breaker import BreakerPolicy
+from llmproxy.main import DeadlineExceeded
+
+
+def test_deadline_exceeded_does_not_count_against_the_breaker(proxy_env, monkeypatch):
+    client = LLMProxy(breaker=BreakerPolicy(failure_threshold=1))
+
+    def out_of_time(*args, **kwargs):
+        raise DeadlineExceeded("Deadline exceeded: read timed out") from requests.exceptions.ReadTimeout()
+
+    monkeypatch.setattr(client, "_send_with_retries", out_of_time)
+    for _ in range(3):
+        with pytest.raises(DeadlineExceeded):
+            client._send("call", b"{}", {})
+
+    assert client.circuit_state()["call"]["state"] == "closed"
+    assert client.circuit_state()["call"]["consecutive_failures"] == 0
+
+
+def test_deadline_exceeded_after_connection_error_counts(proxy_env, monkeypatch):
+    client = LLMProxy(breaker=BreakerPolicy(failure_threshold=1))
+
+    def unreachable(*args, **kwargs):
+        raise DeadlineExceeded("Deadline exceeded: refused") from requests.exceptions.ConnectionError()
+
+    monkeypatch.setattr(client, "_send_with_retries", unreachable)
+    with pytest.raises(DeadlineExceeded):
+        client._send("call", b"{}", {})
+
+    assert client.circuit_state()["call"]["state"] == "open"
@@ -0,0 +1,53 @@
+from llmproxy.conversation import ConversationManager, estimate_tokens, truncate_to_tokens
+
+
+class FakeClient:
+    """generate() stand-in: long replies, and summaries longer than asked for."""
+
+    def __init__(self, reply_chars=400, summary_chars=20_000):
+        self.reply_chars = reply_chars
+        self.summary_chars = summary_chars
+        self.summary_calls = 0
+
+    def generate(self, **kwargs):
+        if kwargs["session_id"].endswith("-summary"):
+            self.summary_calls += 1
+            return {"result": "fact " * (self.summary_chars // 5)}
+        return {"result": "r" * self.reply_chars}
+
+
+def test_history_fits_the_budget_after_compaction():
+    chat = ConversationManager(FakeClient(), model="m", system="s", max_context_tokens=500, keep_recent_turns=4)
+    for n in range(20):
+        chat.send("s1", f"message {n} " + "x" * 300)
+        assert chat._session("s1").tokens <= 500
+    assert 0 < len(chat.history("s1")) <= 4
+
+
+def test_summary_is_capped_and_does_not_grow():
+    client = FakeClient()
+    chat = ConversationManager(client, model="m", system="s", max_context_tokens=400, max_summary_tokens=100)
+    sizes = []
+    for n in range(15):
+        chat.send("s1", "question " * 40)
+        sizes.append(estimate_tokens(chat.summary("s1")))
+    assert client.summary_calls > 1
+    assert max(sizes) <= 100
+
+
+def test_oversized_recent_turns_are_folded_into_the_summary():
+    chat = ConversationManager(FakeClient(reply_chars=1600), model="m", system="s",
+                               max_context_tokens=500, keep_recent_turns=4)
+    chat.send("s1", "hi")
+    chat.send("s1", "again")
+    # Each turn alone is over the room left next to the summary
+    assert chat.history("s1") == []
+    assert chat._session("s1").tokens <= 500
+
+
+def test_truncate_to_tokens():
+    text = "word " * 100
+    cut = truncate_to_tokens(text, 10)
+    assert estimate_tokens(cut) <= 10
+    assert cut.endswith("…") and not cut.endswith(" …")
+    assert truncate_to_tokens("short", 10) == "short"
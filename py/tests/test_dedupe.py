@@ -0,0 +1,44 @@
+from gradingBot.dedupe import cluster_answers, jaccard, normalize_answer, numbers, shingles
+
+PLATES = (
+    "Each plate has two letters followed by three digits. By the multiplication principle there are "
+    "26 * 26 * 10 * 10 * 10 = {} possible license plates, since each position is chosen independently "
+    "and repetition is allowed."
+)
+
+
+def _groups(clusters):
+    return sorted(sorted(c.members) for c in clusters)
+
+
+def test_formatting_differences_are_exact_duplicates():
+    clusters = cluster_answers(["x = 5", "X=5.", "  x  =  5  "])
+    assert _groups(clusters) == [[0, 1, 2]]
+    assert all(clusters[0].exact.values())
+
+
+def test_different_final_values_are_not_merged():
+    right, wrong = PLATES.format(676000), PLATES.format(676001)
+    # Close enough in text to pass the default threshold on similarity alone
+    assert jaccard(shingles(normalize_answer(right)), shingles(normalize_answer(wrong))) >= 0.9
+
+    assert _groups(cluster_answers([right, wrong])) == [[0], [1]]
+
+
+def test_near_duplicates_with_the_same_numbers_are_merged():
+    a = PLATES.format(676000)
+    b = a.replace("is chosen", "gets chosen")
+    clusters = cluster_answers([a, b])
+    assert _groups(clusters) == [[0, 1]]
+    assert clusters[0].exact == {0: True, 1: False}
+
+
+def test_numbers_ignore_grouping_and_order():
+    assert numbers("1,000 and 2.5") == numbers("2.5, then 1000")
+    assert numbers("676000") != numbers("676001")
+
+
+def test_threshold_one_merges_only_exact():
+    a = PLATES.format(676000)
+    b = a.replace("every", "each").replace("each position", "every position")
+    assert _groups(cluster_answers([a, b], threshold=1.0)) == [[0], [1]]
@@ -0,0 +1,147 @@
+import pytest
+
+from gradingBot import gradingBot as grading_module
+from gradingBot.gradingBot import GradingBot
+from llmproxy import LLMProxy
+from llmproxy.circuit_breaker import BreakerPolicy
+from llmproxy.main import _MAX_RETRIES
+
+
+@pytest.fixture
+def bot(proxy_env, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(grading_module.time, "sleep", sleeps.append)
+    client = LLMProxy(breaker=BreakerPolicy(failure_threshold=3, reset_timeout=5.0))
+    bot = GradingBot("test", client=client, store_results=False, tool_mode="none")
+    bot.sleeps = sleeps
+    return bot
+
+
+def _error(status_code, request_type="call", **extra):
+    response = {"error": f"HTTP {status_code}: boom", "status_code": status_code, **extra}
+    return {"error": f"Grading generation failed: {response['error']}", "raw_response": response,
+            "request_type": request_type}
+
+
+def _fake_grades(bot, monkeypatch, replies):
+    calls = []
+
+    def grade_submission(**kwargs):
+        calls.append(kwargs)
+        return replies[min(len(calls), len(replies)) - 1]
+
+    monkeypatch.setattr(bot, "grade_submission", grade_submission)
+    return calls
+
+
+def test_permanent_error_is_not_retried_with_unrelated_breaker_failing(bot, monkeypatch):
+    # A failure counted on a request type the grade never uses
+    bot.client._breaker("retrieve_batch").record_failure("HTTP 503")
+    calls = _fake_grades(bot, monkeypatch, [_error(400)])
+
+    result = bot.grade_many("Q", {"s1": "answer"}, dedupe=False)
+
+    assert len(calls) == 1
+    assert result["s1"]["raw_response"]["status_code"] == 400
+    assert bot.sleeps == []
+
+
+def test_transient_errors_back_off_and_are_capped(bot, monkeypatch):
+    calls = _fake_grades(bot, monkeypatch, [_error(503)])
+
+    result = bot.grade_many("Q", {"s1": "answer"}, dedupe=False, max_pause=10_000)
+
+    assert len(calls) == GradingBot._MAX_GRADE_ATTEMPTS
+    assert "error" in result["s1"]
+    assert all(s > 0 for s in bot.sleeps)
+
+
+def test_backoff_is_charged_to_the_pause_budget(bot, monkeypatch):
+    calls = _fake_grades(bot, monkeypatch, [_error(503)])
+
+    bot.grade_many("Q", {"s1": "a", "s2": "b"}, dedupe=False, max_pause=3.0)
+
+    assert sum(bot.sleeps) <= 3.0
+    assert len(calls) <= 4
+
+
+def test_transient_error_then_success(bot, monkeypatch):
+    ok = {"score": 5.0, "feedback": "fine", "rag_context_used": ""}
+    calls = _fake_grades(bot, monkeypatch, [_error(None, "retrieve", error="Network error: refused"), ok])
+
+    result = bot.grade_many("Q", {"s1": "answer"}, dedupe=False)
+
+    assert len(calls) == 2
+    assert result["s1"]["score"] == 5.0
+
+
+def test_open_circuit_of_failed_request_type_is_waited_for(bot, monkeypatch):
+    breaker = bot.client._breaker("retrieve")
+    for _ in range(3):
+        breaker.record_failure("HTTP 503")
+    ok = {"score": 5.0, "feedback": "fine", "rag_context_used": ""}
+    calls = _fake_grades(bot, monkeypatch, [_error(None, "retrieve", circuit_open=True), ok])
+    monkeypatch.setattr(grading_module.time, "sleep", lambda s: (bot.sleeps.append(s), breaker.reset()))
+
+    result = bot.grade_many("Q", {"s1": "answer"}, dedupe=False)
+
+    assert result["s1"]["score"] == 5.0
+    assert len(calls) == 2
+    assert 0 < bot.sleeps[0] <= 5.0
+
+
+@pytest.fixture
+def mock_proxy(monkeypatch, proxy_env):
+    from llmproxy.mock_server import serve_in_background
+
+    servers = []
+
+    def start(**kwargs):
+        server = serve_in_background(port=0, chunk_delay=0, **kwargs)
+        servers.append(server)
+        monkeypatch.setenv("LLMPROXY_ENDPOINT", f"http://127.0.0.1:{server.server_port}")
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def _counting_bot(monkeypatch, **client_kwargs):
+    """A bot whose client records the request type of every HTTP attempt it makes."""
+    client = LLMProxy(**client_kwargs)
+    sent = []
+    attempt = client._attempt
+
+    def counting_attempt(request_type, *args, **kwargs):
+        sent.append(request_type)
+        return attempt(request_type, *args, **kwargs)
+
+    monkeypatch.setattr(client, "_attempt", counting_attempt)
+    bot = GradingBot("test", client=client, store_results=False, tool_mode="none")
+    return bot, sent
+
+
+def test_client_error_through_the_proxy_is_graded_once(mock_proxy, monkeypatch):
+    mock_proxy(api_key="someone-else")  # every request gets 403
+    bot, sent = _counting_bot(monkeypatch, breaker=True)
+    bot.client._breaker("retrieve_batch").record_failure("HTTP 503")
+
+    result = bot.grade_many("Q", {"s1": "answer"}, dedupe=False)
+
+    assert "403" in result["s1"]["error"]
+    assert sent == ["retrieve"]
+
+
+def test_outage_opens_the_circuit_and_the_pause_budget_ends_it(mock_proxy, monkeypatch):
+    mock_proxy(error_fraction=1.0)  # every request gets 503
+    slept = []
+    monkeypatch.setattr(grading_module.time, "sleep", slept.append)  # also the client's backoff sleeps
+    bot, sent = _counting_bot(monkeypatch, breaker=BreakerPolicy(failure_threshold=2, reset_timeout=60.0))
+
+    result = bot.grade_many("Q", {"s1": "a", "s2": "b"}, dedupe=False, max_pause=100.0)
+
+    assert all(r.get("circuit_open") for r in result.values())
+    assert bot.client.circuit_state()["retrieve"]["state"] == "open"
+    # Two failing calls with their retries open the circuit; nothing is sent after that
+    assert sent == ["retrieve"] * 2 * (_MAX_RETRIES + 1)
@@ -0,0 +1,152 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+from llmproxy import LLMProxy, main as llmproxy_main, mock_server
+from llmproxy.main import HedgePolicy, deadline
+
+
+class _Draws:
+    """Stands in for the mock server's random module: the first request is held back."""
+
+    def __init__(self, delayed=1):
+        self.delayed = delayed
+        self.lock = threading.Lock()
+
+    def random(self):
+        with self.lock:
+            self.delayed -= 1
+            return 0.0 if self.delayed >= 0 else 1.0
+
+
+@pytest.fixture
+def server(proxy_env, monkeypatch):
+    server = mock_server.serve_in_background(port=0, chunk_delay=0)
+    monkeypatch.setenv("LLMPROXY_ENDPOINT", f"http://127.0.0.1:{server.server_port}")
+    handler = server.RequestHandlerClass
+    received = []
+    do_post = handler.do_POST
+
+    def counting_post(self):
+        received.append(time.monotonic())
+        do_post(self)
+
+    monkeypatch.setattr(handler, "do_POST", counting_post)
+    server.received = received
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _hold_back(server, monkeypatch, seconds, delayed=1):
+    server.RequestHandlerClass.tail_delay = seconds
+    server.RequestHandlerClass.tail_fraction = 0.5
+    monkeypatch.setattr(mock_server, "random", _Draws(delayed))
+
+
+def _hedging_client(hedge_after, **kwargs):
+    client = LLMProxy(hedge=HedgePolicy(min_samples=1, max_fraction=1.0), breaker=None, **kwargs)
+    client._hedger.record("retrieve", hedge_after)
+    client._hedger._requests = 10  # room in the hedge budget
+    return client
+
+
+def _retrieve(client):
+    return client.retrieve(query="q", session_id="s", rag_threshold=0.3, rag_k=1)
+
+
+def test_hedge_fires_after_the_delay_and_the_first_answer_wins(server, monkeypatch):
+    _hold_back(server, monkeypatch, 1.0)
+    closed = []
+    monkeypatch.setattr(llmproxy_main, "_close_response", lambda future: closed.append(future))
+    client = _hedging_client(0.1)
+
+    started = time.monotonic()
+    result = _retrieve(client)
+
+    assert "error" not in result
+    assert time.monotonic() - started < 0.8
+    assert len(server.received) == 2
+    assert 0.09 <= server.received[1] - server.received[0] < 0.8
+    assert client.hedge_stats()["hedged"] == 1
+    assert client.hedge_stats()["hedge_wins"] == 1
+    # The slow original was already sent, so it is closed once it answers
+    for _ in range(40):
+        if closed:
+            break
+        time.sleep(0.05)
+    assert len(closed) == 1
+
+
+class _QueuedHedges(ThreadPoolExecutor):
+    """Runs the first request; later ones stay queued, as behind a busy pool."""
+
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.started = False
+        self.queued = []
+
+    def submit(self, fn, *args, **kwargs):
+        if not self.started:
+            self.started = True
+            return super().submit(fn, *args, **kwargs)
+        future = Future()
+        self.queued.append(future)
+        return future
+
+
+def test_unsent_loser_is_cancelled(server, monkeypatch):
+    _hold_back(server, monkeypatch, 0.3)
+    client = _hedging_client(0.05)
+    executor = client._hedger._executor = _QueuedHedges()
+
+    result = _retrieve(client)
+
+    assert "error" not in result
+    assert client.hedge_stats()["hedged"] == 1
+    assert client.hedge_stats()["hedge_wins"] == 0
+    assert [f.cancelled() for f in executor.queued] == [True]
+    assert len(server.received) == 1
+
+
+def test_expired_deadline_stops_retries(server, monkeypatch):
+    server.RequestHandlerClass.error_fraction = 1.0
+    client = LLMProxy(breaker=None)
+
+    started = time.monotonic()
+    with deadline(0.5):
+        result = _retrieve(client)
+
+    # One immediate retry; the next backoff (1 s) would end after the deadline
+    assert result["status_code"] == 503
+    assert len(server.received) == 2
+    assert time.monotonic() - started < 0.5
+
+
+def test_deadline_cuts_off_hedged_attempts(server, monkeypatch):
+    _hold_back(server, monkeypatch, 1.0, delayed=2)
+    client = _hedging_client(0.05)
+
+    started = time.monotonic()
+    with deadline(0.3):
+        result = _retrieve(client)
+
+    assert result["status_code"] is None
+    assert "Deadline exceeded" in result["error"]
+    assert time.monotonic() - started < 0.8
+    # One hedge, then neither a retry nor a second hedge
+    assert len(server.received) == 2
+
+
+def test_no_hedge_when_the_deadline_comes_first(server, monkeypatch):
+    _hold_back(server, monkeypatch, 1.0)
+    client = _hedging_client(0.5)
+
+    with deadline(0.2):
+        result = _retrieve(client)
+
+    assert "Deadline exceeded" in result["error"]
+    assert client.hedge_stats()["hedged"] == 0
+    assert len(server.received) == 1
@@ -0,0 +1,63 @@
+import os
+import signal
+import time
+
+import pytest
+
+from gradingBot import math_eval
+from gradingBot.math_eval import EvaluationError, EvaluationTimeout, evaluate, evaluate_unbounded_time
+
+
+@pytest.mark.parametrize("expr, message", [
+    ("9**9**9", "Exponent too large"),
+    ("2**999 * 2**999 * 2**999 * 2**999 * 2**999", "Result too large"),
+    ("(10**300)*(10**300)*(10**300)*(10**300)*(10**300)", "Result too large"),
+    ("(-8)**0.5", "not a real number"),
+    ("factorial(100000)", "factorial argument too large"),
+    ("100000!", "factorial argument too large"),
+    ("C(10**30, 10**15)", "comb arguments too large"),
+    ("binomial(100000, 50000)", "comb arguments too large"),
+    ("perm(100000)", "perm arguments too large"),
+    ("perm(10**18, 10**18)", "perm arguments too large"),
+])
+def test_oversized_expressions_are_rejected_quickly(expr, message):
+    # The static limits reject them before any expensive work, without the worker's time budget
+    started = time.perf_counter()
+    with pytest.raises(EvaluationError, match=message):
+        evaluate_unbounded_time(expr, mode="discrete")
+    assert time.perf_counter() - started < 0.1
+    with pytest.raises(EvaluationError, match=message):
+        evaluate(expr, mode="discrete")
+
+
+def test_bounded_expressions_evaluate():
+    assert evaluate("2**10 + 3", mode="arithmetic") == 1027
+    assert evaluate("5! + C(5, 2) + len({1, 2} | {2, 3})", mode="discrete") == 133
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGSTOP"), reason="needs SIGSTOP")
+def test_timeout_kills_only_the_slow_worker_and_the_next_call_works():
+    evaluate("C(10, 3)", mode="discrete")  # leaves an idle worker
+    stuck = math_eval._idle[-1]
+    # The static limits leave no slow expression; a stopped worker stands in for one
+    os.kill(stuck.process.pid, signal.SIGSTOP)
+
+    started = time.perf_counter()
+    with pytest.raises(EvaluationTimeout):
+        evaluate("C(40, 20)", mode="discrete", timeout=0.2)
+    assert time.perf_counter() - started < 2.0
+    assert not stuck.process.is_alive()
+    assert evaluate("C(6, 3)", mode="discrete") == 20
+
+
+def test_workers_evaluate_concurrently():
+    from concurrent.futures import ThreadPoolExecutor
+
+    math_eval.set_max_workers(3)
+    try:
+        with ThreadPoolExecutor(3) as pool:
+            results = list(pool.map(lambda n: evaluate(f"factorial({n})", mode="discrete"), (5, 6, 7)))
+        assert results == [120, 720, 5040]
+        assert len(math_eval._idle) <= 3
+    finally:
+        math_eval.set_max_workers(math_eval.MAX_WORKERS)
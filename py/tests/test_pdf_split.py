@@ -0,0 +1,32 @@
+import pytest
+
+PyPDF2 = pytest.importorskip("PyPDF2")
+
+from gradingBot.pdf_split import split_pdf  # noqa: E402
+from gradingBot.workspace import WorkspaceQuotaError  # noqa: E402
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    writer = PyPDF2.PdfWriter()
+    for _ in range(6):
+        writer.add_blank_page(width=612, height=792)
+    path = tmp_path / "book.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def test_split_in_page_order(pdf, tmp_path):
+    out = tmp_path / "parts"
+    out.mkdir()
+    parts = split_pdf(pdf, out, max_pages_per_chunk=4, max_workers=1)
+    assert [p.name for p in parts] == ["book_part1.pdf", "book_part2.pdf"]
+    assert [len(PyPDF2.PdfReader(str(p)).pages) for p in parts] == [4, 2]
+
+
+def test_split_stops_at_the_quota(pdf, tmp_path):
+    out = tmp_path / "parts"
+    out.mkdir()
+    with pytest.raises(WorkspaceQuotaError):
+        split_pdf(pdf, out, max_pages_per_chunk=1, max_workers=1, quota_bytes=100)
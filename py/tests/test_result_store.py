@@ -0,0 +1,25 @@
+from gradingBot.result_store import GradeRecord, ResultStore
+
+
+def _record(**fields):
+    base = dict(session_id="s", question="Q", student_answer="A", feedback="ok", model="4o-mini")
+    return GradeRecord(**{**base, **fields})
+
+
+def test_latest_only_returns_grades_for_the_same_max_points(tmp_path):
+    store = ResultStore(tmp_path / "results.sqlite")
+    store.add(_record(score=4.0, max_points=5, created=1.0))
+    store.add(_record(score=8.0, max_points=10.0, created=2.0))
+
+    assert store.latest("Q", "A", max_points=5)["score"] == 4.0
+    assert store.latest("Q", "A", max_points=10)["score"] == 8.0
+    assert store.latest("Q", "A", max_points=20) is None
+    assert store.latest("Q", "A") is None
+
+
+def test_latest_without_max_points_matches_unscored_grades(tmp_path):
+    store = ResultStore(tmp_path / "results.sqlite")
+    store.add(_record(feedback="no score"))
+
+    assert store.latest("Q", "A")["feedback"] == "no score"
+    assert store.latest("Q", "A", max_points=10) is None
@@ -0,0 +1,49 @@
+import pytest
+
+from llmproxy import LLMProxy
+from llmproxy import main as llmproxy_main
+
+
+@pytest.fixture
+def client(proxy_env, monkeypatch):
+    client = LLMProxy(breaker=None)
+    client.sent = []
+    client.batch_reply = {"error": "HTTP 503: unavailable", "status_code": 503}
+
+    def post_json(request_type, payload):
+        client.sent.append(request_type)
+        if request_type == "retrieve_batch":
+            return client.batch_reply
+        return {"rag_context": [payload["query"]]}
+
+    monkeypatch.setattr(client, "_post_json", post_json)
+    return client
+
+
+def _retrieve_many(client):
+    return client.retrieve_many(["a", "b"], session_id="s", rag_threshold=0.3, rag_k=1)
+
+
+def test_failed_probe_is_not_repeated_until_the_cooldown_ends(client, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(llmproxy_main.time, "monotonic", lambda: clock[0])
+
+    assert _retrieve_many(client) == [{"rag_context": ["a"]}, {"rag_context": ["b"]}]
+    assert _retrieve_many(client) == [{"rag_context": ["a"]}, {"rag_context": ["b"]}]
+    assert client.sent == ["retrieve_batch", "retrieve", "retrieve", "retrieve", "retrieve"]
+    assert client._batch_retrieve_supported is None
+
+    clock[0] += llmproxy_main._BATCH_PROBE_COOLDOWN
+    client.batch_reply = {"results": [{"rag_context": ["A"]}, {"rag_context": ["B"]}]}
+    assert _retrieve_many(client) == [{"rag_context": ["A"]}, {"rag_context": ["B"]}]
+    assert client._batch_retrieve_supported is True
+
+
+def test_rejected_batch_type_falls_back_for_good(client):
+    client.batch_reply = {"error": "HTTP 400: Unknown request_type", "status_code": 400}
+
+    _retrieve_many(client)
+    _retrieve_many(client)
+
+    assert client.sent.count("retrieve_batch") == 1
+    assert client._batch_retrieve_supported is False
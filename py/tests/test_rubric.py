@@ -0,0 +1,141 @@
+import pytest
+
+from gradingBot.rubric import Criterion, Rubric, compile_rubric
+
+PROOF = """GRADING RUBRIC
+==============
+1. Correct base case (2 points)
+2. Inductive step: 4 pts
+     uses the hypothesis explicitly
+3. [2] Clear conclusion
+Deduct 1 point for missing notation.
+Total: 8 points"""
+
+
+def _points(rubric):
+    return [(c.description, c.points) for c in rubric.criteria]
+
+
+def test_criteria_notes_and_total():
+    rubric = compile_rubric(PROOF)
+    assert _points(rubric) == [
+        ("Correct base case", 2.0),
+        ("Inductive step; uses the hypothesis explicitly", 4.0),
+        ("Clear conclusion", 2.0),
+    ]
+    assert rubric.notes == ("GRADING RUBRIC", "Deduct 1 point for missing notation.")
+    assert rubric.stated_total == 8.0
+    assert rubric.consistent
+
+
+def test_deduction_and_total_words_inside_criteria():
+    rubric = compile_rubric(
+        "1. Total derivative computed correctly (3 pts)\n"
+        "2. Correctly applies the penalty term (2 pts)\n"
+        "3. Loses no precision when rounding (1 pt)\n"
+        "4. Explains result (4 points)"
+    )
+    assert _points(rubric) == [
+        ("Total derivative computed correctly", 3.0),
+        ("Correctly applies the penalty term", 2.0),
+        ("Loses no precision when rounding", 1.0),
+        ("Explains result", 4.0),
+    ]
+    assert rubric.notes == ()
+    assert rubric.stated_total is None
+    assert rubric.total == 10.0
+
+
+@pytest.mark.parametrize("line", [
+    "Deduct 1 point for missing units",
+    "- Deduct 2 pts for late work",
+    "Penalty: 2 points for no diagram",
+    "- -1 pt if no units",
+    "Missing units (-0.5 points)",
+])
+def test_deductions_are_notes(line):
+    rubric = compile_rubric(f"- Correct answer (5 pts)\n{line}")
+    assert _points(rubric) == [("Correct answer", 5.0)]
+    assert len(rubric.notes) == 1
+    assert rubric.notes[0].lstrip("- ").startswith(line.lstrip("- ")[:5])
+
+
+@pytest.mark.parametrize("line, total", [
+    ("Total: 10 points", 10.0),
+    ("Maximum score = 6", 6.0),
+    ("Out of 7 pts", 7.0),
+    ("Max points: 4.5", 4.5),
+])
+def test_total_lines(line, total):
+    assert compile_rubric(f"- Work shown (3 pts)\n{line}").stated_total == total
+
+
+def test_negative_value_keeps_its_sign_through_compact():
+    rubric = compile_rubric("- Correct (5 pts)\n- -1 pt if no units")
+    assert rubric.notes == ("-1 pt if no units",)
+    assert compile_rubric(rubric.compact()) == rubric
+
+
+def test_range_is_not_a_negative_value():
+    assert _points(compile_rubric("- Base case (1-2 points)")) == [("Base case", 2.0)]
+
+
+def test_unpointed_bullets_are_equal_criteria():
+    rubric = compile_rubric("- clarity\n- rigor\nBe fair.")
+    assert _points(rubric) == [("clarity", None), ("rigor", None)]
+    assert rubric.weights() == {"C1": 0.5, "C2": 0.5}
+    assert rubric.criterion_points(10) == {"C1": 5.0, "C2": 5.0}
+
+
+@pytest.mark.parametrize("text", [
+    PROOF,
+    "- clarity\n- rigor\nMaximum points: 6",
+    "1. Base case (2 pts)\n2. Step (4 pts)\nNote: partial credit allowed\n- -1 pt if no units",
+    "Just grade it fairly.",
+])
+def test_compact_round_trip(text):
+    rubric = compile_rubric(text)
+    assert compile_rubric(rubric.compact()) == rubric
+    assert compile_rubric(rubric.compact()).fingerprint == rubric.fingerprint
+
+
+def test_fingerprint_ignores_formatting():
+    reformatted = PROOF.replace("(2 points)", "( 2 points )").replace("==============\n", "\n")
+    assert compile_rubric(reformatted).fingerprint == compile_rubric(PROOF).fingerprint
+    assert compile_rubric(PROOF.replace("4 pts", "5 pts")).fingerprint != compile_rubric(PROOF).fingerprint
+
+
+def test_inconsistent_total_falls_back_to_raw_text():
+    text = "- Base case (2 points)\n- Step (3 points)\nTotal: 10 points"
+    rubric = compile_rubric(text)
+    assert not rubric.consistent
+    assert not rubric.scored_by_criteria
+    assert rubric.prompt_text() == text
+    assert rubric.score_reply("C1: 2/2\nC2: 3/3", 10) == ([], None)
+
+
+def test_prompt_text_asks_for_criterion_lines():
+    text = compile_rubric(PROOF).prompt_text()
+    assert text.startswith("C1 (2 pts): Correct base case\n")
+    assert text.endswith('as "C1: x/2".')
+
+
+def test_score_reply_scales_to_max_points():
+    rubric = compile_rubric(PROOF)
+    criteria, total = rubric.score_reply("SCORE: 7/8\nC1: 2/2\nC2: 3/4\n**C3**: 1", max_points=16)
+    assert [c["score"] for c in criteria] == [4.0, 6.0, 2.0]
+    assert [c["points"] for c in criteria] == [4.0, 8.0, 4.0]
+    assert total == 12.0
+
+
+def test_score_reply_missing_criterion_gives_no_total():
+    criteria, total = compile_rubric(PROOF).score_reply("C1: 2/2\nC2: 9/4", max_points=8)
+    assert [c["score"] for c in criteria] == [2.0, 4.0, None]  # clamped to the criterion's points
+    assert total is None
+
+
+def test_compiled_rubric_passes_through():
+    rubric = Rubric(criteria=(Criterion("C1", "Correct", 1.0),))
+    assert compile_rubric(rubric) is rubric
+    assert compile_rubric(None) is None
+    assert compile_rubric("   ") is None
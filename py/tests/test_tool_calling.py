@@ -0,0 +1,77 @@
+import pytest
+
+from gradingBot.gradingBot import GradingBot
+from gradingBot.tool_calling import ToolCall, ToolCallError, parse_tool_calls, strip_tool_calls
+
+
+def calculator(expression: str) -> dict:
+    """Evaluate an arithmetic expression."""
+    return {"result": expression}
+
+
+TOOLS = {"calculator": calculator}
+
+
+def test_parse_valid_calls():
+    text = 'TOOL_CALLS: [{"name": "calculator", "arguments": {"expression": "2+3", "extra": 1}}]'
+    assert parse_tool_calls(text, TOOLS) == [ToolCall("calculator", {"expression": "2+3"})]
+
+
+def test_no_request_means_no_calls():
+    assert parse_tool_calls("SCORE: 8/10\nFEEDBACK: fine", TOOLS) == []
+
+
+@pytest.mark.parametrize("text", [
+    'TOOL_CALLS: [{"name": "calculator", "arguments": {"expression": "2+3"}',
+    'TOOL_CALLS: {"name": "calculator"}',
+    'TOOL_CALLS: please compute 2+3',
+    'TOOL_CALLS: [{"name": "search", "arguments": {}}]',
+])
+def test_malformed_requests_raise(text):
+    with pytest.raises(ToolCallError):
+        parse_tool_calls(text, TOOLS)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('TOOL_CALLS: [{"name": "calculator", "arguments": {}}]\nSCORE: 8/10 [good]', "SCORE: 8/10 [good]"),
+    ('SCORE: 8/10\nTOOL_CALLS: [{"name": "calculator", "arguments": {"expression": "2+', "SCORE: 8/10"),
+    ("TOOL_CALLS: not json\nSCORE: 7/10", "SCORE: 7/10"),
+    ("TOOL_CALLS: []", ""),
+])
+def test_strip_removes_any_request(text, expected):
+    assert strip_tool_calls(text) == expected
+
+
+@pytest.fixture
+def llm_bot(proxy_env, monkeypatch):
+    bot = GradingBot("test", tool_mode="llm", store_results=False, max_tool_rounds=1)
+    replies = []
+
+    def generate(system_prompt, full_query, on_token=None, model=None):
+        return {"result": replies.pop(0)}
+
+    monkeypatch.setattr(bot, "_generate", generate)
+    bot.replies = replies
+    return bot
+
+
+def test_unparseable_request_is_an_error(llm_bot):
+    llm_bot.replies.append("TOOL_CALLS: [{broken")
+    response, executed = llm_bot._generate_with_tools("system", "query")
+    assert response["error"].startswith("Could not parse the model's tool request")
+    assert executed == []
+
+
+def test_request_in_last_round_is_an_error(llm_bot):
+    call = 'TOOL_CALLS: [{"name": "calculator", "arguments": {"expression": "2+3"}}]'
+    llm_bot.replies.extend([call, call])
+    response, executed = llm_bot._generate_with_tools("system", "query")
+    assert "tool budget" in response["error"]
+    assert len(executed) == 1
+
+
+def test_last_round_reply_is_stripped(llm_bot):
+    call = 'TOOL_CALLS: [{"name": "calculator", "arguments": {"expression": "2+3"}}]'
+    llm_bot.replies.extend([call, "SCORE: 9/10\n" + call])
+    response, _ = llm_bot._generate_with_tools("system", "query")
+    assert response["result"] == "SCORE: 9/10"
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from gradingBot.tool_runner import ToolBudget, ToolRunner
+
+
+def _sleeper(seconds):
+    def tool(**kwargs):
+        time.sleep(seconds)
+        return {"result": "done"}
+    return tool
+
+
+def test_waiting_for_a_slot_does_not_use_up_the_timeout():
+    runner = ToolRunner({"slow": _sleeper(0.2)}, budgets={
+        "slow": ToolBudget(timeout=0.3, max_concurrency=1, queue_timeout=5.0),
+    })
+    futures = [runner.submit("slow") for _ in range(3)]
+
+    assert [f.result() for f in futures] == [{"result": "done"}] * 3
+    metrics = runner.metrics()["slow"]
+    assert metrics["timeouts"] == 0 and metrics["queue_timeouts"] == 0
+    runner.shutdown()
+
+
+def test_call_that_never_gets_a_slot_is_dropped():
+    release = threading.Event()
+    ran = []
+
+    def blocking(**kwargs):
+        ran.append(kwargs)
+        release.wait()
+        return {"result": "done"}
+
+    runner = ToolRunner({"tool": blocking}, budgets={
+        "tool": ToolBudget(timeout=5.0, max_concurrency=1, queue_timeout=0.1, fallback={"error": "busy"}),
+    })
+    first = runner.submit("tool", n=1)
+    second = runner.submit("tool", n=2)
+
+    assert second.result() == {"error": "busy"}
+    release.set()
+    assert first.result() == {"result": "done"}
+    time.sleep(0.05)
+    assert ran == [{"n": 1}]
+    assert runner.metrics()["tool"]["queue_timeouts"] == 1
+    runner.shutdown()
+
+
+def test_running_call_still_times_out():
+    runner = ToolRunner({"slow": _sleeper(0.5)}, budgets={"slow": ToolBudget(timeout=0.05)})
+
+    result = runner.run("slow")
+
+    assert result["timed_out"]
+    assert runner.metrics()["slow"]["timeouts"] == 1
+    runner.shutdown()
@@ -0,0 +1,33 @@
+from gradingBot import tools
+from gradingBot.math_eval import EvaluationError, EvaluationTimeout
+
+
+def _fake_evaluate(monkeypatch, outcomes):
+    calls = []
+
+    def evaluate(expression, mode, timeout):
+        calls.append(expression)
+        outcome = outcomes[min(len(calls), len(outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    tools._calculate.cache_clear()
+    monkeypatch.setattr(tools, "evaluate", evaluate)
+    return calls
+
+
+def test_timeouts_are_not_cached(monkeypatch):
+    calls = _fake_evaluate(monkeypatch, [EvaluationTimeout("Evaluation exceeded 1.0s time budget"), 120])
+
+    assert "error" in tools.calculator_tool("5!", mode="discrete")
+    assert tools.calculator_tool("5!", mode="discrete") == {"result": 120}
+    assert len(calls) == 2
+
+
+def test_deterministic_errors_are_cached(monkeypatch):
+    calls = _fake_evaluate(monkeypatch, [EvaluationError("Exponent too large (limit 1000)")])
+
+    for _ in range(3):
+        assert tools.calculator_tool("9**9**9") == {"error": "Exponent too large (limit 1000)"}
+    assert len(calls) == 1
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import Counter
+
+from gradingBot import worker_pool
+from gradingBot.worker_pool import MAX_ATTEMPTS, GradingQueue, _split_jobs, run_worker
+
+SETTINGS = {"question": "Q", "grade": {"dedupe": False}, "bot": {"session_id": "test"}, "rate_limit": None}
+
+
+class StubBot:
+    """Grades every answer with its length and remembers who graded what."""
+
+    graded = Counter()
+    lock = threading.Lock()
+
+    def grade_many(self, question, submissions, **kwargs):
+        time.sleep(0.01)  # long enough for the workers to interleave
+        with self.lock:
+            self.graded.update(submissions.keys())
+        worker = threading.current_thread().name
+        return {sid: {"score": float(len(answer)), "worker": worker} for sid, answer in submissions.items()}
+
+
+def _queue(tmp_path, monkeypatch, n=40, job_size=4, **kwargs):
+    StubBot.graded = Counter()
+    monkeypatch.setattr(worker_pool, "_make_bot", lambda settings, queue_path: StubBot())
+    submissions = {f"s{i}": "x" * i for i in range(n)}
+    queue = GradingQueue(tmp_path / "queue.sqlite", **kwargs)
+    batch = queue.add_batch(SETTINGS, _split_jobs(submissions, False, 0.9, job_size))
+    return queue, batch, submissions
+
+
+def _run_workers(queue, batch, count=2):
+    threads = [
+        threading.Thread(target=run_worker, args=(queue.path, batch), kwargs={"worker_id": f"w{n}"}, name=f"w{n}")
+        for n in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+
+def test_two_workers_grade_every_job_exactly_once(tmp_path, monkeypatch):
+    queue, batch, submissions = _queue(tmp_path, monkeypatch)
+
+    _run_workers(queue, batch)
+
+    assert StubBot.graded == Counter(submissions.keys())
+    results = queue.results(batch)
+    assert {sid: r["score"] for sid, r in results.items()} == {sid: float(len(a)) for sid, a in submissions.items()}
+    assert {r["worker"] for r in results.values()} == {"w0", "w1"}
+    assert queue.progress(batch) == {"pending": 0, "running": 0, "done": 10}
+
+
+def test_crashed_workers_job_is_released_and_graded_once(tmp_path, monkeypatch):
+    queue, batch, submissions = _queue(tmp_path, monkeypatch, n=8)
+    crashed = queue.claim("crashed", batch)
+
+    assert queue.release("crashed") == 1
+    _run_workers(queue, batch)
+
+    assert StubBot.graded == Counter(submissions.keys())
+    # The crashed worker's late answer no longer counts
+    assert not queue.complete(crashed["id"], "crashed", {sid: {"score": -1.0} for sid in crashed["submissions"]})
+    assert all(r["score"] >= 0 for r in queue.results(batch).values())
+
+
+def test_expired_lease_is_handed_out_again(tmp_path, monkeypatch):
+    queue, batch, _ = _queue(tmp_path, monkeypatch, n=4, lease=0.05)
+    stalled = queue.claim("stalled", batch)
+    assert queue.claim("other", batch) is None
+
+    time.sleep(0.1)
+    retaken = queue.claim("other", batch)
+
+    assert retaken["id"] == stalled["id"]
+    assert retaken["attempts"] == 2
+    assert not queue.complete(stalled["id"], "stalled", {})
+    assert queue.complete(retaken["id"], "other", {"s0": {"score": 0.0}})
+
+
+def test_job_fails_after_max_attempts(tmp_path, monkeypatch):
+    queue, batch, submissions = _queue(tmp_path, monkeypatch, n=2, lease=0.0)
+    for _ in range(MAX_ATTEMPTS):
+        assert queue.claim("flaky", batch) is not None
+
+    assert queue.claim("flaky", batch) is None
+    results = queue.results(batch)
+    assert set(results) == set(submissions)
+    assert all("no result after" in r["error"] for r in results.values())
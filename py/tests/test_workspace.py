@@ -0,0 +1,53 @@
+import io
+
+import pytest
+
+from gradingBot.workspace import QUOTA_CHECK_BYTES, Workspace, WorkspaceQuotaError, open_with_quota, tree_bytes
+
+
+class _Endless(io.RawIOBase):
+    """A stream far larger than any quota; counts what was read."""
+
+    def __init__(self):
+        self.read_bytes = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = len(buffer)
+        buffer[:n] = b"x" * n
+        self.read_bytes += n
+        return n
+
+
+def test_stream_stops_at_the_quota(tmp_path):
+    stream = _Endless()
+    with Workspace(root=tmp_path, quota_bytes=3 * QUOTA_CHECK_BYTES) as ws:
+        with pytest.raises(WorkspaceQuotaError):
+            ws.save("big.pdf", stream)
+        assert ws.used_bytes() <= 3 * QUOTA_CHECK_BYTES
+    assert stream.read_bytes <= 5 * QUOTA_CHECK_BYTES
+
+
+def test_writes_within_the_quota(tmp_path):
+    with Workspace(root=tmp_path, quota_bytes=10 * QUOTA_CHECK_BYTES) as ws:
+        path = ws.save("a.pdf", io.BytesIO(b"y" * (2 * QUOTA_CHECK_BYTES)))
+        assert path.stat().st_size == 2 * QUOTA_CHECK_BYTES
+        with pytest.raises(WorkspaceQuotaError):
+            ws.save("b.pdf", b"z" * (9 * QUOTA_CHECK_BYTES))
+
+
+def test_quota_covers_files_written_by_others(tmp_path):
+    (tmp_path / "other.bin").write_bytes(b"o" * (2 * QUOTA_CHECK_BYTES))
+    with pytest.raises(WorkspaceQuotaError):
+        with open_with_quota(tmp_path / "part.pdf", quota_bytes=3 * QUOTA_CHECK_BYTES) as f:
+            for _ in range(4):
+                f.write(b"p" * QUOTA_CHECK_BYTES)
+    assert tree_bytes(tmp_path) <= 3 * QUOTA_CHECK_BYTES
+
+
+def test_no_quota(tmp_path):
+    with open_with_quota(tmp_path / "f.bin") as f:
+        f.write(b"data")
+    assert (tmp_path / "f.bin").read_bytes() == b"data"